@@ -71,6 +71,19 @@ options:
     required: false
     aliases: ['aws_region', 'ec2_region']
     version_added: "1.5"
+  regions:
+    description:
+      - list of regions to bring the trail to I(state) in, instead of I(region).
+      - all trails of a region are described with one call and compared locally, the regions are handled concurrently with credentials that are resolved once.
+    required: false
+    default: null
+    version_added: "2.0"
+  workers:
+    description:
+      - number of regions of I(regions) handled at the same time.
+    required: false
+    default: 5
+    version_added: "2.0"
 
 extends_documentation_fragment: aws
 """
@@ -88,17 +101,32 @@ EXAMPLES = """
 
   - name: remove cloudtrail
     local_action: cloudtrail state=absent name=main region=us-east-1
+
+  - name: enable cloudtrail in several regions
+    local_action:
+      module: cloudtrail
+      state: enabled
+      name: main
+      s3_bucket_name: ourbucket
+      s3_key_prefix: cloudtrail
+      regions:
+        - us-east-1
+        - us-west-2
+        - eu-west-1
 """
 
 import time
 import sys
 import os
+import Queue
+import threading
 from collections import Counter
 
 boto_import_failed = False
 try:
     import boto
     import boto.cloudtrail
+    import boto.provider
     from boto.regioninfo import RegionInfo
 except ImportError:
     boto_import_failed = True
@@ -133,6 +161,11 @@ class CloudTrailManager:
           return True
         return False
 
+    def view_all(self):
+        '''Return all trails of the region by name with a single call.'''
+        ret = self.conn.describe_trails()
+        return dict((trail['Name'], trail) for trail in ret.get('trailList', []))
+
     def enable_logging(self, name):
         '''Turn on logging for a cloudtrail that already exists. Throws Exception on error.'''
         self.conn.start_logging(name)
@@ -149,11 +182,99 @@ class CloudTrailManager:
         self.conn.delete_trail(name)
 
 
+def reconcile_region(module, cf_man, spec):
+    '''Bring the trail of spec to the desired state in the region of cf_man.
 
-def main():
+    All trails of the region are described with one call and compared
+    locally, only the trail status and the needed changes are extra calls.
+    Returns a dict with the changed flag and the actions taken.
+    '''
+    name = spec['name']
+    current = cf_man.view_all().get(name)
+    actions = []
 
-    if not has_libcloud:
-      module.fail_json(msg='boto is required.')
+    if module.params['state'] == 'enabled':
+        create_args = dict(name=name, s3_bucket_name=spec['s3_bucket_name'],
+                           s3_key_prefix=spec['s3_key_prefix'],
+                           include_global_service_events=spec['include_global_events'])
+        if current is None:
+            actions.append('create')
+            if not module.check_mode:
+                cf_man.enable(**create_args)
+        elif current['S3BucketName']                != spec['s3_bucket_name'] or \
+             current.get('S3KeyPrefix', '')         != spec['s3_key_prefix']  or \
+             current['IncludeGlobalServiceEvents']  != spec['include_global_events']:
+            actions.append('update')
+            if not module.check_mode:
+                cf_man.update(**create_args)
+
+        # a trail that is created in check mode has no status yet
+        if current is None or not cf_man.view_status(name).get('IsLogging', False):
+            actions.append('start_logging')
+            if not module.check_mode:
+                cf_man.enable_logging(name)
+
+    elif module.params['state'] == 'disabled':
+        if current is not None:
+            actions.append('delete')
+            if not module.check_mode:
+                cf_man.delete(name)
+
+    return {'changed': bool(actions), 'actions': actions}
+
+
+def reconcile_regions(module, regions, spec, aws_connect_params):
+    '''Reconcile the trail in every region on a bounded pool of threads,
+    each with its own connection.'''
+    queue = Queue.Queue()
+    for region in regions:
+        # connect here, a failing connection ends the module with fail_json,
+        # which must not happen in a worker thread
+        queue.put((region, CloudTrailManager(module, region=region, **aws_connect_params)))
+    results = {}
+    errors = []
+
+    def worker():
+        while True:
+            try:
+                region, cf_man = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[region] = reconcile_region(module, cf_man, spec)
+            except Exception, e:
+                errors.append('%s: %s' % (region, e))
+
+    threads = [threading.Thread(target=worker)
+               for i in range(min(module.params['workers'], len(regions)))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    changed = bool([r for r in results.values() if r['changed']])
+    if errors:
+        module.fail_json(msg='; '.join(sorted(errors)), changed=changed, regions=results)
+    return {'changed': changed, 'regions': results}
+
+
+def shared_credentials(module, aws_connect_params):
+    '''Resolve the credentials once, so the connections of all regions do not
+    each look them up from the environment, config or instance metadata.'''
+    if aws_connect_params.get('aws_access_key_id'):
+        return aws_connect_params
+    provider = boto.provider.Provider('aws')
+    if not provider.get_access_key():
+        module.fail_json(msg='No AWS credentials found in the environment, boto configuration or instance metadata')
+    params = dict(aws_connect_params)
+    params['aws_access_key_id'] = provider.get_access_key()
+    params['aws_secret_access_key'] = provider.get_secret_key()
+    if provider.get_security_token():
+        params['security_token'] = provider.get_security_token()
+    return params
+
+
+def main():
 
     argument_spec = ec2_argument_spec()
     argument_spec.update(dict(
@@ -162,14 +283,28 @@ def main():
         s3_bucket_name={'required': False, 'type': 'str' },
         s3_key_prefix={'default':'', 'required': False, 'type': 'str' },
         include_global_events={'default':True, 'required': False, 'type': 'bool' },
+        regions={'required': False, 'type': 'list' },
+        workers={'default': 5, 'required': False, 'type': 'int' },
     ))
     required_together = ( ['state', 's3_bucket_name'] )
 
     module = AnsibleModule(argument_spec=argument_spec, supports_check_mode=True, required_together=required_together)
+
+    if boto_import_failed:
+        module.fail_json(msg='boto is required.')
+
     ec2_url, access_key, secret_key, region = get_ec2_creds(module)
     aws_connect_params = dict(aws_access_key_id=access_key,
                               aws_secret_access_key=secret_key)
 
+    if module.params['regions']:
+        spec = dict(name=module.params['name'],
+                    s3_bucket_name=module.params['s3_bucket_name'],
+                    s3_key_prefix=module.params['s3_key_prefix'].rstrip('/'),
+                    include_global_events=module.params['include_global_events'])
+        module.exit_json(**reconcile_regions(module, module.params['regions'], spec,
+                                             shared_credentials(module, aws_connect_params)))
+
     if not region:
         module.fail_json(msg="Region must be specified as a parameter, in EC2_REGION or AWS_REGION environment variables or in boto configuration file")
 
@@ -186,9 +321,10 @@ def main():
 
     results = { 'changed': False }
     if module.params['state'] == 'enabled':
-        results['exists'] = cf_man.exists(name=ct_name)
+        view = cf_man.view(ct_name)
+        results['exists'] = view is not None
         if results['exists']:
-            results['view'] = cf_man.view(ct_name)
+            results['view'] = view
             # only update if the values have changed.
             if results['view']['S3BucketName']              != s3_bucket_name or \
               results['view']['S3KeyPrefix']                != s3_key_prefix  or \
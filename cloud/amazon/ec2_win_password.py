@@ -11,8 +11,27 @@ author: Rick Mendes
 options:
   instance_id:
     description:
-      - The instance id to get the password data from. 
-    required: true
+      - The instance id to get the password data from. Required unless I(instance_ids) is set.
+    required: false
+  instance_ids:
+    description:
+      - A list of instance ids to get the password data from, returned as I(win_passwords) by instance id. The key is parsed once for all instances.
+    required: false
+    default: null
+    version_added: "2.0"
+  wait:
+    description:
+      - Wait for the password data of the instances to be available, polling with backoff on one connection.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+    version_added: "2.0"
+  wait_timeout:
+    description:
+      - How long to wait for the password data, in seconds.
+    required: false
+    default: 120
+    version_added: "2.0"
   key_file:
     description:
       - path to the file containing the key pair used on the instance
@@ -36,8 +55,19 @@ tasks:
     instance_id: i-XXXXXX
     region: us-east-1
     key_file: "~/aws-creds/my_test_key.pem"
+
+# Example of waiting for the passwords of new instances
+- name: get the Administrator passwords
+  ec2_win_password:
+    instance_ids: "{{ ec2.instance_ids }}"
+    region: us-east-1
+    key_file: "~/aws-creds/my_test_key.pem"
+    wait: yes
+    wait_timeout: 900
+  register: win
 '''
 
+import time
 from base64 import b64decode
 from os.path import expanduser
 from Crypto.Cipher import PKCS1_v1_5
@@ -49,35 +79,83 @@ try:
 except ImportError:
     HAS_BOTO = False
 
+def decrypt_password(cipher, data):
+    """Decrypt the base64 encoded password data, returns None if the
+    password is not available yet."""
+    if not data:
+        return None
+    sentinel = 'password decryption failed!!!'
+
+    try:
+      return cipher.decrypt(b64decode(data), sentinel)
+    except ValueError as e:
+      return None
+
+def get_passwords(module, ec2, cipher, instance_ids):
+    """Return the decrypted password of every instance by id.
+
+    Without wait the password data is read once. With wait the instances
+    without a password are polled on the same connection, backing off from
+    5 up to 30 seconds, until all passwords are available or wait_timeout
+    is reached.
+    """
+    passwords = dict()
+    pending = list(instance_ids)
+    deadline = time.time() + module.params.get('wait_timeout')
+    interval = 5
+    while True:
+        for instance_id in list(pending):
+            decrypted = decrypt_password(cipher, ec2.get_password_data(instance_id))
+            if decrypted is not None:
+                passwords[instance_id] = decrypted
+                pending.remove(instance_id)
+
+        if not pending or not module.params.get('wait'):
+            break
+        if time.time() >= deadline:
+            module.fail_json(msg="timed out waiting for the password of %s" % ', '.join(pending),
+                             win_passwords=passwords)
+        time.sleep(min(interval, max(deadline - time.time(), 0)))
+        interval = min(interval * 2, 30)
+
+    for instance_id in pending:
+        passwords[instance_id] = None
+    return passwords
+
 def main():
     argument_spec = ec2_argument_spec()
     argument_spec.update(dict(
-            instance_id = dict(required=True),
+            instance_id = dict(),
+            instance_ids = dict(type='list'),
             key_file = dict(required=True),
+            wait = dict(type='bool', default=False),
+            wait_timeout = dict(type='int', default=120),
         )
     )
-    module = AnsibleModule(argument_spec=argument_spec)
+    module = AnsibleModule(argument_spec=argument_spec,
+                           required_one_of=[['instance_id', 'instance_ids']],
+                           mutually_exclusive=[['instance_id', 'instance_ids']])
 
     if not HAS_BOTO:
         module.fail_json(msg='Boto required for this module.')
 
     instance_id = module.params.get('instance_id')
+    instance_ids = module.params.get('instance_ids')
     key_file = expanduser(module.params.get('key_file'))
 
     ec2 = ec2_connect(module)
 
-    data = ec2.get_password_data(instance_id)
-    decoded = b64decode(data)
-
+    # the key is parsed once for all instances
     f = open(key_file, 'r')
     key = RSA.importKey(f.read())
     cipher = PKCS1_v1_5.new(key)
-    sentinel = 'password decryption failed!!!'
 
-    try:
-      decrypted = cipher.decrypt(decoded, sentinel)
-    except ValueError as e:
-      decrypted = None
+    if instance_ids:
+        passwords = get_passwords(module, ec2, cipher, instance_ids)
+        module.exit_json(win_passwords=dict((i, p or '') for i, p in passwords.items()),
+                         changed=bool([p for p in passwords.values() if p is not None]))
+
+    decrypted = get_passwords(module, ec2, cipher, [instance_id])[instance_id]
 
     if decrypted == None:
         module.exit_json(win_password='', changed=False)
@@ -30,10 +30,29 @@ description:
 options:
   name:
     description:
-      - the name of the image to create or delete
-    required: true
+      - the name of the image to create or delete, required unless I(images)
+        is set
+    required: false
+    default: null
+    aliases: []
+  images:
+    description:
+      - a list of images to create or delete together, instead of I(name).
+        Each item is an image name or a dict with the name and optionally
+        the source, description and zone of the image, which default to
+        the module options. Existing images are listed once, all operations
+        are submitted and then polled together until they are done.
+    required: false
     default: null
     aliases: []
+    version_added: "2.0"
+  timeout:
+    description:
+      - seconds to wait for the operations of I(images) to finish
+    required: false
+    default: 600
+    aliases: []
+    version_added: "2.0"
   description:
     description:
       - an optional description
@@ -106,9 +125,23 @@ EXAMPLES = '''
 - gce_img:
     name: test-image
     state: absent
+
+# Create a family of images from tarballs and a disk at once.
+- gce_img:
+    images:
+      - name: golden-web-v2
+        source: gs://bucket/images/web-v2.tar.gz
+      - name: golden-db-v2
+        source: gs://bucket/images/db-v2.tar.gz
+      - name: golden-base-v2
+        source: base-disk
+        zone: us-central1-b
+    state: present
 '''
 
+import re
 import sys
+import time
 
 try:
   from libcloud.compute.types import Provider
@@ -169,10 +202,119 @@ def delete_image(gce, name, module):
     module.fail_json(msg=str(e), changed=False)
 
 
+def image_source(gce, source, zone, module):
+  """Return the image data for a source disk or tarball."""
+  if source.startswith(GCS_URI):
+    # source is a Google Cloud Storage URI
+    return {'rawDisk': {'source': source, 'containerType': 'TAR'}}
+  elif source.startswith('gs://'):
+    # the API only accepts https URI.
+    return {'rawDisk': {'source': source.replace('gs://', GCS_URI),
+                        'containerType': 'TAR'}}
+  try:
+    volume = gce.ex_get_volume(source, zone)
+  except ResourceNotFoundError:
+    module.fail_json(msg='Disk %s not found in zone %s' % (source, zone),
+                     changed=False)
+  except GoogleBaseError, e:
+    module.fail_json(msg=str(e), changed=False)
+  return {'sourceDisk': volume.extra['selfLink']}
+
+
+def list_images(gce, names):
+  """Return the names of the existing images of names with one filtered
+  list request per page."""
+  found = set()
+  params = {'filter': 'name eq (%s)' % '|'.join([re.escape(n) for n in names])}
+  while True:
+    response = gce.connection.request('/global/images', method='GET',
+                                      params=params).object
+    for image in response.get('items', []):
+      found.add(image['name'])
+    if not response.get('nextPageToken'):
+      return found
+    params['pageToken'] = response['nextPageToken']
+
+
+def wait_operations(gce, operations, timeout, module):
+  """Poll global operations until all of them are done, backing off from
+  1 up to 10 seconds between rounds."""
+  pending = dict(operations)
+  errors = []
+  deadline = time.time() + timeout
+  interval = 1
+  while pending:
+    for name, operation in pending.items():
+      operation = gce.connection.request(operation['selfLink'],
+                                         method='GET').object
+      if operation['status'] != 'DONE':
+        continue
+      del pending[name]
+      if 'error' in operation:
+        errors.append('%s: %s' % (name, ', '.join(
+            [e.get('message', e.get('code')) for e in
+             operation['error'].get('errors', [])])))
+
+    if not pending:
+      break
+    if time.time() >= deadline:
+      module.fail_json(msg='Timeout waiting for images %s'
+                       % ', '.join(sorted(pending)), changed=True)
+    time.sleep(min(interval, max(deadline - time.time(), 0)))
+    interval = min(interval * 2, 10)
+
+  if errors:
+    module.fail_json(msg='; '.join(errors), changed=True)
+
+
+def manage_images(gce, module):
+  """Create or delete all images of the images option, submitting every
+  operation before waiting for any of them."""
+  state = module.params.get('state')
+  images = []
+  for image in module.params.get('images'):
+    if not isinstance(image, dict):
+      image = {'name': image}
+    if not image.get('name'):
+      module.fail_json(msg='Every item of images needs a name', changed=False)
+    images.append(image)
+
+  existing = list_images(gce, [i['name'] for i in images])
+  operations = {}
+  for image in images:
+    name = image['name']
+    try:
+      if state == 'present' and name not in existing:
+        source = image.get('source', module.params.get('source'))
+        if not source:
+          module.fail_json(msg='Must supply a source for image %s' % name,
+                           changed=bool(operations))
+        data = image_source(gce, source,
+                            image.get('zone', module.params.get('zone')),
+                            module)
+        data['name'] = name
+        data['description'] = image.get('description',
+                                        module.params.get('description'))
+        operations[name] = gce.connection.request(
+            '/global/images', method='POST', data=data).object
+      elif state == 'absent' and name in existing:
+        operations[name] = gce.connection.request(
+            '/global/images/%s' % name, method='DELETE').object
+    except (ResourceExistsError, ResourceNotFoundError):
+      # created or deleted since it was listed
+      pass
+    except GoogleBaseError, e:
+      module.fail_json(msg='%s: %s' % (name, e), changed=bool(operations))
+
+  wait_operations(gce, operations, module.params.get('timeout'), module)
+  return sorted(operations)
+
+
 def main():
   module = AnsibleModule(
       argument_spec=dict(
-          name=dict(required=True),
+          name=dict(),
+          images=dict(type='list'),
           description=dict(),
           source=dict(),
           state=dict(default='present', choices=['present', 'absent']),
@@ -180,7 +322,10 @@ def main():
           service_account_email=dict(),
           pem_file=dict(),
           project_id=dict(),
-      )
+          timeout=dict(type='int', default=600),
+      ),
+      required_one_of=[['name', 'images']],
+      mutually_exclusive=[['name', 'images']],
   )
 
   if not has_libcloud:
@@ -188,6 +333,10 @@ def main():
 
   gce = gce_connect(module)
 
+  if module.params.get('images'):
+    changed_images = manage_images(gce, module)
+    module.exit_json(changed=bool(changed_images), images=changed_images)
+
   name = module.params.get('name')
   state = module.params.get('state')
   changed = False
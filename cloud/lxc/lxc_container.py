@@ -30,8 +30,29 @@ author: '"Kevin Carter (@cloudnull)" <kevin.carter@rackspace.com>'
 options:
     name:
         description:
-          - Name of a container.
-        required: true
+          - Name of a container. Required unless I(containers) is set.
+        required: false
+    containers:
+        version_added: "2.0"
+        description:
+          - List of containers to converge concurrently instead of a single
+            I(name). Each item is a container name or a dictionary with the
+            container I(name) and any other options of this module, which
+            override the module level values for that container.
+        required: false
+    workers:
+        version_added: "2.0"
+        description:
+          - Number of containers of I(containers) converged at the same time.
+        required: false
+        default: 4
+    timeout:
+        version_added: "2.0"
+        description:
+          - Time in seconds to wait for a container to reach the running,
+            stopped or frozen state after it was started, stopped or frozen.
+        required: false
+        default: 60
     backing_store:
         choices:
           - dir
@@ -129,8 +150,18 @@ options:
         description:
           - Create a snapshot a container when cloning. This is not supported
             by all container storage backends. Enabling this may fail if the
-            backing store does not support snapshots.
+            backing store does not support snapshots. Containers on btrfs,
+            zfs, LVM thin or overlayfs are always cloned as snapshots and a
+            running container is only frozen, not stopped, while cloning.
         default: false
+    clone_pool:
+        version_added: "2.0"
+        description:
+          - Number of stopped clones of the container to keep ready, named
+            C(<name>-pool-<n>). When I(clone_name) does not exist a member
+            of the pool is renamed to I(clone_name) instead of cloning the
+            container, and the pool is then filled up again.
+        required: false
     archive:
         choices:
           - true
@@ -148,11 +179,27 @@ options:
         choices:
           - gzip
           - bzip2
+          - xz
+          - zstd
           - none
         description:
           - Type of compression to use when creating an archive of a running
-            container.
+            container. The parallel compressors C(pigz), C(pbzip2) and C(pxz)
+            are used when they are installed.
         default: gzip
+    archive_incremental:
+        version_added: "2.0"
+        choices:
+          - true
+          - false
+        description:
+          - Create an incremental archive holding only the changes since the
+            last archive of the container in I(archive_path). The tar
+            snapshot file C(<name>.snar) and the manifest
+            C(<name>.manifest.json), which lists the chain of archives with
+            their sha256 checksum, are kept next to the archives. The first
+            archive is a full archive.
+        default: false
     state:
         choices:
           - started
@@ -314,6 +361,15 @@ EXAMPLES = """
     archive: true
     archive_path: /opt/archives
 
+# Create a nightly incremental archive of a container, compressed with xz.
+- name: Incremental container archive
+  lxc_container:
+    name: test-container-started
+    archive: true
+    archive_path: /opt/archives
+    archive_compression: xz
+    archive_incremental: true
+
 # Create a container using overlayfs, create an archive of it, create a
 # snapshot clone of the container and and finally leave the container
 # in a frozen state. The container archive will be compressed using gzip.
@@ -360,6 +416,34 @@ EXAMPLES = """
     name: test-container-new-archive-destroyed-clone
     state: started
 
+# Keep 10 stopped clones of a btrfs backed template ready. The new container
+# is a renamed member of the pool, which is then filled up again.
+- name: Provision a container from a clone pool
+  lxc_container:
+    name: test-container-template
+    backing_store: btrfs
+    clone_name: ci-job-1234
+    clone_pool: 10
+
+- name: Start the provisioned container
+  lxc_container:
+    name: ci-job-1234
+    state: started
+
+- name: Start several containers concurrently
+  lxc_container:
+    template: ubuntu
+    template_options: --release trusty
+    state: started
+    workers: 8
+    containers:
+      - test-container-web1
+      - test-container-web2
+      - name: test-container-db1
+        backing_store: lvm
+        container_config:
+          - "lxc.aa_profile=unconfined"
+
 - name: Destroy a container
   lxc_container:
     name: "{{ item }}"
@@ -380,10 +464,17 @@ EXAMPLES = """
 """
 
 
+import Queue
+import hashlib
+import subprocess
+import threading
+
 try:
     import lxc
 except ImportError:
     HAS_LXC = False
+else:
+    HAS_LXC = True
 
 
 # LXC_COMPRESSION_MAP is a map of available compression types when creating
@@ -391,19 +482,39 @@ except ImportError:
 LXC_COMPRESSION_MAP = {
     'gzip': {
         'extension': 'tar.tgz',
-        'argument': '-czf'
+        'programs': [['pigz'], ['gzip']]
     },
     'bzip2': {
         'extension': 'tar.bz2',
-        'argument': '-cjf'
+        'programs': [['pbzip2'], ['bzip2']]
+    },
+    'xz': {
+        'extension': 'tar.xz',
+        'programs': [['pxz'], ['xz', '-T0']]
+    },
+    'zstd': {
+        'extension': 'tar.zst',
+        'programs': [['zstd', '-T0']]
     },
     'none': {
         'extension': 'tar',
-        'argument': '-cf'
+        'programs': []
     }
 }
 
 
+def _sed_escape(value):
+    """Escape a string for use in a sed expression delimited by commas.
+
+    :param value: Literal string.
+    :type value: ``str``
+    :returns: Escaped string.
+    :rtype: ``str``
+    """
+
+    return re.sub(r'([\\.*\[\]^$,])', r'\\\1', value)
+
+
 # LXC_COMMAND_MAP is a map of variables that are available to a method based
 # on the state the container is in.
 LXC_COMMAND_MAP = {
@@ -563,7 +674,9 @@ class LxcContainerManagement(object):
         self.container_name = self.module.params['name']
         self.container = self.get_container_bind()
         self.archive_info = None
+        self.archive_manifest = None
         self.clone_info = None
+        self.timeout = self.module.params.get('timeout') or 60
 
     def get_container_bind(self):
         return lxc.Container(name=self.container_name)
@@ -646,7 +759,8 @@ class LxcContainerManagement(object):
 
         Prior to running the command the method will look to see if the LXC
         lockfile is present. If the lockfile "/var/lock/subsys/lxc" the method
-        will wait upto 10 minutes for it to be gone; polling every 5 seconds.
+        will wait upto 10 minutes for it to be gone; polling with a backoff
+        from 50 milliseconds up to 1 second.
 
         :param build_command: Used for the command and all options.
         :type build_command: ``list``
@@ -658,9 +772,14 @@ class LxcContainerManagement(object):
 
         lockfile = '/var/lock/subsys/lxc'
 
-        for _ in xrange(timeout):
+        # Back off from a short interval so a lock that is released quickly
+        # does not cost a full second.
+        deadline = time.time() + timeout
+        interval = 0.05
+        while time.time() < deadline:
             if os.path.exists(lockfile):
-                time.sleep(1)
+                time.sleep(interval)
+                interval = min(interval * 2, 1)
             else:
                 return self.module.run_command(
                     ' '.join(build_command),
@@ -726,7 +845,7 @@ class LxcContainerManagement(object):
         if config_change:
             container_state = self._get_state()
             if container_state != 'stopped':
-                self.container.stop()
+                self._container_stop()
 
             with open(container_config_file, 'wb') as f:
                 f.writelines(container_config)
@@ -736,9 +855,84 @@ class LxcContainerManagement(object):
                 self._container_startup()
             elif container_state == 'frozen':
                 self._container_startup()
-                self.container.freeze()
+                self._container_freeze()
+
+    @staticmethod
+    def _mount_fstype(path):
+        """Return the type of the file system a path is on.
+
+        :param path: Path to look up.
+        :type path: ``str``
+        :returns: File system type as found in /proc/mounts or None.
+        :rtype: ``str``
+        """
+
+        path = os.path.realpath(path)
+        fstype = None
+        longest = -1
+        with open('/proc/mounts', 'rb') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1].replace('\\040', ' ')
+                if mount_point != os.sep:
+                    if not (path == mount_point or
+                            path.startswith(mount_point + os.sep)):
+                        continue
+                # Later mounts hide earlier ones on the same mount point.
+                if len(mount_point) >= longest:
+                    longest = len(mount_point)
+                    fstype = fields[2]
+        return fstype
+
+    def _cow_backing_store(self):
+        """Return the copy-on-write backing store of the container.
+
+        Snapshot clones of these backing stores are cheap and consistent
+        when the container is frozen, so it does not need to be stopped.
+
+        :returns: btrfs, zfs, lvm-thin, overlayfs or None.
+        :rtype: ``str``
+        """
+
+        lxc_rootfs = self.container.get_config_item('lxc.rootfs')
+        if not lxc_rootfs:
+            return None
+
+        try:
+            backend = self.container.get_config_item('lxc.rootfs.backend')
+        except KeyError:
+            # lxc.rootfs.backend is not known to LXC 1.0
+            backend = None
+        if ':' in lxc_rootfs:
+            backend, lxc_rootfs = lxc_rootfs.split(':', 1)
+            if backend == 'overlayfs':
+                return backend
+            lxc_rootfs = lxc_rootfs.split(':')[-1]
+
+        if lxc_rootfs.startswith(os.path.join(os.sep, 'dev')):
+            lvs = self.module.get_bin_path('lvs')
+            if lvs:
+                rc, stdout, err = self._run_command(
+                    [lvs, '--noheadings', '-o', 'pool_lv', lxc_rootfs]
+                )
+                if rc == 0 and stdout.strip():
+                    return 'lvm-thin'
+            return None
+
+        if backend == 'zfs' or self._mount_fstype(lxc_rootfs) == 'zfs':
+            return 'zfs'
 
-    def _container_create_clone(self):
+        if backend == 'btrfs' or self._mount_fstype(lxc_rootfs) == 'btrfs':
+            # Only a subvolume, which always has the inode 256, can be
+            # snapshotted.
+            if os.path.isdir(lxc_rootfs) and os.stat(lxc_rootfs).st_ino == 256:
+                return 'btrfs'
+
+        return None
+
+    def _container_create_clone(self, clone_names=None):
         """Clone a new LXC container from an existing container.
 
         This method will clone an existing container to a new container using
@@ -750,56 +944,193 @@ class LxcContainerManagement(object):
         require a state change the method will return the original container
         to its prior state upon completion of the clone.
 
+        If the container is on a copy-on-write backing store, btrfs, zfs, LVM
+        thin or overlayfs, snapshot clones are always used and a running
+        container is only frozen while the snapshots are taken.
+
         Once the clone is complete the new container will be left in a stopped
         state.
+
+        :param clone_names: Names of the new containers, defaults to
+                            `clone_name`.
+        :type clone_names: ``list``
         """
 
-        # Ensure that the state of the original container is stopped
+        if not clone_names:
+            clone_names = [self.module.params.get('clone_name')]
+
+        cow_backing_store = self._cow_backing_store()
+
+        # Ensure that the state of the original container is stopped, or
+        # frozen for a copy-on-write snapshot.
         container_state = self._get_state()
-        if container_state != 'stopped':
+        if cow_backing_store and container_state == 'running':
             self.state_change = True
-            self.container.stop()
-
-        build_command = [
-            self.module.get_bin_path('lxc-clone', True),
-        ]
+            self._container_freeze()
+        elif container_state not in ['stopped', 'frozen'] or (
+                not cow_backing_store and container_state == 'frozen'):
+            self.state_change = True
+            self._container_stop()
 
-        build_command = self._add_variables(
-            variables_dict=self._get_vars(
-                variables=LXC_COMMAND_MAP['clone']['variables']
-            ),
-            build_command=build_command
+        variables_dict = self._get_vars(
+            variables=LXC_COMMAND_MAP['clone']['variables']
         )
+        if cow_backing_store:
+            # The snapshot is taken by the backing store of the original
+            # container.
+            variables_dict.pop('--backingstore', None)
 
-        # Load logging for the instance when creating it.
-        if self.module.params.get('clone_snapshot') in BOOLEANS_TRUE:
-            build_command.append('--snapshot')
-        # Check for backing_store == overlayfs if so force the use of snapshot
-        # If overlay fs is used and snapshot is unset the clone command will
-        # fail with an unsupported type.
-        elif self.module.params.get('backing_store') == 'overlayfs':
-            build_command.append('--snapshot')
-
-        rc, return_data, err = self._run_command(build_command)
-        if rc != 0:
-            message = "Failed executing lxc-clone."
-            self.failure(
-                err=err, rc=rc, msg=message, command=' '.join(
-                    build_command
+        try:
+            for clone_name in clone_names:
+                variables_dict['--new'] = clone_name
+                build_command = self._add_variables(
+                    variables_dict=variables_dict,
+                    build_command=[
+                        self.module.get_bin_path('lxc-clone', True),
+                    ]
                 )
-            )
-        else:
-            self.state_change = True
+
+                # Load logging for the instance when creating it.
+                if self.module.params.get('clone_snapshot') in BOOLEANS_TRUE:
+                    build_command.append('--snapshot')
+                # Check for backing_store == overlayfs if so force the use of
+                # snapshot If overlay fs is used and snapshot is unset the
+                # clone command will fail with an unsupported type.
+                elif self.module.params.get('backing_store') == 'overlayfs':
+                    build_command.append('--snapshot')
+                elif cow_backing_store:
+                    build_command.append('--snapshot')
+
+                rc, return_data, err = self._run_command(build_command)
+                if rc != 0:
+                    message = "Failed executing lxc-clone."
+                    self.failure(
+                        err=err, rc=rc, msg=message, command=' '.join(
+                            build_command
+                        )
+                    )
+                self.state_change = True
+        finally:
             # Restore the original state of the origin container if it was
             # not in a stopped state.
+            current_state = self._get_state()
             if container_state == 'running':
-                self.container.start()
-            elif container_state == 'frozen':
-                self.container.start()
-                self.container.freeze()
+                if current_state == 'frozen':
+                    self.container.unfreeze()
+                    self._wait_for_state('RUNNING')
+                else:
+                    self._container_startup()
+            elif container_state == 'frozen' and current_state != 'frozen':
+                self._container_startup()
+                self._container_freeze()
 
         return True
 
+    def _clone_pool_members(self, clone_pool):
+        """Return the names of the clone pool members of the container.
+
+        :param clone_pool: Size of the clone pool.
+        :type clone_pool: ``int``
+        :returns: Names of all pool members, existing or not.
+        :rtype: ``list``
+        """
+
+        return [
+            '%s-pool-%d' % (self.container_name, i)
+            for i in range(clone_pool)
+        ]
+
+    def _container_rename(self, old_name, new_name):
+        """Rename a stopped container.
+
+        The container directory is moved and the references to it in the
+        container config are updated. The root file system is left where it
+        is, so this never copies data. Moving the directory also claims the
+        container, a concurrent rename of the same container fails.
+
+        :param old_name: Name of the container.
+        :type old_name: ``str``
+        :param new_name: New name of the container.
+        :type new_name: ``str``
+        :returns: True or False if the container was renamed.
+        :rtype: ``bol``
+        """
+
+        old_dir = os.path.dirname(
+            lxc.Container(name=old_name).config_file_name
+        )
+        new_dir = os.path.join(os.path.dirname(old_dir), new_name)
+        if os.path.exists(new_dir):
+            return False
+
+        try:
+            os.rename(old_dir, new_dir)
+        except OSError:
+            return False
+
+        old_dir_regex = re.compile(re.escape(old_dir) + r'(?=/|:|\s|$)')
+        for file_name in ['config', 'fstab']:
+            file_path = os.path.join(new_dir, file_name)
+            if not os.path.isfile(file_path):
+                continue
+
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            data = old_dir_regex.sub(new_dir, data)
+            if file_name == 'config':
+                data = re.sub(
+                    r'(?m)^(lxc\.utsname\s*=\s*).*$',
+                    lambda match: match.group(1) + new_name,
+                    data
+                )
+
+            fd, temp_file = tempfile.mkstemp(dir=new_dir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            shutil.copymode(file_path, temp_file)
+            os.rename(temp_file, file_path)
+
+        return True
+
+    def _clone_from_pool(self, clone_name, clone_pool):
+        """Provision a clone by renaming a ready member of the clone pool.
+
+        :param clone_name: Name of the new container.
+        :type clone_name: ``str``
+        :param clone_pool: Size of the clone pool.
+        :type clone_pool: ``int``
+        :returns: Name of the pool member used or None if the pool is empty.
+        :rtype: ``str``
+        """
+
+        existing = lxc.list_containers()
+        for member in self._clone_pool_members(clone_pool):
+            if member not in existing:
+                continue
+            if lxc.Container(name=member).state.lower() != 'stopped':
+                continue
+            if self._container_rename(member, clone_name):
+                self.state_change = True
+                return member
+
+        return None
+
+    def _fill_clone_pool(self, clone_pool):
+        """Create the missing stopped clones of the clone pool.
+
+        :param clone_pool: Size of the clone pool.
+        :type clone_pool: ``int``
+        :returns: Names of the pool members.
+        :rtype: ``list``
+        """
+
+        members = self._clone_pool_members(clone_pool)
+        existing = lxc.list_containers()
+        missing = [i for i in members if i not in existing]
+        if missing:
+            self._container_create_clone(clone_names=missing)
+        return members
+
     def _create(self):
         """Create a new LXC container.
 
@@ -915,22 +1246,51 @@ class LxcContainerManagement(object):
             self.container.attach_wait(create_script, container_command)
             self.state_change = True
 
-    def _container_startup(self, timeout=60):
-        """Ensure a container is started.
+    def _wait_for_state(self, state):
+        """Wait for the container to reach a state.
 
-        :param timeout: Time before the destroy operation is abandoned.
-        :type timeout: ``int``
+        This uses the liblxc wait primitive, which returns as soon as the
+        container reaches the state instead of polling for it.
+
+        :param state: LXC state name, RUNNING, STOPPED or FROZEN.
+        :type state: ``str``
+        :returns: True or False if the state was reached within the timeout.
+        :rtype: ``bol``
+        """
+
+        return self.container.wait(state, self.timeout)
+
+    def _container_stop(self):
+        """Stop a container and wait for it to be stopped.
+
+        :returns: True or False if the container stopped.
+        :rtype: ``bol``
         """
 
+        self.container.stop()
+        return self._wait_for_state('STOPPED')
+
+    def _container_freeze(self):
+        """Freeze a container and wait for it to be frozen.
+
+        :returns: True or False if the container froze.
+        :rtype: ``bol``
+        """
+
+        self.container.freeze()
+        return self._wait_for_state('FROZEN')
+
+    def _container_startup(self):
+        """Ensure a container is started."""
+
         self.container = self.get_container_bind()
-        for _ in xrange(timeout):
-            if self._get_state() != 'running':
-                self.container.start()
-                self.state_change = True
-                # post startup sleep for 1 second.
-                time.sleep(1)
-            else:
-                return True
+        if self._get_state() == 'running':
+            return True
+
+        self.container.start()
+        self.state_change = True
+        if self._wait_for_state('RUNNING'):
+            return True
         else:
             self.failure(
                 lxc_container=self._container_data(),
@@ -950,37 +1310,52 @@ class LxcContainerManagement(object):
 
         if self.module.params.get('archive') in BOOLEANS_TRUE:
             self.archive_info = {
-                'archive': self._container_create_tar()
+                'archive': self._container_create_tar(),
+                'archive_manifest': self.archive_manifest
             }
 
     def _check_clone(self):
-        """Create a compressed archive of a container.
+        """Create a clone of a container.
 
-        This will store archive_info in as self.archive_info
+        This will store clone_info in as self.clone_info
         """
 
         clone_name = self.module.params.get('clone_name')
+        clone_pool = self.module.params.get('clone_pool')
         if clone_name:
             if not self._container_exists(container_name=clone_name):
-                self.clone_info = {
-                    'cloned': self._container_create_clone()
-                }
+                pool_member = None
+                if clone_pool:
+                    pool_member = self._clone_from_pool(
+                        clone_name=clone_name,
+                        clone_pool=clone_pool
+                    )
+
+                if pool_member:
+                    self.clone_info = {
+                        'cloned': True,
+                        'clone_pool_member': pool_member
+                    }
+                else:
+                    self.clone_info = {
+                        'cloned': self._container_create_clone()
+                    }
             else:
                 self.clone_info = {
                     'cloned': False
                 }
 
-    def _destroyed(self, timeout=60):
-        """Ensure a container is destroyed.
-
-        :param timeout: Time before the destroy operation is abandoned.
-        :type timeout: ``int``
-        """
+        if clone_pool:
+            if self.clone_info is None:
+                self.clone_info = {}
+            self.clone_info['clone_pool'] = self._fill_clone_pool(
+                clone_pool=clone_pool
+            )
 
-        for _ in xrange(timeout):
-            if not self._container_exists(container_name=self.container_name):
-                break
+    def _destroyed(self):
+        """Ensure a container is destroyed."""
 
+        if self._container_exists(container_name=self.container_name):
             # Check if the container needs to have an archive created.
             self._check_archive()
 
@@ -989,14 +1364,12 @@ class LxcContainerManagement(object):
 
             if self._get_state() != 'stopped':
                 self.state_change = True
-                self.container.stop()
+                self._container_stop()
 
             if self.container.destroy():
                 self.state_change = True
 
-            # post destroy attempt sleep for 1 second.
-            time.sleep(1)
-        else:
+        if self._container_exists(container_name=self.container_name):
             self.failure(
                 lxc_container=self._container_data(),
                 error='Failed to destroy container'
@@ -1027,11 +1400,11 @@ class LxcContainerManagement(object):
             if container_state == 'frozen':
                 pass
             elif container_state == 'running':
-                self.container.freeze()
+                self._container_freeze()
                 self.state_change = True
             else:
                 self._container_startup()
-                self.container.freeze()
+                self._container_freeze()
                 self.state_change = True
 
             # Check if the container needs to have an archive created.
@@ -1061,9 +1434,11 @@ class LxcContainerManagement(object):
             self._config()
 
             if self._get_state() != 'stopped':
-                self.container.stop()
+                self._container_stop()
                 self.state_change = True
 
+            self._container_startup()
+
             # Check if the container needs to have an archive created.
             self._check_archive()
 
@@ -1091,7 +1466,7 @@ class LxcContainerManagement(object):
             self._config()
 
             if self._get_state() != 'stopped':
-                self.container.stop()
+                self._container_stop()
                 self.state_change = True
 
             # Check if the container needs to have an archive created.
@@ -1313,11 +1688,72 @@ class LxcContainerManagement(object):
                     % (vg, lv_name, mount_point)
             )
 
-    def _create_tar(self, source_dir):
-        """Create an archive of a given ``source_dir`` to ``output_path``.
+    def _compress_program(self):
+        """Return the compression program tar should pipe the archive to.
+
+        Multi-threaded compressors are preferred when they are installed.
 
-        :param source_dir:  Path to the directory to be archived.
-        :type source_dir: ``str``
+        :returns: compression command or None for no compression.
+        :rtype: ``str``
+        """
+
+        archive_compression = self.module.params.get('archive_compression')
+        programs = LXC_COMPRESSION_MAP[archive_compression]['programs']
+        if not programs:
+            return None
+
+        for program in programs:
+            program_path = self.module.get_bin_path(program[0])
+            if program_path:
+                return ' '.join([program_path] + program[1:])
+        else:
+            self.failure(
+                err='no compression program found',
+                rc=1,
+                msg='None of [ %s ] is available to compress the archive'
+                    % ', '.join([i[0] for i in programs])
+            )
+
+    def _write_manifest(self, manifest_file, entry, incremental):
+        """Record an archive and its checksum in the archive manifest.
+
+        A full archive starts a new manifest, an incremental archive is
+        appended to the chain of archives it depends on.
+
+        :param manifest_file: Path of the manifest.
+        :type manifest_file: ``str``
+        :param entry: Information about the new archive.
+        :type entry: ``dict``
+        :param incremental: True if the archive is incremental.
+        :type incremental: ``bol``
+        """
+
+        manifest = {'container': self.container_name, 'archives': []}
+        if incremental and os.path.exists(manifest_file):
+            with open(manifest_file, 'rb') as f:
+                manifest = json.load(f)
+        manifest['archives'].append(entry)
+
+        fd, temp_file = tempfile.mkstemp(
+            dir=os.path.dirname(manifest_file), prefix='.manifest'
+        )
+        with os.fdopen(fd, 'wb') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(temp_file, manifest_file)
+
+    def _create_tar(self, container_dir, rootfs_dir):
+        """Stream an archive of a container into ``archive_path``.
+
+        The container directory and the root file system are read in place
+        and piped through the compressor straight into the archive, which
+        is checksummed on the way.
+
+        :param container_dir: Path to the container directory with its config.
+        :type container_dir: ``str``
+        :param rootfs_dir: Path to the root file system to archive.
+        :type rootfs_dir: ``str``
+        :returns: Path of the archive.
+        :rtype: ``str``
         """
 
         archive_path = self.module.params.get('archive_path')
@@ -1326,37 +1762,131 @@ class LxcContainerManagement(object):
 
         archive_compression = self.module.params.get('archive_compression')
         compression_type = LXC_COMPRESSION_MAP[archive_compression]
+        archive_base = os.path.join(archive_path, self.container_name)
+        snapshot_file = '%s.snar' % archive_base
+        manifest_file = '%s.manifest.json' % archive_base
+
+        incremental = False
+        if self.module.params.get('archive_incremental') in BOOLEANS_TRUE:
+            incremental = os.path.exists(snapshot_file)
+
+        if incremental:
+            archive_name = '%s-%s.%s' % (
+                archive_base,
+                time.strftime('%Y%m%d%H%M%S'),
+                compression_type['extension']
+            )
+        else:
+            archive_name = '%s.%s' % (
+                archive_base,
+                compression_type['extension']
+            )
 
-        # remove trailing / if present.
-        archive_name = '%s.%s' % (
-            os.path.join(
-                archive_path,
-                self.container_name
-            ),
-            compression_type['extension']
+        # Everything in the container directory but the root file system,
+        # which is added from its own source below.
+        rootfs_dir = os.path.realpath(rootfs_dir)
+        container_dir = os.path.realpath(container_dir)
+        container_files = sorted(
+            [i for i in os.listdir(container_dir)
+             if os.path.join(container_dir, i) != rootfs_dir and i != 'rootfs']
         )
 
+        # tar only allows a single --directory with --listed-incremental so
+        # every member is named from / and renamed in the archive to the
+        # layout of a container directory. Symlink targets are left untouched.
+        container_rel = container_dir.lstrip(os.sep)
+        rootfs_rel = rootfs_dir.lstrip(os.sep)
         build_command = [
             self.module.get_bin_path('tar', True),
-            '--directory=%s' % os.path.realpath(
-                os.path.expanduser(source_dir)
-            ),
-            compression_type['argument'],
-            archive_name,
-            '.'
+            '--create',
+            '--file=-',
+            '--numeric-owner',
+            '--transform=s,^%s\\(/\\|$\\),rootfs\\1,S'
+            % _sed_escape(rootfs_rel),
+            '--transform=s,^%s/,,S' % _sed_escape(container_rel)
         ]
 
-        rc, stdout, err = self._run_command(
-            build_command=build_command,
-            unsafe_shell=True
+        compress_program = self._compress_program()
+        if compress_program:
+            build_command.append(
+                '--use-compress-program=%s' % compress_program
+            )
+
+        temp_snapshot = None
+        if self.module.params.get('archive_incremental') in BOOLEANS_TRUE:
+            fd, temp_snapshot = tempfile.mkstemp(
+                dir=archive_path, prefix='.%s' % self.container_name
+            )
+            os.close(fd)
+            if incremental:
+                shutil.copy2(snapshot_file, temp_snapshot)
+            else:
+                # tar starts a new level 0 dump from an empty snapshot file.
+                os.unlink(temp_snapshot)
+            build_command.extend([
+                '--listed-incremental=%s' % temp_snapshot,
+                # LVM snapshots are mounted on a new device every time.
+                '--no-check-device'
+            ])
+
+        build_command.append('--directory=%s' % os.sep)
+        build_command.extend(
+            [os.path.join(container_rel, i) for i in container_files]
         )
-        if rc != 0:
-            self.failure(
-                err=err,
-                rc=rc,
-                msg='failed to create tar archive',
-                command=' '.join(build_command)
+        build_command.append(rootfs_rel)
+
+        fd, temp_archive = tempfile.mkstemp(
+            dir=archive_path, prefix='.%s' % self.container_name
+        )
+        err_file = tempfile.TemporaryFile()
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            proc = subprocess.Popen(
+                build_command, stdout=subprocess.PIPE, stderr=err_file
             )
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = proc.stdout.read(1048576)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            rc = proc.wait()
+            err_file.seek(0)
+            err = err_file.read()
+            if rc != 0:
+                self.failure(
+                    err=err,
+                    rc=rc,
+                    msg='failed to create tar archive',
+                    command=' '.join(build_command)
+                )
+
+            os.rename(temp_archive, archive_name)
+            if temp_snapshot:
+                os.rename(temp_snapshot, snapshot_file)
+                temp_snapshot = None
+        finally:
+            err_file.close()
+            for temp_file in [temp_archive, temp_snapshot]:
+                if temp_file and os.path.exists(temp_file):
+                    os.unlink(temp_file)
+
+        self._write_manifest(
+            manifest_file=manifest_file,
+            entry={
+                'archive': os.path.basename(archive_name),
+                'sha256': digest.hexdigest(),
+                'size': size,
+                'compression': archive_compression,
+                'incremental': incremental,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S')
+            },
+            incremental=incremental
+        )
+        self.archive_manifest = manifest_file
 
         return archive_name
 
@@ -1382,43 +1912,6 @@ class LxcContainerManagement(object):
                 command=' '.join(build_command)
             )
 
-    def _rsync_data(self, container_path, temp_dir):
-        """Sync the container directory to the temp directory.
-
-        :param container_path: path to the container container
-        :type container_path: ``str``
-        :param temp_dir: path to the temporary local working directory
-        :type temp_dir: ``str``
-        """
-        # This loop is created to support overlayfs archives. This should
-        # squash all of the layers into a single archive.
-        fs_paths = container_path.split(':')
-        if 'overlayfs' in fs_paths:
-            fs_paths.pop(fs_paths.index('overlayfs'))
-
-        for fs_path in fs_paths:
-            # Set the path to the container data
-            fs_path = os.path.dirname(fs_path)
-
-            # Run the sync command
-            build_command = [
-                self.module.get_bin_path('rsync', True),
-                '-aHAX',
-                fs_path,
-                temp_dir
-            ]
-            rc, stdout, err = self._run_command(
-                build_command,
-                unsafe_shell=True
-            )
-            if rc != 0:
-                self.failure(
-                    err=err,
-                    rc=rc,
-                    msg='failed to perform archive',
-                    command=' '.join(build_command)
-                )
-
     def _unmount(self, mount_point):
         """Unmount a file system.
 
@@ -1471,21 +1964,22 @@ class LxcContainerManagement(object):
 
         The process is as follows:
             * Stop or Freeze the container
-            * Create temporary dir
-            * Copy container and config to temporary directory
             * If LVM backed:
                 * Create LVM snapshot of LV backing the container
-                * Mount the snapshot to tmpdir/rootfs
+                * Mount the snapshot to a temporary directory
+                * Restore the state of the container
+            * If overlayfs backed:
+                * Mount the merged layers to a temporary directory
+            * Stream the container config and rootfs into the archive
             * Restore the state of the container
-            * Create tar of tmpdir
             * Clean up
         """
 
-        # Create a temp dir
+        # Create a temp dir used as the mount point of a snapshot
         temp_dir = tempfile.mkdtemp()
 
-        # Set the name of the working dir, temp + container_name
-        work_dir = os.path.join(temp_dir, self.container_name)
+        # Directory holding the container config
+        container_dir = os.path.dirname(self.container.config_file_name)
 
         # LXC container rootfs
         lxc_rootfs = self.container.get_config_item('lxc.rootfs')
@@ -1496,27 +1990,25 @@ class LxcContainerManagement(object):
         # Test if the container is using overlayfs
         overlayfs_backed = lxc_rootfs.startswith('overlayfs')
 
-        mount_point = os.path.join(work_dir, 'rootfs')
+        mount_point = os.path.join(temp_dir, 'rootfs')
+        mounted = False
 
         # Set the snapshot name if needed
         snapshot_name = '%s_lxc_snapshot' % self.container_name
+        snapshot_created = False
 
         container_state = self._get_state()
         try:
             # Ensure the original container is stopped or frozen
             if container_state not in ['stopped', 'frozen']:
                 if container_state == 'running':
-                    self.container.freeze()
+                    self._container_freeze()
                 else:
-                    self.container.stop()
-
-            # Sync the container data from the container_path to work_dir
-            self._rsync_data(lxc_rootfs, temp_dir)
+                    self._container_stop()
 
             if block_backed:
                 if snapshot_name not in self._lvm_lv_list():
-                    if not os.path.exists(mount_point):
-                        os.makedirs(mount_point)
+                    os.makedirs(mount_point)
 
                     # Take snapshot
                     size, measurement = self._get_lv_size(
@@ -1527,12 +2019,18 @@ class LxcContainerManagement(object):
                         snapshot_name=snapshot_name,
                         snapshot_size_gb=size
                     )
+                    snapshot_created = True
+
+                    # The snapshot is consistent, the container can resume
+                    # while the archive is written.
+                    self._restore_state(container_state)
 
                     # Mount snapshot
                     self._lvm_lv_mount(
                         lv_name=snapshot_name,
                         mount_point=mount_point
                     )
+                    mounted = True
                 else:
                     self.failure(
                         err='snapshot [ %s ] already exists' % snapshot_name,
@@ -1541,36 +2039,56 @@ class LxcContainerManagement(object):
                             ' up old snapshot of containers before continuing.'
                             % snapshot_name
                     )
+                rootfs_dir = mount_point
             elif overlayfs_backed:
+                os.makedirs(mount_point)
                 lowerdir, upperdir = lxc_rootfs.split(':')[1:]
                 self._overlayfs_mount(
                     lowerdir=lowerdir,
                     upperdir=upperdir,
                     mount_point=mount_point
                 )
+                mounted = True
+                rootfs_dir = mount_point
+            else:
+                rootfs_dir = lxc_rootfs.split(':')[-1]
 
             # Set the state as changed and set a new fact
             self.state_change = True
-            return self._create_tar(source_dir=work_dir)
+            return self._create_tar(
+                container_dir=container_dir,
+                rootfs_dir=rootfs_dir
+            )
         finally:
-            if block_backed or overlayfs_backed:
+            if mounted:
                 # unmount snapshot
                 self._unmount(mount_point)
 
-            if block_backed:
+            if snapshot_created:
                 # Remove snapshot
                 self._lvm_lv_remove(snapshot_name)
 
             # Restore original state of container
-            if container_state == 'running':
-                if self._get_state() == 'frozen':
-                    self.container.unfreeze()
-                else:
-                    self.container.start()
+            self._restore_state(container_state)
 
             # Remove tmpdir
             shutil.rmtree(temp_dir)
 
+    def _restore_state(self, container_state):
+        """Return a container to the state it had before being archived.
+
+        :param container_state: State of the container before the archive.
+        :type container_state: ``str``
+        """
+
+        if container_state == 'running':
+            current_state = self._get_state()
+            if current_state == 'frozen':
+                self.container.unfreeze()
+                self._wait_for_state('RUNNING')
+            elif current_state != 'running':
+                self._container_startup()
+
     def check_count(self, count, method):
         if count > 1:
             self.failure(
@@ -1592,7 +2110,12 @@ class LxcContainerManagement(object):
         self.module.fail_json(**kwargs)
 
     def run(self):
-        """Run the main method."""
+        """Run the main method.
+
+        :returns: result of the run with the ``changed`` flag and the
+                  ``lxc_container`` data.
+        :rtype: ``dict``
+        """
 
         action = getattr(self, LXC_ANSIBLE_STATES[self.state])
         action()
@@ -1604,20 +2127,131 @@ class LxcContainerManagement(object):
         if self.clone_info:
             outcome.update(self.clone_info)
 
-        self.module.exit_json(
+        return dict(
             changed=self.state_change,
             lxc_container=outcome
         )
 
 
+class LxcContainerError(Exception):
+    """Raised instead of exiting when one container of a list fails."""
+    pass
+
+
+class LxcContainerModule(object):
+    def __init__(self, module, params):
+        """Per container view of the module in multi-container mode.
+
+        The params are the module params overlaid with the settings of one
+        container, and failures raise an ``LxcContainerError`` instead of
+        exiting so the other containers carry on.
+
+        :param module: Processed Ansible Module.
+        :type module: ``object``
+        :param params: Parameters of the container.
+        :type params: ``dict``
+        """
+        self.module = module
+        self.params = params
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+    def fail_json(self, **kwargs):
+        raise LxcContainerError(kwargs)
+
+
+def converge_containers(module):
+    """Converge a list of containers on a pool of worker threads.
+
+    :param module: Processed Ansible Module.
+    :type module: ``object``
+    """
+
+    queue = Queue.Queue()
+    for item in module.params['containers']:
+        if not isinstance(item, dict):
+            item = {'name': item}
+        if not item.get('name'):
+            module.fail_json(msg='Each container needs a name: %s' % item)
+        if item.get('state', module.params['state']) not in LXC_ANSIBLE_STATES:
+            module.fail_json(
+                msg='Invalid state for container [ %s ]' % item['name']
+            )
+
+        params = module.params.copy()
+        params.update(item)
+        params['containers'] = None
+        if 'lv_name' not in item:
+            params['lv_name'] = params['name']
+        # The container config is parsed from its string representation.
+        if isinstance(params.get('container_config'), list):
+            params['container_config'] = repr(params['container_config'])
+        queue.put(params)
+
+    results = {}
+    failures = {}
+
+    def worker():
+        while True:
+            try:
+                params = queue.get_nowait()
+            except Queue.Empty:
+                return
+            name = params['name']
+            try:
+                lxc_manage = LxcContainerManagement(
+                    module=LxcContainerModule(module, params)
+                )
+                results[name] = lxc_manage.run()
+            except LxcContainerError, e:
+                failures[name] = e.args[0]
+            except Exception, e:
+                failures[name] = dict(msg=str(e))
+
+    threads = []
+    for _ in xrange(min(module.params['workers'], queue.qsize())):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    changed = bool([i for i in results.values() if i['changed']])
+    containers = dict(
+        (name, result['lxc_container']) for name, result in results.items()
+    )
+    if failures:
+        module.fail_json(
+            msg='Failed to converge containers [ %s ]' % ', '.join(
+                sorted(failures)
+            ),
+            failures=failures,
+            changed=changed,
+            lxc_containers=containers
+        )
+
+    module.exit_json(changed=changed, lxc_containers=containers)
+
+
 def main():
     """Ansible Main module."""
 
     module = AnsibleModule(
         argument_spec=dict(
             name=dict(
-                type='str',
-                required=True
+                type='str'
+            ),
+            containers=dict(
+                type='list'
+            ),
+            workers=dict(
+                type='int',
+                default=4
+            ),
+            timeout=dict(
+                type='int',
+                default=60
             ),
             template=dict(
                 type='str',
@@ -1688,6 +2322,10 @@ def main():
                 choices=BOOLEANS,
                 default='false'
             ),
+            clone_pool=dict(
+                type='int',
+                required=False
+            ),
             archive=dict(
                 choices=BOOLEANS,
                 default='false'
@@ -1699,8 +2337,14 @@ def main():
             archive_compression=dict(
                 choices=LXC_COMPRESSION_MAP.keys(),
                 default='gzip'
+            ),
+            archive_incremental=dict(
+                choices=BOOLEANS,
+                default='false'
             )
         ),
+        required_one_of=[['name', 'containers']],
+        mutually_exclusive=[['name', 'containers']],
         supports_check_mode=False,
     )
 
@@ -1709,12 +2353,15 @@ def main():
             msg='The `lxc` module is not importable. Check the requirements.'
         )
 
+    if module.params.get('containers'):
+        converge_containers(module)
+
     lv_name = module.params.get('lv_name')
     if not lv_name:
         module.params['lv_name'] = module.params.get('name')
 
     lxc_manage = LxcContainerManagement(module=module)
-    lxc_manage.run()
+    module.exit_json(**lxc_manage.run())
 
 
 # import module bits
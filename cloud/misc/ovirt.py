@@ -41,9 +41,40 @@ options:
   instance_name:
     description:
      - the name of the instance to use
+     - required unless I(instances) is set
     default: null
-    required: true
+    required: false
     aliases: [ vmname ]
+  instances:
+    description:
+     - list of instances to bring to I(state) together, instead of a single I(instance_name)
+     - each item is an instance name or a dict with the instance_name and any of the instance
+       options of this module, which override the module options for that instance
+     - all instances are looked up with one search query and their actions run concurrently
+       over one API connection
+    default: null
+    required: false
+    version_added: "2.0"
+  workers:
+    description:
+     - number of actions of I(instances) run at the same time
+    default: 8
+    required: false
+    version_added: "2.0"
+  wait:
+    description:
+     - wait until started or shut down instances are up or down
+    default: false
+    required: false
+    choices: [ "yes", "no" ]
+    version_added: "2.0"
+  wait_timeout:
+    description:
+     - how long to wait for instances to stop during a restart and, with I(wait), to reach the
+       requested state, in seconds
+    default: 300
+    required: false
+    version_added: "2.0"
   password:
     description:
      - password of the user to authenticate with
@@ -219,9 +250,23 @@ action: ovirt >
     password=secret 
     url=https://ovirt.example.com
 
+# restarting several instances at once
+- ovirt:
+    instances:
+      - web01
+      - web02
+      - web03
+    state: restart
+    wait: yes
+    user: admin@internal
+    password: secret
+    url: https://ovirt.example.com
+
 
 '''
 import sys
+import Queue
+import threading
 
 try:
     from ovirtsdk.api import API
@@ -230,6 +275,12 @@ except ImportError:
     print "failed=True msg='ovirtsdk required for this module'"
     sys.exit(1)
 
+class OVirtError(Exception):
+    """
+    Raised by the create helpers with the message of what went wrong.
+    """
+    pass
+
 # ------------------------------------------------------------------- #
 # create connection with API
 #
@@ -272,13 +323,11 @@ def get_cloud_init(auth_key, auth_key_user):
                 with open(auth_key, 'r') as f:
                     key = f.read()
             except IOError:
-                print("Could not read the given auth_key at {}".format(auth_key))
-                sys.exit(1)
+                raise OVirtError("Could not read the given auth_key at {}".format(auth_key))
             else:
                 cloud_init = add_auth_key(key, auth_key_user)
         else:
-            print("The provided auth_key is not a file. Please specify the absolute path to the .pub key file")
-            sys.exit(1)
+            raise OVirtError("The provided auth_key is not a file. Please specify the absolute path to the .pub key file")
     return cloud_init
 
 # ------------------------------------------------------------------- #
@@ -338,23 +387,21 @@ def create_vm(conn, vmtype, vmname, zone, vmdisk_size, vmcpus, vmnic, vmnetwork,
         network_net = params.Network(name=vmnetwork)
         nic_net1 = params.NIC(name=vmnic, network=network_net, interface='virtio')
     else:
-        print("Invalid value for 'vmdisk_alloc': {}".format(vmdisk_alloc))
-        sys.exit(1)
+        raise OVirtError("Invalid value for 'vmdisk_alloc': {}".format(vmdisk_alloc))
         
     try:
         conn.vms.add(vmparams)
     except:
-        print "Error creating VM with specified parameters"
-        sys.exit(1)
+        raise OVirtError("Error creating VM with specified parameters")
     vm = conn.vms.get(name=vmname)
     try:
         vm.disks.add(vmdisk)
     except:
-        print "Error attaching disk"
+        raise OVirtError("Error attaching disk")
     try:
         vm.nics.add(nic_net1)
     except:
-        print "Error adding nic"
+        raise OVirtError("Error adding nic")
 
 
 # create an instance from a template
@@ -369,9 +416,51 @@ def create_vm_template(conn, vmname, image, zone, auth_key, auth_key_user):
     try:
         conn.vms.add(vmparams)
     except:
-        print 'error adding template %s' % image
-        sys.exit(1)
+        raise OVirtError('error adding template %s' % image)
+
 
+# ------------------------------------------------------------------- #
+# Search queries
+#
+# number of names looked up by one search query
+QUERY_CHUNK_SIZE = 50
+
+def find_vms(conn, vmnames):
+    """
+    Look up VMs by name with search queries, returns a dict of the VMs
+    found by name.
+    """
+    vms = dict()
+    vmnames = list(vmnames)
+    for i in range(0, len(vmnames), QUERY_CHUNK_SIZE):
+        chunk = vmnames[i:i + QUERY_CHUNK_SIZE]
+        query = ' or '.join(['name="%s"' % name.replace('"', '\\"') for name in chunk])
+        for vm in conn.vms.list(query=query, max=len(chunk)) or []:
+            if vm.get_name() in chunk:
+                vms[vm.get_name()] = vm
+    return vms
+
+def find_vm(conn, vmname):
+    return find_vms(conn, [vmname]).get(vmname)
+
+def wait_for_state(conn, vmnames, states, timeout):
+    """
+    Wait until every VM reached one of states, polling all pending VMs with
+    one search query per round and backing off from 1 up to 10 seconds.
+    Returns the names of the VMs that did not reach the state in time.
+    """
+    pending = list(vmnames)
+    deadline = time.time() + timeout
+    interval = 1
+    while pending:
+        vms = find_vms(conn, pending)
+        pending = [name for name in pending
+                   if name not in vms or vms[name].get_status().get_state() not in states]
+        if not pending or time.time() >= deadline:
+            break
+        time.sleep(min(interval, max(deadline - time.time(), 0)))
+        interval = min(interval * 2, 10)
+    return pending
 
 # start instance
 def vm_start(conn, vmname):
@@ -384,12 +473,11 @@ def vm_stop(conn, vmname):
     vm.stop()
 
 # restart instance
-def vm_restart(conn, vmname):
-    state = vm_status(conn, vmname)
+def vm_restart(conn, vmname, timeout=300):
     vm = conn.vms.get(name=vmname)
     vm.stop()
-    while conn.vms.get(vmname).get_status().get_state() != 'down':
-        time.sleep(5)
+    if wait_for_state(conn, [vmname], ['down'], timeout):
+        raise Exception("VM %s did not stop within %s seconds" % (vmname, timeout))
     vm.start()
 
 # remove an instance
@@ -418,6 +506,158 @@ def get_vm(conn, vmname):
         print "vmname: %s" % name
     return name
 
+# ------------------------------------------------------------------- #
+# Multiple instances
+#
+# options of an item of instances, all other module options are used as
+# defaults for every instance
+INSTANCE_KEYS = ['instance_name', 'image', 'resource_type', 'zone', 'instance_disksize',
+                 'instance_cpus', 'instance_nic', 'instance_network', 'instance_mem',
+                 'instance_type', 'disk_alloc', 'disk_int', 'instance_os', 'instance_cores',
+                 'sdomain', 'authorised_key_file', 'authorised_key_user']
+
+def instance_params(module, instance):
+    p = dict(module.params)
+    if isinstance(instance, dict):
+        unknown = [k for k in instance if k not in INSTANCE_KEYS]
+        if unknown:
+            module.fail_json(msg="unsupported options %s for instance %s"
+                             % (', '.join(unknown), instance.get('instance_name')))
+        p.update(instance)
+    else:
+        p['instance_name'] = instance
+    if not p.get('instance_name'):
+        module.fail_json(msg="instance_name is mandatory for every item of instances")
+    return p
+
+def vm_create(c, p):
+    if p['resource_type'] == 'template':
+        create_vm_template(c, p['instance_name'], p['image'], p['zone'],
+                           p['authorised_key_file'], p['authorised_key_user'])
+    else:
+        create_vm(c, p['instance_type'], p['instance_name'], p['zone'], p['instance_disksize'],
+                  p['instance_cpus'], p['instance_nic'], p['instance_network'], p['instance_mem'],
+                  p['disk_alloc'], p['sdomain'], p['instance_cores'], p['instance_os'],
+                  p['disk_int'], p['authorised_key_file'], p['authorised_key_user'])
+
+def run_parallel(func, items, workers):
+    """
+    Call func for every item on a pool of threads sharing the API
+    connection, returns a list of (item, error) of the failed calls.
+    """
+    queue = Queue.Queue()
+    for item in items:
+        queue.put(item)
+    errors = []
+
+    def worker():
+        while True:
+            try:
+                item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                func(item)
+            except Exception, e:
+                errors.append((item, str(e) or e.__class__.__name__))
+
+    threads = [threading.Thread(target=worker) for i in range(min(workers, len(items)))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+def run_bulk(module, c, state, workers, wait, wait_timeout):
+    """
+    Bring every item of instances to state. All VMs are looked up with one
+    search query, the actions run concurrently over one API connection and
+    the waits poll all VMs together.
+    """
+    instances = [instance_params(module, i) for i in module.params['instances']]
+    names = [p['instance_name'] for p in instances]
+    vms = find_vms(c, names)
+    results = dict()
+    todo = []
+
+    for p in instances:
+        name = p['instance_name']
+        vm = vms.get(name)
+        if state == 'present':
+            if vm is not None:
+                results[name] = "VM %s already exists" % name
+            elif p['resource_type'] not in ['template', 'new']:
+                results[name] = "You did not specify a resource type"
+            else:
+                todo.append(p)
+                results[name] = "deployed VM %s" % name
+        elif state == 'absent':
+            if vm is None:
+                results[name] = "VM %s does not exist" % name
+            else:
+                todo.append(p)
+                results[name] = "VM %s removed" % name
+        elif vm is None:
+            module.fail_json(msg="VM %s does not exist" % name)
+        elif state == 'started':
+            if vm.get_status().get_state() == 'up':
+                results[name] = "VM %s is already running" % name
+            else:
+                todo.append(p)
+                results[name] = "VM %s started" % name
+        elif state == 'shutdown':
+            if vm.get_status().get_state() == 'down':
+                results[name] = "VM %s is already shutdown" % name
+            else:
+                todo.append(p)
+                results[name] = "VM %s is shutting down" % name
+        elif state == 'restart':
+            if vm.get_status().get_state() != 'up':
+                results[name] = "VM %s is not running" % name
+            else:
+                todo.append(p)
+                results[name] = "VM %s is restarted" % name
+
+    todo_names = [p['instance_name'] for p in todo]
+
+    def action(name):
+        vm = vms.get(name)
+        return {'started': lambda: vm.start(),
+                'shutdown': lambda: vm.stop(),
+                'restart': lambda: vm.stop(),
+                'absent': lambda: vm.delete()}[state]()
+
+    if state == 'present':
+        errors = run_parallel(lambda p: vm_create(c, p), todo, workers)
+        errors = [(p['instance_name'], e) for p, e in errors]
+    else:
+        errors = run_parallel(action, todo_names, workers)
+
+    if not errors and state == 'restart':
+        # stop all VMs, then start them as soon as they are down
+        pending = wait_for_state(c, todo_names, ['down'], wait_timeout)
+        if pending:
+            module.fail_json(msg="VMs %s did not stop within %s seconds"
+                             % (', '.join(pending), wait_timeout), results=results)
+        vms = find_vms(c, todo_names)
+        errors = run_parallel(lambda name: vms[name].start(), todo_names, workers)
+
+    if errors:
+        for name, e in errors:
+            results[name] = e
+        module.fail_json(msg="; ".join(["%s: %s" % (name, e) for name, e in errors]),
+                         changed=bool(todo), results=results)
+
+    wait_states = {'started': ['up'], 'restart': ['up'], 'shutdown': ['down']}
+    if wait and todo_names and state in wait_states:
+        pending = wait_for_state(c, todo_names, wait_states[state], wait_timeout)
+        if pending:
+            module.fail_json(msg="VMs %s did not reach the state %s within %s seconds"
+                             % (', '.join(pending), state, wait_timeout),
+                             changed=True, results=results)
+
+    module.exit_json(changed=bool(todo), results=results)
+
 # ------------------------------------------------------------------- #
 # Hypervisor operations
 #
@@ -432,7 +672,8 @@ def main():
             state               = dict(default='present', choices=['present', 'absent', 'shutdown', 'started', 'restart']),
             user                = dict(required=True),
             url                 = dict(required=True),
-            instance_name       = dict(required=True, aliases=['vmname']),
+            instance_name       = dict(aliases=['vmname']),
+            instances           = dict(type='list'),
             password            = dict(required=True),
             image               = dict(),
             resource_type       = dict(choices=['new', 'template']),
@@ -450,8 +691,13 @@ def main():
             sdomain             = dict(),
             region              = dict(),
             authorised_key_file = dict(),
-            authorised_key_user = dict(default='root')
+            authorised_key_user = dict(default='root'),
+            workers             = dict(type='int', default=8),
+            wait                = dict(type='bool', default=False),
+            wait_timeout        = dict(type='int', default=300),
         ),
+        required_one_of = [['instance_name', 'instances']],
+        mutually_exclusive = [['instance_name', 'instances']],
     )
 
     state         = module.params['state']
@@ -480,14 +726,28 @@ def main():
     #initialize connection
     c = conn(url+"/api", user, password)
 
+    if module.params['instances']:
+        run_bulk(module, c, state, module.params['workers'],
+                 module.params['wait'], module.params['wait_timeout'])
+
+    vm = find_vm(c, vmname)
+    if vm is None and state in ['started', 'shutdown', 'restart']:
+        module.fail_json(msg="VM %s does not exist" % vmname)
+
     if state == 'present':
-        if get_vm(c, vmname) == "empty":
+        if vm is None:
             if resource_type == 'template':
-                create_vm_template(c, vmname, image, zone, auth_key_file, auth_key_user)
+                try:
+                    create_vm_template(c, vmname, image, zone, auth_key_file, auth_key_user)
+                except OVirtError, e:
+                    module.fail_json(msg=str(e))
                 module.exit_json(changed=True, msg="deployed VM %s from template %s"  % (vmname,image))
             elif resource_type == 'new':
                 # FIXME: refactor, use keyword args.
-                create_vm(c, vmtype, vmname, zone, vmdisk_size, vmcpus, vmnic, vmnetwork, vmmem, vmdisk_alloc, sdomain, vmcores, vmos, vmdisk_int, auth_key_file, auth_key_user)
+                try:
+                    create_vm(c, vmtype, vmname, zone, vmdisk_size, vmcpus, vmnic, vmnetwork, vmmem, vmdisk_alloc, sdomain, vmcores, vmos, vmdisk_int, auth_key_file, auth_key_user)
+                except OVirtError, e:
+                    module.fail_json(msg=str(e))
                 module.exit_json(changed=True, msg="deployed VM %s from scratch"  % vmname)
             else:
                 module.exit_json(changed=False, msg="You did not specify a resource type")
@@ -495,31 +755,40 @@ def main():
             module.exit_json(changed=False, msg="VM %s already exists" % vmname)
 
     if state == 'started':
-        if vm_status(c, vmname) == 'up':
+        if vm.get_status().get_state() == 'up':
             module.exit_json(changed=False, msg="VM %s is already running" % vmname)
         else:
-            vm_start(c, vmname)
+            vm.start()
+            if module.params['wait'] and wait_for_state(c, [vmname], ['up'], module.params['wait_timeout']):
+                module.fail_json(msg="VM %s did not start within %s seconds" % (vmname, module.params['wait_timeout']))
             module.exit_json(changed=True, msg="VM %s started" % vmname)
 
     if state == 'shutdown':
-        if vm_status(c, vmname) == 'down':
+        if vm.get_status().get_state() == 'down':
             module.exit_json(changed=False, msg="VM %s is already shutdown" % vmname)
         else:
-            vm_stop(c, vmname)
+            vm.stop()
+            if module.params['wait'] and wait_for_state(c, [vmname], ['down'], module.params['wait_timeout']):
+                module.fail_json(msg="VM %s did not stop within %s seconds" % (vmname, module.params['wait_timeout']))
             module.exit_json(changed=True, msg="VM %s is shutting down" % vmname)
     
     if state == 'restart':
-        if vm_status(c, vmname) == 'up':
-            vm_restart(c, vmname)
+        if vm.get_status().get_state() == 'up':
+            try:
+                vm_restart(c, vmname, module.params['wait_timeout'])
+            except Exception, e:
+                module.fail_json(msg=str(e))
+            if module.params['wait'] and wait_for_state(c, [vmname], ['up'], module.params['wait_timeout']):
+                module.fail_json(msg="VM %s did not start within %s seconds" % (vmname, module.params['wait_timeout']))
             module.exit_json(changed=True, msg="VM %s is restarted" % vmname)
         else:
             module.exit_json(changed=False, msg="VM %s is not running" % vmname)
 
     if state == 'absent':
-        if get_vm(c, vmname) == "empty":
+        if vm is None:
             module.exit_json(changed=False, msg="VM %s does not exist" % vmname)
         else:
-            vm_remove(c, vmname)
+            vm.delete()
             module.exit_json(changed=True, msg="VM %s removed" % vmname)
 
 
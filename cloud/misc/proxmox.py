@@ -39,8 +39,20 @@ options:
   vmid:
     description:
       - the instance id
+      - required unless I(containers) is set
     default: null
-    required: true
+    required: false
+  containers:
+    description:
+      - list of instances to bring to I(state) together, instead of a single I(vmid)
+      - each item is a vmid or a dict with the vmid and any of the options node, password,
+        hostname, ostemplate, disk, cpus, memory, swap, netif, ip_address, onboot, storage,
+        cpuunits, nameserver, searchdomain and force, which override the module options
+      - the tasks of all instances are submitted to their nodes first and then waited for
+        together, I(timeout) applies to the whole batch
+    default: null
+    required: false
+    version_added: "2.0"
   validate_certs:
     description:
       - enable / disable https certificate verification
@@ -184,6 +196,20 @@ EXAMPLES = '''
 
 # Remove container
 - proxmox: vmid=100 api_user='root@pam' api_password='1q2w3e' api_host='node1' state=absent
+
+# Create several containers on different nodes at once
+- proxmox:
+    api_user: root@pam
+    api_password: 1q2w3e
+    api_host: node1
+    password: '123456'
+    ostemplate: 'local:vztmpl/ubuntu-14.04-x86_64.tar.gz'
+    containers:
+      - { vmid: 101, node: 'uk-mc01', hostname: 'web1.example.org' }
+      - { vmid: 102, node: 'uk-mc02', hostname: 'web2.example.org' }
+
+# Start them
+- proxmox: containers=101,102 api_user='root@pam' api_password='1q2w3e' api_host='node1' state=started
 '''
 
 import os
@@ -195,76 +221,260 @@ try:
 except ImportError:
   HAS_PROXMOXER = False
 
-def get_instance(proxmox, vmid):
-  return [ vm for vm in proxmox.cluster.resources.get(type='vm') if vm['vmid'] == int(vmid) ]
+# keys of a container item in containers, all other module options are used
+# as defaults for every container
+CONTAINER_KEYS = ['vmid', 'node', 'password', 'hostname', 'ostemplate', 'disk', 'cpus',
+                  'memory', 'swap', 'netif', 'ip_address', 'onboot', 'storage', 'cpuunits',
+                  'nameserver', 'searchdomain', 'force']
+
+class ProxmoxIndex(object):
+  """Resources of the cluster, each read at most once per run"""
+
+  def __init__(self, proxmox):
+    self.proxmox = proxmox
+    self._vms = None
+    self._nodes = None
+    self._content = {}
+    self._status = {}
+
+  def get_instance(self, vmid):
+    if self._vms is None:
+      self._vms = self.proxmox.cluster.resources.get(type='vm')
+    return [ vm for vm in self._vms if vm['vmid'] == int(vmid) ]
+
+  def node_check(self, node):
+    if self._nodes is None:
+      self._nodes = [ nd['node'] for nd in self.proxmox.nodes.get() ]
+    return node in self._nodes
+
+  def content_check(self, node, ostemplate, storage):
+    if (node, storage) not in self._content:
+      self._content[(node, storage)] = [ cnt['volid'] for cnt in
+                                         self.proxmox.nodes(node).storage(storage).content.get() ]
+    return ostemplate in self._content[(node, storage)]
+
+  def status(self, vm, vmid):
+    if vmid not in self._status:
+      self._status[vmid] = self.proxmox.nodes(vm[0]['node']).openvz(vmid).status.current.get()['status']
+    return self._status[vmid]
+
+def wait_for_tasks(module, proxmox, tasks, timeout, action):
+  """
+  Wait for a list of (node, taskid) tasks to finish, polling each pending
+  task once per round and backing off from 0.25 up to 2 seconds.
+  """
+  pending = list(tasks)
+  deadline = time.time() + timeout
+  interval = 0.25
+  while pending:
+    for node, taskid in list(pending):
+      task_status = proxmox.nodes(node).tasks(taskid).status.get()
+      if task_status['status'] != 'stopped':
+        continue
+      if task_status['exitstatus'] != 'OK':
+        module.fail_json(msg='Task %s failed while %s with status %s. Last line in task: %s'
+                         % (taskid, action, task_status['exitstatus'],
+                            proxmox.nodes(node).tasks(taskid).log.get()[-1:]))
+      pending.remove((node, taskid))
+
+    if not pending:
+      break
+    if time.time() >= deadline:
+      node, taskid = pending[0]
+      module.fail_json(msg='Reached timeout while %s. Last line in task before timeout: %s'
+                       % (action, proxmox.nodes(node).tasks(taskid).log.get()[-1:]))
+
+    time.sleep(min(interval, max(deadline - time.time(), 0)))
+    interval = min(interval * 2, 2)
+  return True
+
+def create_task(proxmox, vmid, node, disk, storage, cpus, memory, swap, **kwargs):
+  taskid = proxmox.nodes(node).openvz.create(vmid=vmid, storage=storage, memory=memory, swap=swap,
+                                             cpus=cpus, disk=disk, **kwargs)
+  return node, taskid
+
+def start_task(proxmox, vm, vmid):
+  return vm[0]['node'], proxmox.nodes(vm[0]['node']).openvz(vmid).status.start.post()
+
+def stop_task(proxmox, vm, vmid, force):
+  if force:
+    taskid = proxmox.nodes(vm[0]['node']).openvz(vmid).status.shutdown.post(forceStop=1)
+  else:
+    taskid = proxmox.nodes(vm[0]['node']).openvz(vmid).status.shutdown.post()
+  return vm[0]['node'], taskid
 
-def content_check(proxmox, node, ostemplate, storage):
-  return [ True for cnt in proxmox.nodes(node).storage(storage).content.get() if cnt['volid'] == ostemplate ]
+def umount_task(proxmox, vm, vmid):
+  return vm[0]['node'], proxmox.nodes(vm[0]['node']).openvz(vmid).status.umount.post()
 
-def node_check(proxmox, node):
-  return [ True for nd in proxmox.nodes.get() if nd['node'] == node ]
+def delete_task(proxmox, vm, vmid):
+  return vm[0]['node'], proxmox.nodes(vm[0]['node']).openvz.delete(vmid)
 
 def create_instance(module, proxmox, vmid, node, disk, storage, cpus, memory, swap, timeout, **kwargs):
-  proxmox_node = proxmox.nodes(node)
-  taskid = proxmox_node.openvz.create(vmid=vmid, storage=storage, memory=memory, swap=swap,
-                             cpus=cpus, disk=disk, **kwargs)
-
-  while timeout:
-    if ( proxmox_node.tasks(taskid).status.get()['status'] == 'stopped'
-        and proxmox_node.tasks(taskid).status.get()['exitstatus'] == 'OK' ):
-      return True
-    timeout = timeout - 1
-    if timeout == 0:
-      module.fail_json(msg='Reached timeout while waiting for creating VM. Last line in task before timeout: %s'
-                       % proxmox_node.tasks(taskid).log.get()[:1])
-
-    time.sleep(1)
-  return False
+  return wait_for_tasks(module, proxmox,
+                        [create_task(proxmox, vmid, node, disk, storage, cpus, memory, swap, **kwargs)],
+                        timeout, 'waiting for creating VM')
 
 def start_instance(module, proxmox, vm, vmid, timeout):
-  taskid = proxmox.nodes(vm[0]['node']).openvz(vmid).status.start.post()
-  while timeout:
-    if ( proxmox.nodes(vm[0]['node']).tasks(taskid).status.get()['status'] == 'stopped'
-        and proxmox.nodes(vm[0]['node']).tasks(taskid).status.get()['exitstatus'] == 'OK' ):
-      return True
-    timeout = timeout - 1
-    if timeout == 0:
-      module.fail_json(msg='Reached timeout while waiting for starting VM. Last line in task before timeout: %s'
-                       % proxmox.nodes(vm[0]['node']).tasks(taskid).log.get()[:1])
-
-    time.sleep(1)
-  return False
+  return wait_for_tasks(module, proxmox, [start_task(proxmox, vm, vmid)],
+                        timeout, 'waiting for starting VM')
 
 def stop_instance(module, proxmox, vm, vmid, timeout, force):
-  if force:
-    taskid = proxmox.nodes(vm[0]['node']).openvz(vmid).status.shutdown.post(forceStop=1)
-  else:
-    taskid = proxmox.nodes(vm[0]['node']).openvz(vmid).status.shutdown.post()
-  while timeout:
-    if ( proxmox.nodes(vm[0]['node']).tasks(taskid).status.get()['status'] == 'stopped'
-        and proxmox.nodes(vm[0]['node']).tasks(taskid).status.get()['exitstatus'] == 'OK' ):
-      return True
-    timeout = timeout - 1
-    if timeout == 0:
-      module.fail_json(msg='Reached timeout while waiting for stopping VM. Last line in task before timeout: %s'
-                       % proxmox_node.tasks(taskid).log.get()[:1])
-
-    time.sleep(1)
-  return False
+  return wait_for_tasks(module, proxmox, [stop_task(proxmox, vm, vmid, force)],
+                        timeout, 'waiting for stopping VM')
 
 def umount_instance(module, proxmox, vm, vmid, timeout):
-  taskid = proxmox.nodes(vm[0]['node']).openvz(vmid).status.umount.post()
-  while timeout:
-    if ( proxmox.nodes(vm[0]['node']).tasks(taskid).status.get()['status'] == 'stopped'
-        and proxmox.nodes(vm[0]['node']).tasks(taskid).status.get()['exitstatus'] == 'OK' ):
-      return True
-    timeout = timeout - 1
-    if timeout == 0:
-      module.fail_json(msg='Reached timeout while waiting for unmounting VM. Last line in task before timeout: %s'
-                       % proxmox_node.tasks(taskid).log.get()[:1])
-
-    time.sleep(1)
-  return False
+  return wait_for_tasks(module, proxmox, [umount_task(proxmox, vm, vmid)],
+                        timeout, 'waiting for unmounting VM')
+
+def create_args(params):
+  return dict(password = params['password'],
+              hostname = params['hostname'],
+              ostemplate = params['ostemplate'],
+              netif = params['netif'],
+              ip_address = params['ip_address'],
+              onboot = int(params['onboot']),
+              cpuunits = params['cpuunits'],
+              nameserver = params['nameserver'],
+              searchdomain = params['searchdomain'],
+              force = int(params['force']))
+
+def check_create(module, index, params):
+  node = params['node']
+  storage = params['storage']
+  vmid = params['vmid']
+  if not (node and params['hostname'] and params['password'] and params['ostemplate']):
+    module.fail_json(msg='node, hostname, password and ostemplate are mandatory for creating vm %s' % vmid)
+  elif not index.node_check(node):
+    module.fail_json(msg="node '%s' not exists in cluster" % node)
+  elif not index.content_check(node, params['ostemplate'], storage):
+    module.fail_json(msg="ostemplate '%s' not exists on node %s and storage %s"
+                     % (params['ostemplate'], node, storage))
+
+def container_params(module, container):
+  params = dict(module.params)
+  if isinstance(container, dict):
+    unknown = [ k for k in container if k not in CONTAINER_KEYS ]
+    if unknown:
+      module.fail_json(msg='unsupported options %s for container %s'
+                       % (', '.join(unknown), container.get('vmid')))
+    params.update(container)
+  else:
+    params['vmid'] = container
+  if not params.get('vmid'):
+    module.fail_json(msg='vmid is mandatory for every item of containers')
+  for key in ['onboot', 'force']:
+    params[key] = module.boolean(params[key])
+  return params
+
+def run_bulk(module, proxmox, index, state, timeout):
+  """
+  Bring every item of containers to state. All items are validated before
+  the first task is submitted, so a bad item fails the module without
+  leaving earlier tasks behind. The tasks of all containers are submitted
+  to their nodes first and then waited for together.
+  """
+  containers = []
+  seen = set()
+  for container in module.params['containers']:
+    params = container_params(module, container)
+    # a vmid listed twice is only acted on once, with its first settings
+    if str(params['vmid']) in seen:
+      continue
+    seen.add(str(params['vmid']))
+    containers.append(params)
+  results = {}
+
+  if state in ['started', 'stopped', 'restarted']:
+    for params in containers:
+      if not index.get_instance(params['vmid']):
+        module.fail_json(msg='VM with vmid = %s not exists in cluster' % params['vmid'])
+
+  if state == 'present':
+    create = []
+    for params in containers:
+      vmid = params['vmid']
+      if index.get_instance(vmid) and not params['force']:
+        results[vmid] = 'VM with vmid = %s is already exists' % vmid
+        continue
+      check_create(module, index, params)
+      create.append(params)
+
+    tasks = []
+    for params in create:
+      vmid = params['vmid']
+      tasks.append(create_task(proxmox, vmid, params['node'], params['disk'], params['storage'],
+                               params['cpus'], params['memory'], params['swap'],
+                               **create_args(params)))
+      results[vmid] = 'deployed VM %s from template %s' % (vmid, params['ostemplate'])
+    wait_for_tasks(module, proxmox, tasks, timeout, 'waiting for creating VMs')
+
+  elif state == 'started':
+    tasks = []
+    for params in containers:
+      vmid = params['vmid']
+      vm = index.get_instance(vmid)
+      if index.status(vm, vmid) == 'running':
+        results[vmid] = 'VM %s is already running' % vmid
+        continue
+      tasks.append(start_task(proxmox, vm, vmid))
+      results[vmid] = 'VM %s started' % vmid
+    wait_for_tasks(module, proxmox, tasks, timeout, 'waiting for starting VMs')
+
+  elif state == 'stopped':
+    tasks = []
+    for params in containers:
+      vmid = params['vmid']
+      vm = index.get_instance(vmid)
+      status = index.status(vm, vmid)
+      if status == 'mounted':
+        if params['force']:
+          tasks.append(umount_task(proxmox, vm, vmid))
+          results[vmid] = 'VM %s is shutting down' % vmid
+        else:
+          results[vmid] = ("VM %s is already shutdown, but mounted. "
+                           "You can use force option to umount it.") % vmid
+      elif status == 'stopped':
+        results[vmid] = 'VM %s is already shutdown' % vmid
+      else:
+        tasks.append(stop_task(proxmox, vm, vmid, params['force']))
+        results[vmid] = 'VM %s is shutting down' % vmid
+    wait_for_tasks(module, proxmox, tasks, timeout, 'waiting for stopping VMs')
+
+  elif state == 'restarted':
+    restart = []
+    for params in containers:
+      vmid = params['vmid']
+      vm = index.get_instance(vmid)
+      if index.status(vm, vmid) in ['stopped', 'mounted']:
+        results[vmid] = 'VM %s is not running' % vmid
+        continue
+      restart.append((vm, params))
+      results[vmid] = 'VM %s is restarted' % vmid
+    wait_for_tasks(module, proxmox,
+                   [ stop_task(proxmox, vm, params['vmid'], params['force']) for vm, params in restart ],
+                   timeout, 'waiting for stopping VMs')
+    tasks = [ start_task(proxmox, vm, params['vmid']) for vm, params in restart ]
+    wait_for_tasks(module, proxmox, tasks, timeout, 'waiting for starting VMs')
+
+  elif state == 'absent':
+    tasks = []
+    for params in containers:
+      vmid = params['vmid']
+      vm = index.get_instance(vmid)
+      if not vm:
+        results[vmid] = 'VM %s does not exist' % vmid
+        continue
+      status = index.status(vm, vmid)
+      if status == 'running':
+        results[vmid] = 'VM %s is running. Stop it before deletion.' % vmid
+      elif status == 'mounted':
+        results[vmid] = 'VM %s is mounted. Stop it with force option before deletion.' % vmid
+      else:
+        tasks.append(delete_task(proxmox, vm, vmid))
+        results[vmid] = 'VM %s removed' % vmid
+    wait_for_tasks(module, proxmox, tasks, timeout, 'waiting for removing VMs')
+
+  module.exit_json(changed=bool(tasks), results=results)
 
 def main():
   module = AnsibleModule(
@@ -272,7 +482,8 @@ def main():
       api_host = dict(required=True),
       api_user = dict(required=True),
       api_password = dict(no_log=True),
-      vmid = dict(required=True),
+      vmid = dict(),
+      containers = dict(type='list'),
       validate_certs = dict(type='bool', choices=BOOLEANS, default='no'),
       node = dict(),
       password = dict(no_log=True),
@@ -292,7 +503,9 @@ def main():
       timeout = dict(type='int', default=30),
       force = dict(type='bool', choices=BOOLEANS, default='no'),
       state = dict(default='present', choices=['present', 'absent', 'stopped', 'started', 'restarted']),
-    )
+    ),
+    required_one_of = [['vmid', 'containers']],
+    mutually_exclusive = [['vmid', 'containers']],
   )
 
   if not HAS_PROXMOXER:
@@ -324,29 +537,22 @@ def main():
   except Exception, e:
     module.fail_json(msg='authorization on proxmox cluster failed with exception: %s' % e)
 
+  index = ProxmoxIndex(proxmox)
+
+  if module.params['containers']:
+    try:
+      run_bulk(module, proxmox, index, state, timeout)
+    except Exception, e:
+      module.fail_json(msg="%s of VMs failed with exception: %s" % ( state, e ))
+
   if state == 'present':
     try:
-      if get_instance(proxmox, vmid) and not module.params['force']:
+      if index.get_instance(vmid) and not module.params['force']:
         module.exit_json(changed=False, msg="VM with vmid = %s is already exists" % vmid)
-      elif not (node, module.params['hostname'] and module.params['password'] and module.params['ostemplate']):
-        module.fail_json(msg='node, hostname, password and ostemplate are mandatory for creating vm')
-      elif not node_check(proxmox, node):
-        module.fail_json(msg="node '%s' not exists in cluster" % node)
-      elif not content_check(proxmox, node, module.params['ostemplate'], storage):
-        module.fail_json(msg="ostemplate '%s' not exists on node %s and storage %s"
-                         % (module.params['ostemplate'], node, storage))
+      check_create(module, index, module.params)
 
       create_instance(module, proxmox, vmid, node, disk, storage, cpus, memory, swap, timeout,
-                      password = module.params['password'],
-                      hostname = module.params['hostname'],
-                      ostemplate = module.params['ostemplate'],
-                      netif = module.params['netif'],
-                      ip_address = module.params['ip_address'],
-                      onboot = int(module.params['onboot']),
-                      cpuunits = module.params['cpuunits'],
-                      nameserver = module.params['nameserver'],
-                      searchdomain = module.params['searchdomain'],
-                      force = int(module.params['force']))
+                      **create_args(module.params))
 
       module.exit_json(changed=True, msg="deployed VM %s from template %s"  % (vmid, module.params['ostemplate']))
     except Exception, e:
@@ -354,10 +560,10 @@ def main():
 
   elif state == 'started':
     try:
-      vm = get_instance(proxmox, vmid)
+      vm = index.get_instance(vmid)
       if not vm:
         module.fail_json(msg='VM with vmid = %s not exists in cluster' % vmid)
-      if proxmox.nodes(vm[0]['node']).openvz(vmid).status.current.get()['status'] == 'running':
+      if index.status(vm, vmid) == 'running':
         module.exit_json(changed=False, msg="VM %s is already running" % vmid)
 
       if start_instance(module, proxmox, vm, vmid, timeout):
@@ -367,11 +573,11 @@ def main():
 
   elif state == 'stopped':
     try:
-      vm = get_instance(proxmox, vmid)
+      vm = index.get_instance(vmid)
       if not vm:
         module.fail_json(msg='VM with vmid = %s not exists in cluster' % vmid)
 
-      if proxmox.nodes(vm[0]['node']).openvz(vmid).status.current.get()['status'] == 'mounted':
+      if index.status(vm, vmid) == 'mounted':
         if module.params['force']:
           if umount_instance(module, proxmox, vm, vmid, timeout):
             module.exit_json(changed=True, msg="VM %s is shutting down" % vmid)
@@ -379,7 +585,7 @@ def main():
           module.exit_json(changed=False, msg=("VM %s is already shutdown, but mounted. "
                                                "You can use force option to umount it.") % vmid)
 
-      if proxmox.nodes(vm[0]['node']).openvz(vmid).status.current.get()['status'] == 'stopped':
+      if index.status(vm, vmid) == 'stopped':
         module.exit_json(changed=False, msg="VM %s is already shutdown" % vmid)
 
       if stop_instance(module, proxmox, vm, vmid, timeout, force = module.params['force']):
@@ -389,11 +595,11 @@ def main():
 
   elif state == 'restarted':
     try:
-      vm = get_instance(proxmox, vmid)
+      vm = index.get_instance(vmid)
       if not vm:
         module.fail_json(msg='VM with vmid = %s not exists in cluster' % vmid)
-      if ( proxmox.nodes(vm[0]['node']).openvz(vmid).status.current.get()['status'] == 'stopped'
-          or proxmox.nodes(vm[0]['node']).openvz(vmid).status.current.get()['status'] == 'mounted' ):
+      if ( index.status(vm, vmid) == 'stopped'
+          or index.status(vm, vmid) == 'mounted' ):
         module.exit_json(changed=False, msg="VM %s is not running" % vmid)
 
       if ( stop_instance(module, proxmox, vm, vmid, timeout, force = module.params['force']) and
@@ -404,27 +610,18 @@ def main():
 
   elif state == 'absent':
     try:
-      vm = get_instance(proxmox, vmid)
+      vm = index.get_instance(vmid)
       if not vm:
         module.exit_json(changed=False, msg="VM %s does not exist" % vmid)
 
-      if proxmox.nodes(vm[0]['node']).openvz(vmid).status.current.get()['status'] == 'running':
+      if index.status(vm, vmid) == 'running':
         module.exit_json(changed=False, msg="VM %s is running. Stop it before deletion." % vmid)
 
-      if proxmox.nodes(vm[0]['node']).openvz(vmid).status.current.get()['status'] == 'mounted':
+      if index.status(vm, vmid) == 'mounted':
         module.exit_json(changed=False, msg="VM %s is mounted. Stop it with force option before deletion." % vmid)
 
-      taskid = proxmox.nodes(vm[0]['node']).openvz.delete(vmid)
-      while timeout:
-        if ( proxmox.nodes(vm[0]['node']).tasks(taskid).status.get()['status'] == 'stopped'
-            and proxmox.nodes(vm[0]['node']).tasks(taskid).status.get()['exitstatus'] == 'OK' ):
-          module.exit_json(changed=True, msg="VM %s removed" % vmid)
-        timeout = timeout - 1
-        if timeout == 0:
-          module.fail_json(msg='Reached timeout while waiting for removing VM. Last line in task before timeout: %s'
-                           % proxmox_node.tasks(taskid).log.get()[:1])
-
-        time.sleep(1)
+      if wait_for_tasks(module, proxmox, [delete_task(proxmox, vm, vmid)], timeout, 'waiting for removing VM'):
+        module.exit_json(changed=True, msg="VM %s removed" % vmid)
     except Exception, e:
       module.fail_json(msg="deletion of VM %s failed with exception: %s" % ( vmid, e ))
 
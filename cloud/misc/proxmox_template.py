@@ -112,6 +112,8 @@ EXAMPLES = '''
 
 import os
 import time
+import uuid
+from StringIO import StringIO
 
 try:
   from proxmoxer import ProxmoxAPI
@@ -119,23 +121,99 @@ try:
 except ImportError:
   HAS_PROXMOXER = False
 
+try:
+  import requests
+  HAS_REQUESTS = True
+except ImportError:
+  HAS_REQUESTS = False
+
+class MultipartUpload(object):
+  """
+  multipart/form-data body of a file upload that is read in chunks while
+  it is sent, instead of being built in memory
+  """
+
+  def __init__(self, fields, path):
+    boundary = uuid.uuid4().hex
+    head = ''.join([ '--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n'
+                     % (boundary, name, value) for name, value in fields ])
+    head += ('--%s\r\nContent-Disposition: form-data; name="filename"; filename="%s"\r\n'
+             'Content-Type: application/octet-stream\r\n\r\n' % (boundary, os.path.basename(path)))
+    tail = '\r\n--%s--\r\n' % boundary
+    self.content_type = 'multipart/form-data; boundary=%s' % boundary
+    # requests sends Content-Length from len instead of a chunked body
+    self.len = len(head) + os.path.getsize(path) + len(tail)
+    self._parts = [ StringIO(head), open(path, 'rb'), StringIO(tail) ]
+
+  def read(self, size=-1):
+    data = ''
+    while self._parts and (size < 0 or len(data) < size):
+      chunk = self._parts[0].read(size - len(data) if size >= 0 else -1)
+      if not chunk:
+        self._parts.pop(0).close()
+        continue
+      data += chunk
+    return data
+
+  def close(self):
+    for part in self._parts:
+      part.close()
+    self._parts = []
+
 def get_template(proxmox, node, storage, content_type, template):
   return [ True for tmpl in proxmox.nodes(node).storage(storage).content.get()
           if tmpl['volid'] == '%s:%s/%s' % (storage, content_type, template) ]
 
-def upload_template(module, proxmox, api_host, node, storage, content_type, realpath, timeout):
-  taskid = proxmox.nodes(node).storage(storage).upload.post(content=content_type, filename=open(realpath))
-  while timeout:
-    task_status = proxmox.nodes(api_host.split('.')[0]).tasks(taskid).status.get()
-    if task_status['status'] == 'stopped' and task_status['exitstatus'] == 'OK':
-      return True
-    timeout = timeout - 1
-    if timeout == 0:
-      module.fail_json(msg='Reached timeout while waiting for uploading template. Last line in task before timeout: %s'
-                       % proxmox.node(node).tasks(taskid).log.get()[:1])
+def wait_for_task(module, proxmox, node, taskid, timeout, action):
+  """
+  Wait for a task to finish with one status call per poll, backing off
+  from 0.25 up to 2 seconds.
+  """
+  deadline = time.time() + timeout
+  interval = 0.25
+  while True:
+    task_status = proxmox.nodes(node).tasks(taskid).status.get()
+    if task_status['status'] == 'stopped':
+      if task_status['exitstatus'] == 'OK':
+        return True
+      module.fail_json(msg='Task %s failed while %s with status %s. Last line in task: %s'
+                       % (taskid, action, task_status['exitstatus'],
+                          proxmox.nodes(node).tasks(taskid).log.get()[-1:]))
+    if time.time() >= deadline:
+      module.fail_json(msg='Reached timeout while %s. Last line in task before timeout: %s'
+                       % (action, proxmox.nodes(node).tasks(taskid).log.get()[-1:]))
 
-    time.sleep(1)
-  return False
+    time.sleep(min(interval, max(deadline - time.time(), 0)))
+    interval = min(interval * 2, 2)
+
+def upload_file(upload, content_type, realpath):
+  """
+  POST the file to the upload resource of proxmoxer as a stream. The
+  session of proxmoxer would read the whole file into memory.
+  """
+  store = getattr(upload, '_store', None)
+  # _store is private to proxmoxer, use the plain post unless it has
+  # everything needed here
+  if not (HAS_REQUESTS and isinstance(store, dict)
+          and isinstance(store.get('session'), requests.Session)
+          and store.get('base_url') and store.get('serializer')):
+    return upload.post(content=content_type, filename=open(realpath, 'rb'))
+
+  body = MultipartUpload([('content', content_type)], realpath)
+  try:
+    # bypass the session's request, which only handles dict data
+    resp = requests.Session.request(store['session'], 'POST', store['base_url'], data=body,
+                                    headers={'content-type': body.content_type})
+  finally:
+    body.close()
+  if resp.status_code >= 400:
+    raise Exception('%s %s' % (resp.status_code, resp.reason))
+  return store['serializer'].loads(resp)
+
+def upload_template(module, proxmox, api_host, node, storage, content_type, realpath, timeout):
+  taskid = upload_file(proxmox.nodes(node).storage(storage).upload, content_type, realpath)
+  return wait_for_task(module, proxmox, api_host.split('.')[0], taskid, timeout,
+                       'waiting for uploading template')
 
 def delete_template(module, proxmox, node, storage, content_type, template, timeout):
   volid = '%s:%s/%s' % (storage, content_type, template)
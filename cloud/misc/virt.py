@@ -27,9 +27,18 @@ options:
     description:
       - name of the guest VM being managed. Note that VM must be previously
         defined with xml.
-    required: true
+    required: false
+    default: null
+    aliases: [ "guest" ]
+  names:
+    version_added: "2.0"
+    description:
+      - list of guest VMs to apply I(state) or a VM I(command) to, using a
+        single connection. The status of all guests is read with one call.
+        Mutually exclusive with I(name).
+    required: false
     default: null
-    aliases: []
+    aliases: [ "guests" ]
   state:
     description:
       - Note that there may be some lag for state requests like C(shutdown)
@@ -72,6 +81,7 @@ EXAMPLES = '''
 ansible host -m virt -a "name=alpha command=status"
 ansible host -m virt -a "name=alpha command=get_xml"
 ansible host -m virt -a "name=alpha command=create uri=lxc:///"
+ansible host -m virt -a "names=alpha,beta,gamma command=destroy"
 
 # a playbook example of defining and launching an LXC guest
 tasks:
@@ -82,6 +92,13 @@ tasks:
           uri=lxc:///
   - name: start vm
     virt: name=foo state=running uri=lxc:///
+
+# shut down several guests on one connection
+- virt:
+    names:
+      - alpha
+      - beta
+    state: shutdown
 '''
 
 VIRT_FAILED = 1
@@ -103,6 +120,10 @@ HOST_COMMANDS = ['freemem', 'list_vms', 'info', 'nodeinfo', 'virttype']
 ALL_COMMANDS.extend(VM_COMMANDS)
 ALL_COMMANDS.extend(HOST_COMMANDS)
 
+# stats of getAllDomainStats reported as the info command
+INFO_STATS = ['state.state', 'balloon.maximum', 'balloon.current',
+              'vcpu.current', 'cpu.time']
+
 VIRT_STATE_NAME_MAP = {
    0 : "running",
    1 : "running",
@@ -139,8 +160,26 @@ class LibvirtConnection(object):
         """
         Extra bonus feature: vmid = -1 returns a list of everything
         """
+        if vmid == -1:
+            return self.list_all()
+
+        try:
+            return self.conn.lookupByName(vmid)
+        except libvirt.libvirtError, e:
+            if e.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
+                raise VMNotFound("virtual machine %s not found" % vmid)
+            raise
+
+    def list_all(self, flags=0):
+        """
+        Return all domains, running and defined, with a single call where
+        libvirt supports listAllDomains.
+        """
         conn = self.conn
 
+        if hasattr(conn, 'listAllDomains'):
+            return conn.listAllDomains(flags)
+
         vms = []
 
         # this block of code borrowed from virt-manager:
@@ -155,23 +194,84 @@ class LibvirtConnection(object):
             vm = conn.lookupByName(name)
             vms.append(vm)
 
-        if vmid == -1:
-            return vms
+        return vms
+
+    def all_stats(self, info=False):
+        """
+        Return a list of (domain, stats) tuples for every domain. stats holds
+        the keys of getAllDomainStats: state.state and, when info is set,
+        balloon.maximum, balloon.current, vcpu.current and cpu.time.
+
+        getAllDomainStats fetches every domain in one call. Older libvirt
+        versions, and drivers not implementing it (lxc, xen, ...), fall
+        back to info() per domain.
+        """
+        conn = self.conn
+
+        if hasattr(conn, 'getAllDomainStats'):
+            stats = libvirt.VIR_DOMAIN_STATS_STATE
+            if info:
+                stats |= (libvirt.VIR_DOMAIN_STATS_BALLOON |
+                          libvirt.VIR_DOMAIN_STATS_VCPU |
+                          libvirt.VIR_DOMAIN_STATS_CPU_TOTAL)
+            try:
+                all_stats = conn.getAllDomainStats(stats)
+            except libvirt.libvirtError, e:
+                if e.get_error_code() != libvirt.VIR_ERR_NO_SUPPORT:
+                    raise
+                all_stats = None
+            if all_stats is not None:
+                results = []
+                for vm, data in all_stats:
+                    if info and [k for k in INFO_STATS if k not in data]:
+                        # inactive domains only report part of the stats
+                        data = dict(data)
+                        data.update(self._info_stats(vm))
+                    results.append((vm, data))
+                return results
+
+        return [(vm, self._info_stats(vm)) for vm in self.list_all()]
+
+    def _info_stats(self, vm):
+        data = vm.info()
+        return {
+            'state.state'     : data[0],
+            'balloon.maximum' : data[1],
+            'balloon.current' : data[2],
+            'vcpu.current'    : data[3],
+            'cpu.time'        : data[4],
+        }
+
+    def autostart_names(self):
+        """
+        Return the names of all domains set to autostart.
+        """
+        conn = self.conn
 
-        for vm in vms:
-            if vm.name() == vmid:
-                return vm
+        if hasattr(conn, 'listAllDomains'):
+            vms = conn.listAllDomains(libvirt.VIR_CONNECT_LIST_DOMAINS_AUTOSTART)
+            return set([vm.name() for vm in vms])
 
-        raise VMNotFound("virtual machine %s not found" % vmid)
+        return set([vm.name() for vm in self.list_all() if vm.autostart()])
+
+    def get_states(self):
+        """
+        Return a dict of the status of every domain by name.
+        """
+        states = dict()
+        for vm, data in self.all_stats():
+            states[vm.name()] = VIRT_STATE_NAME_MAP.get(
+                data['state.state'], "unknown")
+        return states
 
     def shutdown(self, vmid):
         return self.find_vm(vmid).shutdown()
 
     def pause(self, vmid):
-        return self.suspend(self.conn,vmid)
+        return self.suspend(vmid)
 
     def unpause(self, vmid):
-        return self.resume(self.conn,vmid)
+        return self.resume(vmid)
 
     def suspend(self, vmid):
         return self.find_vm(vmid).suspend()
@@ -236,7 +336,9 @@ class Virt(object):
         self.uri = uri
 
     def __get_conn(self):
-        self.conn = LibvirtConnection(self.uri, self.module)
+        # one connection is used for all calls of a module run
+        if getattr(self, 'conn', None) is None:
+            self.conn = LibvirtConnection(self.uri, self.module)
         return self.conn
 
     def get_vm(self, vmid):
@@ -244,31 +346,35 @@ class Virt(object):
         return self.conn.find_vm(vmid)
 
     def state(self):
-        vms = self.list_vms()
+        states = self.get_states()
         state = []
-        for vm in vms:
-            state_blurb = self.conn.get_status(vm)
-            state.append("%s %s" % (vm,state_blurb))
+        for vm in sorted(states):
+            state.append("%s %s" % (vm,states[vm]))
         return state
 
+    def get_states(self):
+        self.__get_conn()
+        return self.conn.get_states()
+
     def info(self):
-        vms = self.list_vms()
+        self.__get_conn()
         info = dict()
-        for vm in vms:
-            data = self.conn.find_vm(vm).info()
+        autostart = self.conn.autostart_names()
+        for vm, data in self.conn.all_stats(info=True):
+            name = vm.name()
             # libvirt returns maxMem, memory, and cpuTime as long()'s, which
             # xmlrpclib tries to convert to regular int's during serialization.
             # This throws exceptions, so convert them to strings here and
             # assume the other end of the xmlrpc connection can figure things
             # out or doesn't care.
-            info[vm] = {
-                "state"     : VIRT_STATE_NAME_MAP.get(data[0],"unknown"),
-                "maxMem"    : str(data[1]),
-                "memory"    : str(data[2]),
-                "nrVirtCpu" : data[3],
-                "cpuTime"   : str(data[4]),
+            info[name] = {
+                "state"     : VIRT_STATE_NAME_MAP.get(data['state.state'],"unknown"),
+                "maxMem"    : str(data['balloon.maximum']),
+                "memory"    : str(data['balloon.current']),
+                "nrVirtCpu" : data['vcpu.current'],
+                "cpuTime"   : str(data['cpu.time']),
             }
-            info[vm]["autostart"] = self.conn.get_autostart(vm)
+            info[name]["autostart"] = name in autostart
 
         return info
 
@@ -289,20 +395,11 @@ class Virt(object):
         return info
 
     def list_vms(self, state=None):
-        self.conn = self.__get_conn()
-        vms = self.conn.find_vm(-1)
-        results = []
-        for x in vms:
-            try:
-                if state:
-                    vmstate = self.conn.get_status2(x)
-                    if vmstate == state:
-                        results.append(x.name())
-                else:
-                    results.append(x.name())
-            except:
-                pass
-        return results
+        self.__get_conn()
+        if state:
+            states = self.conn.get_states()
+            return [vm for vm in states if states[vm] == state]
+        return [vm.name() for vm in self.conn.list_all()]
 
     def virttype(self):
         return self.__get_conn().get_type()
@@ -387,7 +484,7 @@ class Virt(object):
         """
 
         self.__get_conn()
-        return self.conn.get_MaxMemory(vmid)
+        return self.conn.get_maxMemory(vmid)
 
     def define(self, xml):
         """
@@ -396,10 +493,35 @@ class Virt(object):
         self.__get_conn()
         return self.conn.define_from_xml(xml)
 
+def ensure_state(v, guest, state, status):
+    """
+    Bring a guest in the given status to state, returns a tuple of the
+    changed flag and the result of the call.
+    """
+    if state == 'running':
+        if status == 'paused':
+            return True, v.unpause(guest)
+        elif status != 'running':
+            return True, v.start(guest)
+    elif state == 'shutdown':
+        if status != 'shutdown':
+            return True, v.shutdown(guest)
+    elif state == 'destroyed':
+        if status != 'shutdown':
+            return True, v.destroy(guest)
+    elif state == 'paused':
+        if status == 'running':
+            return True, v.pause(guest)
+    else:
+        v.module.fail_json(msg="unexpected state")
+
+    return False, None
+
 def core(module):
 
     state      = module.params.get('state', None)
     guest      = module.params.get('name', None)
+    guests     = module.params.get('names', None)
     command    = module.params.get('command', None)
     uri        = module.params.get('uri', None)
     xml        = module.params.get('xml', None)
@@ -414,35 +536,45 @@ def core(module):
         return VIRT_SUCCESS, res
 
     if state:
-        if not guest:
+        if not guest and not guests:
             module.fail_json(msg = "state change requires a guest specified")
 
-        res['changed'] = False
-        if state == 'running':
-            if v.status(guest) is 'paused':
-                res['changed'] = True
-                res['msg'] = v.unpause(guest)
-            elif v.status(guest) is not 'running':
-                res['changed'] = True
-                res['msg'] = v.start(guest)
-        elif state == 'shutdown':
-            if v.status(guest) is not 'shutdown':
-                res['changed'] = True
-                res['msg'] = v.shutdown(guest)
-        elif state == 'destroyed':
-            if v.status(guest) is not 'shutdown':
-                res['changed'] = True
-                res['msg'] = v.destroy(guest)
-        elif state == 'paused':
-            if v.status(guest) is 'running':
-                res['changed'] = True
-                res['msg'] = v.pause(guest)
-        else:
-            module.fail_json(msg="unexpected state")
+        if guests:
+            # look up the status of every guest in one call
+            states = v.get_states()
+            res['changed'] = False
+            res['results'] = {}
+            for name in guests:
+                if name not in states:
+                    raise VMNotFound("virtual machine %s not found" % name)
+                changed, msg = ensure_state(v, name, state, states[name])
+                res['changed'] = res['changed'] or changed
+                res['results'][name] = {'changed': changed, 'msg': msg}
+            return VIRT_SUCCESS, res
+
+        res['changed'], msg = ensure_state(v, guest, state, v.status(guest))
+        if res['changed']:
+            res['msg'] = msg
 
         return VIRT_SUCCESS, res
 
     if command:
+        if command in VM_COMMANDS and guests:
+            if command == 'define':
+                module.fail_json(msg = "define requires a single guest")
+            res = {command: {}}
+            if command == 'status':
+                # look up the status of every guest in one call
+                states = v.get_states()
+                for name in guests:
+                    if name not in states:
+                        raise VMNotFound("virtual machine %s not found" % name)
+                    res[command][name] = states[name]
+                return VIRT_SUCCESS, res
+            for name in guests:
+                res[command][name] = getattr(v, command)(name)
+            return VIRT_SUCCESS, res
+
         if command in VM_COMMANDS:
             if not guest:
                 module.fail_json(msg = "%s requires 1 argument: guest" % command)
@@ -475,11 +607,14 @@ def main():
 
     module = AnsibleModule(argument_spec=dict(
         name = dict(aliases=['guest']),
+        names = dict(type='list', aliases=['guests']),
         state = dict(choices=['running', 'shutdown', 'destroyed', 'paused']),
         command = dict(choices=ALL_COMMANDS),
         uri = dict(default='qemu:///system'),
         xml = dict(),
-    ))
+    ),
+        mutually_exclusive = [['name', 'names']],
+    )
 
     rc = VIRT_SUCCESS
     try:
@@ -47,8 +47,8 @@ options:
     description:
       - Path of the patch file as accepted by the GNU patch tool. If
         C(remote_src) is False, the patch source file is looked up from the
-        module's "files" directory.
-    required: true
+        module's "files" directory. Required unless C(series) is given.
+    required: false
     aliases: [ "patchfile" ]
   remote_src:
     description:
@@ -73,6 +73,26 @@ options:
     required: false
     type: "bool"
     default: "False"
+  series:
+    version_added: "2.0"
+    description:
+      - An ordered list of patch files on the remote host to apply under
+        C(basedir). The hash of each applied patch is recorded in
+        C(state_file) together with the checksums of the files it touches,
+        and patches whose files are unchanged since are skipped without
+        running patch. The remaining patches are applied in order; if one
+        fails, all files changed by the series in this run are restored.
+        Mutually exclusive with C(src) and C(dest).
+    required: false
+    default: null
+  state_file:
+    version_added: "2.0"
+    description:
+      - File recording the patches of C(series) applied under C(basedir).
+        Defaults to a file named after C(basedir) in C(~/.ansible/cache/patch).
+        When it is missing, applied patches are detected with patch as usual.
+    required: false
+    default: null
 note:
   - This module requires GNU I(patch) utility to be installed on the remote host.
 '''
@@ -88,10 +108,29 @@ EXAMPLES = '''
     src=/tmp/customize.patch
     basedir=/var/www
     strip=1
+
+- name: apply a series of vendor patches in order
+  patch:
+    basedir: /usr/src/vendor
+    strip: 1
+    series:
+      - /usr/src/patches/0001-fix-build.patch
+      - /usr/src/patches/0002-add-feature.patch
+      - /usr/src/patches/0003-backport.patch
 '''
 
 import os
+import re
+import shutil
+import tempfile
 from os import path, R_OK, W_OK
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import sha as sha1
+
+# line counts of the old and new side of a unified diff hunk
+HUNK_HEADER = re.compile(r'^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@')
 
 
 class PatchError(Exception):
@@ -126,25 +165,258 @@ def apply_patch(patch_func, patch_file, basedir, dest_file=None, strip=0, dry_ru
         raise PatchError(msg)
 
 
+def patch_targets(patch_file, strip=0):
+    '''
+    Returns the names of the files a patch modifies, relative to the
+    directory it is applied in.
+    '''
+    targets = []
+    f = open(patch_file)
+    try:
+        lines = f.readlines()
+    finally:
+        f.close()
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        hunk = HUNK_HEADER.match(line)
+        if hunk:
+            # skip the hunk body, its lines may start with --- or +++ too
+            old_count, new_count = [int(c or 1) for c in hunk.groups()]
+            i += 1
+            while i < len(lines) and (old_count > 0 or new_count > 0):
+                if lines[i].startswith('-'):
+                    old_count -= 1
+                elif lines[i].startswith('+'):
+                    new_count -= 1
+                elif not lines[i].startswith('\\'):
+                    old_count -= 1
+                    new_count -= 1
+                i += 1
+            continue
+        if line.startswith('--- ') and i + 1 < len(lines) and lines[i + 1].startswith('+++ '):
+            old_name = line[4:].split('\t')[0].strip()
+            name = lines[i + 1][4:].split('\t')[0].strip()
+            if name == '/dev/null':
+                # the file is removed, the old name is the one to track
+                name = old_name
+            if name and name != '/dev/null':
+                name = '/'.join(name.split('/')[strip:])
+                if name and name not in targets:
+                    targets.append(name)
+            i += 2
+            continue
+        i += 1
+    return targets
+
+
+class PatchSeries(object):
+    '''
+    Applies an ordered list of patches under one base directory. The
+    hash of each applied patch is recorded in a state file together
+    with the checksums of the files it touches, so patches whose files
+    are unchanged since are skipped without running patch at all. If a
+    patch of the series fails, every file touched by the series so far
+    is restored.
+    '''
+
+    def __init__(self, module, patch_func, basedir, strip, state_file):
+        self.module = module
+        self.patch_func = patch_func
+        self.basedir = basedir
+        self.strip = strip
+        self.state_file = state_file
+        self.state = self._load_state()
+        self._checksums = {}
+
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            f = open(self.state_file)
+            try:
+                state = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return {}
+        if not isinstance(state, dict) or state.get('basedir') != self.basedir or state.get('strip') != self.strip:
+            return {}
+        return state.get('patches', {})
+
+    def save_state(self):
+        state = dict(basedir=self.basedir, strip=self.strip, patches=self.state)
+        state_dir = path.dirname(self.state_file)
+        try:
+            if not path.isdir(state_dir):
+                os.makedirs(state_dir, 0700)
+            filed, tmp_path = tempfile.mkstemp(dir=state_dir, prefix='.patch')
+            fileh = os.fdopen(filed, 'w')
+            json.dump(state, fileh)
+            fileh.close()
+            os.rename(tmp_path, self.state_file)
+        except (IOError, OSError):
+            # the state only lets us skip patch runs, it is not required
+            pass
+
+    def checksum(self, name):
+        if name not in self._checksums:
+            filename = path.join(self.basedir, name)
+            if path.exists(filename):
+                self._checksums[name] = self.module.sha1(filename)
+            else:
+                self._checksums[name] = None
+        return self._checksums[name]
+
+    def is_recorded(self, digest):
+        '''True when the patch was applied and its files did not change since'''
+        entry = self.state.get(digest)
+        if not entry:
+            return False
+        for name, checksum in entry['files'].items():
+            if self.checksum(name) != checksum:
+                return False
+        return True
+
+    def record(self, digest, targets):
+        self.state[digest] = dict(files=dict((name, self.checksum(name)) for name in targets))
+
+    def _snapshot(self, targets, saved):
+        for name in targets:
+            if name in saved:
+                continue
+            filename = path.join(self.basedir, name)
+            if path.exists(filename):
+                filed, tmp_path = tempfile.mkstemp(prefix='.patch')
+                os.close(filed)
+                shutil.copy2(filename, tmp_path)
+                saved[name] = tmp_path
+            else:
+                saved[name] = None
+
+    def _rollback(self, saved):
+        for name, tmp_path in saved.items():
+            filename = path.join(self.basedir, name)
+            if tmp_path is None:
+                if path.exists(filename):
+                    os.unlink(filename)
+            else:
+                self.module.atomic_move(tmp_path, filename)
+
+    def _discard(self, saved):
+        for tmp_path in saved.values():
+            if tmp_path and path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def run(self, patches, dry_run=False, backup=False):
+        '''
+        Applies the patches that are not applied yet, in order.
+        Returns the lists of applied and skipped patches.
+        '''
+        applied = []
+        skipped = []
+        done = []
+        saved = {}
+        try:
+            for patch_file in patches:
+                digest = self.module.sha1(patch_file)
+                targets = patch_targets(patch_file, self.strip)
+                if self.is_recorded(digest):
+                    skipped.append(patch_file)
+                    done.append((digest, targets))
+                    continue
+                # without a record, ask patch itself; once a patch of the
+                # series had to be applied the following ones are not
+                if not applied and is_already_applied(self.patch_func, patch_file, self.basedir, strip=self.strip):
+                    skipped.append(patch_file)
+                    done.append((digest, targets))
+                    continue
+                if dry_run:
+                    # later patches may depend on this one, so only
+                    # the first pending patch can be tried
+                    if not applied:
+                        apply_patch(self.patch_func, patch_file, self.basedir, strip=self.strip, dry_run=True)
+                    applied.append(patch_file)
+                    continue
+                self._snapshot(targets, saved)
+                apply_patch(self.patch_func, patch_file, self.basedir, strip=self.strip, backup=backup)
+                for name in targets:
+                    self._checksums.pop(name, None)
+                applied.append(patch_file)
+                done.append((digest, targets))
+        except PatchError, e:
+            if saved:
+                self._rollback(saved)
+            self._discard(saved)
+            raise PatchError("%s: %s" % (patch_file, e))
+        self._discard(saved)
+
+        if not dry_run:
+            # record every patch against the final state of its files,
+            # as later patches of the series may touch them again
+            for digest, targets in done:
+                self.record(digest, targets)
+            self.save_state()
+        return applied, skipped
+
+
+def run_series(module, p):
+    if not path.isdir(p.basedir):
+        module.fail_json(msg="basedir %s doesn't exist" % (p.basedir))
+    p.basedir = os.path.abspath(p.basedir)
+
+    patches = []
+    for patch_file in p.series:
+        patch_file = os.path.abspath(os.path.expanduser(patch_file))
+        if not os.access(patch_file, R_OK):
+            module.fail_json(msg="patch %s doesn't exist or not readable" % (patch_file))
+        patches.append(patch_file)
+
+    state_file = p.state_file
+    if not state_file:
+        state_file = path.join('~/.ansible/cache/patch', '%s.json' % sha1(p.basedir).hexdigest())
+    state_file = os.path.expanduser(state_file)
+
+    patch_bin = module.get_bin_path('patch')
+    if patch_bin is None:
+        module.fail_json(msg="patch command not found")
+    patch_func = lambda opts: module.run_command("%s %s" % (patch_bin, ' '.join(opts)))
+
+    series = PatchSeries(module, patch_func, p.basedir, p.strip, state_file)
+    try:
+        applied, skipped = series.run(patches, dry_run=module.check_mode, backup=p.backup)
+    except PatchError, e:
+        module.fail_json(msg=str(e))
+
+    module.exit_json(changed=bool(applied), applied=applied, skipped=skipped)
+
+
 def main():
     module = AnsibleModule(
         argument_spec={
-            'src':     {'required': True, 'aliases': ['patchfile']},
+            'src':     {'aliases': ['patchfile']},
             'dest':    {'aliases': ['originalfile']},
             'basedir': {},
             'strip':   {'default': 0, 'type': 'int'},
             'remote_src': {'default': False, 'type': 'bool'},
             # NB: for 'backup' parameter, semantics is slightly different from standard
             #     since patch will create numbered copies, not strftime("%Y-%m-%d@%H:%M:%S~")
-            'backup': { 'default': False, 'type': 'bool' }
+            'backup': { 'default': False, 'type': 'bool' },
+            'series': {'type': 'list'},
+            'state_file': {},
         },
-        required_one_of=[['dest', 'basedir']],
+        required_one_of=[['dest', 'basedir'], ['src', 'series']],
+        mutually_exclusive=[['src', 'series'], ['dest', 'series']],
         supports_check_mode=True
     )
 
     # Create type object as namespace for module params
     p = type('Params', (), module.params)
 
+    if p.series:
+        run_series(module, p)
+
     p.src = os.path.expanduser(p.src)
     if not os.access(p.src, R_OK):
         module.fail_json(msg="src %s doesn't exist or not readable" % (p.src))
@@ -55,8 +55,8 @@ options:
     choices: []
   server_name:
     description:
-      - slb server name
-    required: true
+      - slb server name. Required unless C(servers) is given.
+    required: false
     default: null
     aliases: ['server']
     choices: []
@@ -91,6 +91,26 @@ options:
     default: present
     aliases: []
     choices: ['present', 'absent']
+  servers:
+    description:
+      - A list of servers to manage in a single session. Each item is a
+        dictionary with C(server_name) and optionally C(server_ip),
+        C(server_status), C(server_ports) and C(state), which default to the
+        module level values. The current servers are read with one call
+        and only the servers that differ are updated, followed by a single
+        configuration save. Mutually exclusive with C(server_name).
+    required: false
+    default: null
+    version_added: "2.0"
+  session_cache:
+    description:
+      - Keep the aXAPI session id under C(~/.ansible/cache/a10) and reuse it
+        in later tasks against the same device instead of logging in and out
+        each time. An expired session is replaced by a new login.
+    required: false
+    default: false
+    choices: ['yes', 'no']
+    version_added: "2.0"
 '''
 
 EXAMPLES = '''
@@ -107,10 +127,38 @@ EXAMPLES = '''
       - port_num: 8443
         protocol: TCP
 
+# Manage several servers in one session, reusing the session across tasks
+- a10_server:
+    host: a10.mydomain.com
+    username: myadmin
+    password: mypassword
+    session_cache: yes
+    servers:
+      - server_name: web1
+        server_ip: 1.1.1.101
+        server_ports:
+          - port_num: 80
+            protocol: tcp
+      - server_name: web2
+        server_ip: 1.1.1.102
+        server_ports:
+          - port_num: 80
+            protocol: tcp
+      - server_name: old
+        state: absent
+
 '''
 
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import sha as sha1
+
 VALID_PORT_FIELDS = ['port_num', 'protocol', 'status']
 
+# where session ids are kept when session_cache is enabled
+AXAPI_SESSION_CACHE = '~/.ansible/cache/a10'
+
 def validate_ports(module, ports):
     for item in ports:
         for key in item:
@@ -144,43 +192,105 @@ def validate_ports(module, ports):
             item['status'] = 1
 
 
-def main():
-    argument_spec = a10_argument_spec()
-    argument_spec.update(url_argument_spec())
-    argument_spec.update(
-        dict(
-            state=dict(type='str', default='present', choices=['present', 'absent']),
-            server_name=dict(type='str', aliases=['server'], required=True),
-            server_ip=dict(type='str', aliases=['ip', 'address']),
-            server_status=dict(type='str', default='enabled', aliases=['status'], choices=['enabled', 'disabled']),
-            server_ports=dict(type='list', aliases=['port'], default=[]),
-        )
-    )
-
-    module = AnsibleModule(
-        argument_spec=argument_spec,
-        supports_check_mode=False
-    )
-
-    host = module.params['host']
-    username = module.params['username']
-    password = module.params['password']
-    state = module.params['state']
-    write_config = module.params['write_config']
-    slb_server = module.params['server_name']
-    slb_server_ip = module.params['server_ip']
-    slb_server_status = module.params['server_status']
-    slb_server_ports = module.params['server_ports']
-
-    if slb_server is None:
-        module.fail_json(msg='server_name is required')
-
-    axapi_base_url = 'https://%s/services/rest/V2.1/?format=json' % host
-    session_url = axapi_authenticate(module, axapi_base_url, username, password)
-
-    # validate the ports data structure
-    validate_ports(module, slb_server_ports)
-
+class AxapiSession(object):
+    '''
+    aXAPI session. With a cache_dir the session id is kept on disk and
+    reused by later tasks against the same device, and a cached session
+    the device no longer accepts is replaced by a fresh login. The same
+    class is carried by a10_server, a10_service_group and
+    a10_virtual_server, keep the copies identical.
+    '''
+
+    def __init__(self, module, base_url, username, password, cache_dir=None):
+        self.module = module
+        self.credentials = (base_url, username, password)
+        self.cache_file = None
+        session_id = None
+        if cache_dir:
+            key = sha1('%s|%s' % (base_url, username)).hexdigest()
+            self.cache_file = os.path.join(os.path.expanduser(cache_dir), key)
+            try:
+                f = open(self.cache_file)
+                try:
+                    session_id = f.read().strip()
+                finally:
+                    f.close()
+            except IOError:
+                pass
+        if session_id:
+            self.session_url = base_url + '&session_id=' + session_id
+        else:
+            self._login()
+
+    def _login(self):
+        base_url, username, password = self.credentials
+        self.session_url = axapi_authenticate(self.module, base_url, username, password)
+        if not self.cache_file:
+            return
+        try:
+            if not os.path.isdir(os.path.dirname(self.cache_file)):
+                os.makedirs(os.path.dirname(self.cache_file), 0700)
+            fd = os.open(self.cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+            os.write(fd, self.session_url.split('&session_id=')[-1])
+            os.close(fd)
+        except (IOError, OSError):
+            # the cache is only an optimization
+            pass
+
+    def call(self, method, post=None):
+        result = axapi_call(self.module, self.session_url + '&method=' + method, post)
+        if self.cache_file and axapi_failure(result):
+            err = result['response'].get('err', {})
+            if 'session' in str(err.get('msg', '')).lower():
+                self._login()
+                result = axapi_call(self.module, self.session_url + '&method=' + method, post)
+        return result
+
+    def close(self):
+        # cached sessions are left open for the next task
+        if not self.cache_file:
+            self.call('session.close')
+
+
+def port_needs_update(src_ports, dst_ports):
+    '''
+    Checks to determine if the port definitions of the src_ports
+    array are in or different from those in dst_ports. If there is
+    a difference, this function returns true, otherwise false.
+    '''
+    for src_port in src_ports:
+        found = False
+        different = False
+        for dst_port in dst_ports:
+            if src_port['port_num'] == dst_port['port_num']:
+                found = True
+                for valid_field in VALID_PORT_FIELDS:
+                    if src_port[valid_field] != dst_port[valid_field]:
+                        different = True
+                        break
+                if found or different:
+                    break
+        if not found or different:
+            return True
+    # every port from the src exists in the dst, and none of them were different
+    return False
+
+def status_needs_update(current_status, new_status):
+    '''
+    Check to determine if we want to change the status of a server.
+    If there is a difference between the current status of the server and
+    the desired status, return true, otherwise false.
+    '''
+    if current_status != new_status:
+        return True
+    return False
+
+def ensure_server(module, session, state, slb_server, slb_server_ip, slb_server_status, slb_server_ports, slb_server_data):
+    '''
+    Brings one server to the requested state. slb_server_data is the current
+    definition of the server, or None if it does not exist on the device.
+    Returns (changed, result).
+    '''
     json_post = {
         'server': {
             'name': slb_server,
@@ -197,53 +307,17 @@ def main():
     if slb_server_status:
         json_post['server']['status'] = axapi_enabled_disabled(slb_server_status)
 
-    slb_server_data = axapi_call(module, session_url + '&method=slb.server.search', json.dumps({'name': slb_server}))
-    slb_server_exists = not axapi_failure(slb_server_data)
-
     changed = False
     if state == 'present':
-        if not slb_server_exists:
+        if slb_server_data is None:
             if not slb_server_ip:
                 module.fail_json(msg='you must specify an IP address when creating a server')
 
-            result = axapi_call(module, session_url + '&method=slb.server.create', json.dumps(json_post))
+            result = session.call('slb.server.create', json.dumps(json_post))
             if axapi_failure(result):
                 module.fail_json(msg="failed to create the server: %s" % result['response']['err']['msg'])
             changed = True
         else:
-            def port_needs_update(src_ports, dst_ports):
-                '''
-                Checks to determine if the port definitions of the src_ports
-                array are in or different from those in dst_ports. If there is
-                a difference, this function returns true, otherwise false.
-                '''
-                for src_port in src_ports:
-                    found = False
-                    different = False
-                    for dst_port in dst_ports:
-                        if src_port['port_num'] == dst_port['port_num']:
-                            found = True
-                            for valid_field in VALID_PORT_FIELDS:
-                                if src_port[valid_field] != dst_port[valid_field]:
-                                    different = True
-                                    break
-                            if found or different:
-                                break
-                    if not found or different:
-                        return True
-                # every port from the src exists in the dst, and none of them were different
-                return False
-
-            def status_needs_update(current_status, new_status):
-                '''
-                Check to determine if we want to change the status of a server.
-                If there is a difference between the current status of the server and
-                the desired status, return true, otherwise false.
-                '''
-                if current_status != new_status:
-                    return True
-                return False
-
             defined_ports = slb_server_data.get('server', {}).get('port_list', [])
             current_status = slb_server_data.get('server', {}).get('status')
 
@@ -252,7 +326,7 @@ def main():
             # - in case ports are missing from those on the device
             # - in case we are change the status of a server
             if port_needs_update(defined_ports, slb_server_ports) or port_needs_update(slb_server_ports, defined_ports) or status_needs_update(current_status, axapi_enabled_disabled(slb_server_status)):
-                result = axapi_call(module, session_url + '&method=slb.server.update', json.dumps(json_post))
+                result = session.call('slb.server.update', json.dumps(json_post))
                 if axapi_failure(result):
                     module.fail_json(msg="failed to update the server: %s" % result['response']['err']['msg'])
                 changed = True
@@ -260,24 +334,104 @@ def main():
         # if we changed things, get the full info regarding
         # the service group for the return data below
         if changed:
-            result = axapi_call(module, session_url + '&method=slb.server.search', json.dumps({'name': slb_server}))
+            result = session.call('slb.server.search', json.dumps({'name': slb_server}))
         else:
             result = slb_server_data
     elif state == 'absent':
-        if slb_server_exists:
-            result = axapi_call(module, session_url + '&method=slb.server.delete', json.dumps({'name': slb_server}))
+        if slb_server_data is not None:
+            result = session.call('slb.server.delete', json.dumps({'name': slb_server}))
             changed = True
         else:
             result = dict(msg="the server was not present")
 
+    return changed, result
+
+def main():
+    argument_spec = a10_argument_spec()
+    argument_spec.update(url_argument_spec())
+    argument_spec.update(
+        dict(
+            state=dict(type='str', default='present', choices=['present', 'absent']),
+            server_name=dict(type='str', aliases=['server']),
+            server_ip=dict(type='str', aliases=['ip', 'address']),
+            server_status=dict(type='str', default='enabled', aliases=['status'], choices=['enabled', 'disabled']),
+            server_ports=dict(type='list', aliases=['port'], default=[]),
+            servers=dict(type='list'),
+            session_cache=dict(type='bool', default=False),
+        )
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        mutually_exclusive=[['server_name', 'servers']],
+        supports_check_mode=False
+    )
+
+    host = module.params['host']
+    username = module.params['username']
+    password = module.params['password']
+    state = module.params['state']
+    write_config = module.params['write_config']
+    slb_server = module.params['server_name']
+    slb_server_ip = module.params['server_ip']
+    slb_server_status = module.params['server_status']
+    slb_server_ports = module.params['server_ports']
+    slb_servers = module.params['servers']
+
+    if slb_server is None and not slb_servers:
+        module.fail_json(msg='server_name is required')
+
+    # validate the ports data structure
+    if slb_servers:
+        for item in slb_servers:
+            if not isinstance(item, dict) or not item.get('server_name'):
+                module.fail_json(msg="servers entries must be hashes with at least server_name: %s" % item)
+            item.setdefault('server_ports', [])
+            validate_ports(module, item['server_ports'])
+    else:
+        validate_ports(module, slb_server_ports)
+
+    cache_dir = None
+    if module.params['session_cache']:
+        cache_dir = AXAPI_SESSION_CACHE
+    axapi_base_url = 'https://%s/services/rest/V2.1/?format=json' % host
+    session = AxapiSession(module, axapi_base_url, username, password, cache_dir)
+
+    if slb_servers:
+        # fetch every server once and work from that
+        all_servers = session.call('slb.server.getAll')
+        if axapi_failure(all_servers):
+            module.fail_json(msg="failed to list the servers: %s" % all_servers['response']['err']['msg'])
+        current = {}
+        for server in all_servers.get('server_list', []):
+            current[server['name']] = {'server': server}
+
+        changed = False
+        result = []
+        for item in slb_servers:
+            item_changed, item_result = ensure_server(module, session, item.get('state', state),
+                                                      item['server_name'],
+                                                      item.get('server_ip'),
+                                                      item.get('server_status', slb_server_status),
+                                                      item['server_ports'],
+                                                      current.get(item['server_name']))
+            changed = changed or item_changed
+            result.append(item_result)
+    else:
+        slb_server_data = session.call('slb.server.search', json.dumps({'name': slb_server}))
+        if axapi_failure(slb_server_data):
+            slb_server_data = None
+        changed, result = ensure_server(module, session, state, slb_server, slb_server_ip,
+                                        slb_server_status, slb_server_ports, slb_server_data)
+
     # if the config has changed, or we want to force a save, save the config unless otherwise requested
     if changed or write_config:
-        write_result = axapi_call(module, session_url + '&method=system.action.write_memory')
+        write_result = session.call('system.action.write_memory')
         if axapi_failure(write_result):
             module.fail_json(msg="failed to save the configuration: %s" % write_result['response']['err']['msg'])
 
     # log out of the session nicely and exit
-    axapi_call(module, session_url + '&method=session.close')
+    session.close()
     module.exit_json(changed=changed, content=result)
 
 # standard ansible module imports
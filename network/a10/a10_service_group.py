@@ -56,8 +56,8 @@ options:
     choices: []
   service_group:
     description:
-      - slb service-group name
-    required: true
+      - slb service-group name. Required unless C(service_groups) is given.
+    required: false
     default: null
     aliases: ['service', 'pool', 'group']
     choices: []
@@ -84,6 +84,26 @@ options:
     default: null
     aliases: []
     choices: []
+  service_groups:
+    description:
+      - A list of service groups to manage in a single session. Each item is a
+        dictionary with C(service_group) and optionally C(service_group_protocol),
+        C(service_group_method), C(servers) and C(state), which default to the
+        module level values. The current groups and servers are each read with
+        one call and only the groups that differ are updated. Mutually exclusive
+        with C(service_group).
+    required: false
+    default: null
+    version_added: "2.0"
+  session_cache:
+    description:
+      - Keep the aXAPI session id under C(~/.ansible/cache/a10) and reuse it
+        in later tasks against the same device instead of logging in and out
+        each time. An expired session is replaced by a new login.
+    required: false
+    default: false
+    choices: ['yes', 'no']
+    version_added: "2.0"
   write_config:
     description:
       - If C(yes), any changes will cause a write of the running configuration
@@ -121,11 +141,38 @@ EXAMPLES = '''
         port: 8080
         status: disabled
 
+# Manage several service-groups in one session
+- a10_service_group:
+    host: a10.mydomain.com
+    username: myadmin
+    password: mypassword
+    session_cache: yes
+    service_groups:
+      - service_group: sg-80-tcp
+        servers:
+          - server: foo1.mydomain.com
+            port: 8080
+      - service_group: sg-443-tcp
+        service_group_method: least-connection
+        servers:
+          - server: foo1.mydomain.com
+            port: 8443
+      - service_group: sg-old
+        state: absent
+
 '''
 
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import sha as sha1
+
 VALID_SERVICE_GROUP_FIELDS = ['name', 'protocol', 'lb_method']
 VALID_SERVER_FIELDS = ['server', 'port', 'status']
 
+# where session ids are kept when session_cache is enabled
+AXAPI_SESSION_CACHE = '~/.ansible/cache/a10'
+
 def validate_servers(module, servers):
     for item in servers:
         for key in item:
@@ -152,101 +199,113 @@ def validate_servers(module, servers):
             item['status'] = 1
 
 
-def main():
-    argument_spec = a10_argument_spec()
-    argument_spec.update(url_argument_spec())
-    argument_spec.update(
-        dict(
-            state=dict(type='str', default='present', choices=['present', 'absent']),
-            service_group=dict(type='str', aliases=['service', 'pool', 'group'], required=True),
-            service_group_protocol=dict(type='str', default='tcp', aliases=['proto', 'protocol'], choices=['tcp', 'udp']),
-            service_group_method=dict(type='str', default='round-robin',
-                                      aliases=['method'],
-                                      choices=['round-robin',
-                                               'weighted-rr',
-                                               'least-connection',
-                                               'weighted-least-connection',
-                                               'service-least-connection',
-                                               'service-weighted-least-connection',
-                                               'fastest-response',
-                                               'least-request',
-                                               'round-robin-strict',
-                                               'src-ip-only-hash',
-                                               'src-ip-hash']),
-            servers=dict(type='list', aliases=['server', 'member'], default=[]),
-        )
-    )
-
-    module = AnsibleModule(
-        argument_spec=argument_spec,
-        supports_check_mode=False
-    )
-
-    host = module.params['host']
-    username = module.params['username']
-    password = module.params['password']
-    state = module.params['state']
-    write_config = module.params['write_config']
-    slb_service_group = module.params['service_group']
-    slb_service_group_proto = module.params['service_group_protocol']
-    slb_service_group_method = module.params['service_group_method']
-    slb_servers = module.params['servers']
-
-    if slb_service_group is None:
-        module.fail_json(msg='service_group is required')
-
-    axapi_base_url = 'https://' + host + '/services/rest/V2.1/?format=json'
-    load_balancing_methods = {'round-robin': 0,
-                              'weighted-rr': 1,
-                              'least-connection': 2,
-                              'weighted-least-connection': 3,
-                              'service-least-connection': 4,
-                              'service-weighted-least-connection': 5,
-                              'fastest-response': 6,
-                              'least-request': 7,
-                              'round-robin-strict': 8,
-                              'src-ip-only-hash': 14,
-                              'src-ip-hash': 15}
-
+class AxapiSession(object):
+    '''
+    aXAPI session. With a cache_dir the session id is kept on disk and
+    reused by later tasks against the same device, and a cached session
+    the device no longer accepts is replaced by a fresh login. The same
+    class is carried by a10_server, a10_service_group and
+    a10_virtual_server, keep the copies identical.
+    '''
+
+    def __init__(self, module, base_url, username, password, cache_dir=None):
+        self.module = module
+        self.credentials = (base_url, username, password)
+        self.cache_file = None
+        session_id = None
+        if cache_dir:
+            key = sha1('%s|%s' % (base_url, username)).hexdigest()
+            self.cache_file = os.path.join(os.path.expanduser(cache_dir), key)
+            try:
+                f = open(self.cache_file)
+                try:
+                    session_id = f.read().strip()
+                finally:
+                    f.close()
+            except IOError:
+                pass
+        if session_id:
+            self.session_url = base_url + '&session_id=' + session_id
+        else:
+            self._login()
+
+    def _login(self):
+        base_url, username, password = self.credentials
+        self.session_url = axapi_authenticate(self.module, base_url, username, password)
+        if not self.cache_file:
+            return
+        try:
+            if not os.path.isdir(os.path.dirname(self.cache_file)):
+                os.makedirs(os.path.dirname(self.cache_file), 0700)
+            fd = os.open(self.cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+            os.write(fd, self.session_url.split('&session_id=')[-1])
+            os.close(fd)
+        except (IOError, OSError):
+            # the cache is only an optimization
+            pass
+
+    def call(self, method, post=None):
+        result = axapi_call(self.module, self.session_url + '&method=' + method, post)
+        if self.cache_file and axapi_failure(result):
+            err = result['response'].get('err', {})
+            if 'session' in str(err.get('msg', '')).lower():
+                self._login()
+                result = axapi_call(self.module, self.session_url + '&method=' + method, post)
+        return result
+
+    def close(self):
+        # cached sessions are left open for the next task
+        if not self.cache_file:
+            self.call('session.close')
+
+
+LOAD_BALANCING_METHODS = {'round-robin': 0,
+                          'weighted-rr': 1,
+                          'least-connection': 2,
+                          'weighted-least-connection': 3,
+                          'service-least-connection': 4,
+                          'service-weighted-least-connection': 5,
+                          'fastest-response': 6,
+                          'least-request': 7,
+                          'round-robin-strict': 8,
+                          'src-ip-only-hash': 14,
+                          'src-ip-hash': 15}
+
+def ensure_service_group(module, session, state, slb_service_group, slb_service_group_proto,
+                         slb_service_group_method, slb_servers, slb_result, known_servers):
+    '''
+    Brings one service group to the requested state. slb_result is the
+    current definition of the group, or None if it does not exist, and
+    known_servers is the set of server names defined on the device.
+    Returns (changed, result).
+    '''
     if not slb_service_group_proto or slb_service_group_proto.lower() == 'tcp':
         protocol = 2
     else:
         protocol = 3
 
-    # validate the server data list structure
-    validate_servers(module, slb_servers)
-
     json_post = {
         'service_group': {
             'name': slb_service_group,
             'protocol': protocol,
-            'lb_method': load_balancing_methods[slb_service_group_method],
+            'lb_method': LOAD_BALANCING_METHODS[slb_service_group_method],
         }
     }
 
-    # first we authenticate to get a session id
-    session_url = axapi_authenticate(module, axapi_base_url, username, password)
-
-    # then we check to see if the specified group exists
-    slb_result = axapi_call(module, session_url + '&method=slb.service_group.search', json.dumps({'name': slb_service_group}))
-    slb_service_group_exist = not axapi_failure(slb_result)
-
     changed = False
     if state == 'present':
         # before creating/updating we need to validate that servers
         # defined in the servers list exist to prevent errors
-        checked_servers = []
         for server in slb_servers:
-            result = axapi_call(module, session_url + '&method=slb.server.search', json.dumps({'name': server['server']}))
-            if axapi_failure(result):
+            if server['server'] not in known_servers:
                 module.fail_json(msg="the server %s specified in the servers list does not exist" % server['server'])
-            checked_servers.append(server['server'])
 
-        if not slb_service_group_exist:
-            result = axapi_call(module, session_url + '&method=slb.service_group.create', json.dumps(json_post))
+        if slb_result is None:
+            result = session.call('slb.service_group.create', json.dumps(json_post))
             if axapi_failure(result):
                 module.fail_json(msg=result['response']['err']['msg'])
             changed = True
+            slb_result = {}
         else:
             # check to see if the service group definition without the
             # server members is different, and update that individually
@@ -258,7 +317,7 @@ def main():
                     break
 
             if do_update:
-                result = axapi_call(module, session_url + '&method=slb.service_group.update', json.dumps(json_post))
+                result = session.call('slb.service_group.update', json.dumps(json_post))
                 if axapi_failure(result):
                     module.fail_json(msg=result['response']['err']['msg'])
                 changed = True
@@ -287,10 +346,10 @@ def main():
                 "member": server,
             }
             if not found:
-                result = axapi_call(module, session_url + '&method=slb.service_group.member.create', json.dumps(server_data))
+                result = session.call('slb.service_group.member.create', json.dumps(server_data))
                 changed = True
             elif different:
-                result = axapi_call(module, session_url + '&method=slb.service_group.member.update', json.dumps(server_data))
+                result = session.call('slb.service_group.member.update', json.dumps(server_data))
                 changed = True
 
         # finally, remove any servers that are on the target
@@ -307,30 +366,136 @@ def main():
                 "member": server,
             }
             if not found:
-                result = axapi_call(module, session_url + '&method=slb.service_group.member.delete', json.dumps(server_data))
+                result = session.call('slb.service_group.member.delete', json.dumps(server_data))
                 changed = True
 
         # if we changed things, get the full info regarding
         # the service group for the return data below
         if changed:
-            result = axapi_call(module, session_url + '&method=slb.service_group.search', json.dumps({'name': slb_service_group}))
+            result = session.call('slb.service_group.search', json.dumps({'name': slb_service_group}))
         else:
             result = slb_result
     elif state == 'absent':
-        if slb_service_group_exist:
-            result = axapi_call(module, session_url + '&method=slb.service_group.delete', json.dumps({'name': slb_service_group}))
+        if slb_result is not None:
+            result = session.call('slb.service_group.delete', json.dumps({'name': slb_service_group}))
             changed = True
         else:
             result = dict(msg="the service group was not present")
 
+    return changed, result
+
+def get_server_names(module, session):
+    '''
+    Returns the names of all servers defined on the device, fetched
+    with a single call instead of one search per server.
+    '''
+    result = session.call('slb.server.getAll')
+    if axapi_failure(result):
+        module.fail_json(msg="failed to list the servers: %s" % result['response']['err']['msg'])
+    return set([server['name'] for server in result.get('server_list', [])])
+
+def main():
+    argument_spec = a10_argument_spec()
+    argument_spec.update(url_argument_spec())
+    argument_spec.update(
+        dict(
+            state=dict(type='str', default='present', choices=['present', 'absent']),
+            service_group=dict(type='str', aliases=['service', 'pool', 'group']),
+            service_group_protocol=dict(type='str', default='tcp', aliases=['proto', 'protocol'], choices=['tcp', 'udp']),
+            service_group_method=dict(type='str', default='round-robin',
+                                      aliases=['method'],
+                                      choices=LOAD_BALANCING_METHODS.keys()),
+            servers=dict(type='list', aliases=['server', 'member'], default=[]),
+            service_groups=dict(type='list'),
+            session_cache=dict(type='bool', default=False),
+        )
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        mutually_exclusive=[['service_group', 'service_groups']],
+        supports_check_mode=False
+    )
+
+    host = module.params['host']
+    username = module.params['username']
+    password = module.params['password']
+    state = module.params['state']
+    write_config = module.params['write_config']
+    slb_service_group = module.params['service_group']
+    slb_service_group_proto = module.params['service_group_protocol']
+    slb_service_group_method = module.params['service_group_method']
+    slb_servers = module.params['servers']
+    slb_service_groups = module.params['service_groups']
+
+    if slb_service_group is None and not slb_service_groups:
+        module.fail_json(msg='service_group is required')
+
+    axapi_base_url = 'https://' + host + '/services/rest/V2.1/?format=json'
+
+    # validate the server data list structure
+    if slb_service_groups:
+        for item in slb_service_groups:
+            if not isinstance(item, dict) or not item.get('service_group'):
+                module.fail_json(msg="service_groups entries must be hashes with at least service_group: %s" % item)
+            method = item.get('service_group_method', slb_service_group_method)
+            if method not in LOAD_BALANCING_METHODS:
+                module.fail_json(msg="invalid service_group_method (%s), must be one of: %s" % (method, ','.join(LOAD_BALANCING_METHODS)))
+            item.setdefault('servers', [])
+            validate_servers(module, item['servers'])
+    else:
+        validate_servers(module, slb_servers)
+
+    # first we authenticate to get a session id
+    cache_dir = None
+    if module.params['session_cache']:
+        cache_dir = AXAPI_SESSION_CACHE
+    session = AxapiSession(module, axapi_base_url, username, password, cache_dir)
+
+    known_servers = set()
+    if slb_service_groups:
+        if [item for item in slb_service_groups if item['servers']]:
+            known_servers = get_server_names(module, session)
+
+        # fetch every service group once and work from that
+        all_groups = session.call('slb.service_group.getAll')
+        if axapi_failure(all_groups):
+            module.fail_json(msg="failed to list the service groups: %s" % all_groups['response']['err']['msg'])
+        current = {}
+        for group in all_groups.get('service_group_list', []):
+            current[group['name']] = {'service_group': group}
+
+        changed = False
+        result = []
+        for item in slb_service_groups:
+            item_changed, item_result = ensure_service_group(module, session, item.get('state', state),
+                                                             item['service_group'],
+                                                             item.get('service_group_protocol', slb_service_group_proto),
+                                                             item.get('service_group_method', slb_service_group_method),
+                                                             item['servers'],
+                                                             current.get(item['service_group']),
+                                                             known_servers)
+            changed = changed or item_changed
+            result.append(item_result)
+    else:
+        if slb_servers and state == 'present':
+            known_servers = get_server_names(module, session)
+
+        # then we check to see if the specified group exists
+        slb_result = session.call('slb.service_group.search', json.dumps({'name': slb_service_group}))
+        if axapi_failure(slb_result):
+            slb_result = None
+        changed, result = ensure_service_group(module, session, state, slb_service_group, slb_service_group_proto,
+                                               slb_service_group_method, slb_servers, slb_result, known_servers)
+
     # if the config has changed, save the config unless otherwise requested
     if changed and write_config:
-        write_result = axapi_call(module, session_url + '&method=system.action.write_memory')
+        write_result = session.call('system.action.write_memory')
         if axapi_failure(write_result):
             module.fail_json(msg="failed to save the configuration: %s" % write_result['response']['err']['msg'])
 
     # log out of the session nicely and exit
-    axapi_call(module, session_url + '&method=session.close')
+    session.close()
     module.exit_json(changed=changed, content=result)
 
 # standard ansible module imports
@@ -58,8 +58,8 @@ options:
     choices: []
   virtual_server:
     description:
-      - slb virtual server name
-    required: true
+      - slb virtual server name. Required unless C(virtual_servers) is given.
+    required: false
     default: null
     aliases: ['vip', 'virtual']
     choices: []
@@ -84,6 +84,26 @@ options:
         specify the C(service_group:) as well as the C(status:). See the examples
         below for details. This parameter is required when C(state) is C(present).
     required: false
+  virtual_servers:
+    description:
+      - A list of virtual servers to manage in a single session. Each item is a
+        dictionary with C(virtual_server) and optionally C(virtual_server_ip),
+        C(virtual_server_status), C(virtual_server_ports) and C(state), which
+        default to the module level values. The current virtual servers and
+        service groups are each read with one call and only the virtual servers
+        that differ are updated. Mutually exclusive with C(virtual_server).
+    required: false
+    default: null
+    version_added: "2.0"
+  session_cache:
+    description:
+      - Keep the aXAPI session id under C(~/.ansible/cache/a10) and reuse it
+        in later tasks against the same device instead of logging in and out
+        each time. An expired session is replaced by a new login.
+    required: false
+    default: false
+    choices: ['yes', 'no']
+    version_added: "2.0"
   write_config:
     description:
       - If C(yes), any changes will cause a write of the running configuration
@@ -122,10 +142,38 @@ EXAMPLES = '''
         protocol: http
         status: disabled
 
+# Manage several virtual servers in one session
+- a10_virtual_server:
+    host: a10.mydomain.com
+    username: myadmin
+    password: mypassword
+    session_cache: yes
+    virtual_servers:
+      - virtual_server: vserver1
+        virtual_server_ip: 1.1.1.1
+        virtual_server_ports:
+          - port: 80
+            protocol: TCP
+            service_group: sg-80-tcp
+      - virtual_server: vserver2
+        virtual_server_ip: 1.1.1.2
+        virtual_server_ports:
+          - port: 443
+            protocol: HTTPS
+            service_group: sg-443-https
+
 '''
 
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import sha as sha1
+
 VALID_PORT_FIELDS = ['port', 'protocol', 'service_group', 'status']
 
+# where session ids are kept when session_cache is enabled
+AXAPI_SESSION_CACHE = '~/.ansible/cache/a10'
+
 def validate_ports(module, ports):
     for item in ports:
         for key in item:
@@ -162,47 +210,102 @@ def validate_ports(module, ports):
         if 'service_group' not in item:
             item['service_group'] = ''
 
-def main():
-    argument_spec = a10_argument_spec()
-    argument_spec.update(url_argument_spec())
-    argument_spec.update(
-        dict(
-            state=dict(type='str', default='present', choices=['present', 'absent']),
-            virtual_server=dict(type='str', aliases=['vip', 'virtual'], required=True),
-            virtual_server_ip=dict(type='str', aliases=['ip', 'address'], required=True),
-            virtual_server_status=dict(type='str', default='enabled', aliases=['status'], choices=['enabled', 'disabled']),
-            virtual_server_ports=dict(type='list', required=True),
-        )
-    )
-
-    module = AnsibleModule(
-        argument_spec=argument_spec,
-        supports_check_mode=False
-    )
-
-    host = module.params['host']
-    username = module.params['username']
-    password = module.params['password']
-    state = module.params['state']
-    write_config = module.params['write_config']
-    slb_virtual = module.params['virtual_server']
-    slb_virtual_ip = module.params['virtual_server_ip']
-    slb_virtual_status = module.params['virtual_server_status']
-    slb_virtual_ports = module.params['virtual_server_ports']
-
-    if slb_virtual is None:
-        module.fail_json(msg='virtual_server is required')
-
-    validate_ports(module, slb_virtual_ports)
-
-    axapi_base_url = 'https://%s/services/rest/V2.1/?format=json' % host
-    session_url = axapi_authenticate(module, axapi_base_url, username, password)
-
-    slb_virtual_data = axapi_call(module, session_url + '&method=slb.virtual_server.search', json.dumps({'name': slb_virtual}))
-    slb_virtual_exists = not axapi_failure(slb_virtual_data)
-
+class AxapiSession(object):
+    '''
+    aXAPI session. With a cache_dir the session id is kept on disk and
+    reused by later tasks against the same device, and a cached session
+    the device no longer accepts is replaced by a fresh login. The same
+    class is carried by a10_server, a10_service_group and
+    a10_virtual_server, keep the copies identical.
+    '''
+
+    def __init__(self, module, base_url, username, password, cache_dir=None):
+        self.module = module
+        self.credentials = (base_url, username, password)
+        self.cache_file = None
+        session_id = None
+        if cache_dir:
+            key = sha1('%s|%s' % (base_url, username)).hexdigest()
+            self.cache_file = os.path.join(os.path.expanduser(cache_dir), key)
+            try:
+                f = open(self.cache_file)
+                try:
+                    session_id = f.read().strip()
+                finally:
+                    f.close()
+            except IOError:
+                pass
+        if session_id:
+            self.session_url = base_url + '&session_id=' + session_id
+        else:
+            self._login()
+
+    def _login(self):
+        base_url, username, password = self.credentials
+        self.session_url = axapi_authenticate(self.module, base_url, username, password)
+        if not self.cache_file:
+            return
+        try:
+            if not os.path.isdir(os.path.dirname(self.cache_file)):
+                os.makedirs(os.path.dirname(self.cache_file), 0700)
+            fd = os.open(self.cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+            os.write(fd, self.session_url.split('&session_id=')[-1])
+            os.close(fd)
+        except (IOError, OSError):
+            # the cache is only an optimization
+            pass
+
+    def call(self, method, post=None):
+        result = axapi_call(self.module, self.session_url + '&method=' + method, post)
+        if self.cache_file and axapi_failure(result):
+            err = result['response'].get('err', {})
+            if 'session' in str(err.get('msg', '')).lower():
+                self._login()
+                result = axapi_call(self.module, self.session_url + '&method=' + method, post)
+        return result
+
+    def close(self):
+        # cached sessions are left open for the next task
+        if not self.cache_file:
+            self.call('session.close')
+
+
+def needs_update(src_ports, dst_ports):
+    '''
+    Checks to determine if the port definitions of the src_ports
+    array are in or different from those in dst_ports. If there is
+    a difference, this function returns true, otherwise false.
+    '''
+    for src_port in src_ports:
+        found = False
+        different = False
+        for dst_port in dst_ports:
+            if src_port['port'] == dst_port['port']:
+                found = True
+                for valid_field in VALID_PORT_FIELDS:
+                    if src_port[valid_field] != dst_port[valid_field]:
+                        different = True
+                        break
+                if found or different:
+                    break
+        if not found or different:
+            return True
+    # every port from the src exists in the dst, and none of them were different
+    return False
+
+def ensure_virtual_server(module, session, state, slb_virtual, slb_virtual_ip, slb_virtual_status,
+                          slb_virtual_ports, slb_virtual_data, known_service_groups):
+    '''
+    Brings one virtual server to the requested state. slb_virtual_data is
+    the current definition of the virtual server, or None if it does not
+    exist, and known_service_groups is the set of service group names
+    defined on the device. Returns (changed, result).
+    '''
     changed = False
     if state == 'present':
+        if not slb_virtual_ip:
+            module.fail_json(msg="virtual_server_ip is required for the virtual server %s" % slb_virtual)
+
         json_post = {
             'virtual_server': {
                 'name': slb_virtual,
@@ -216,53 +319,26 @@ def main():
         # service groups defined in the ports list exist since
         # since the API will still create port definitions for
         # them while indicating a failure occurred
-        checked_service_groups = []
         for port in slb_virtual_ports:
-            if 'service_group' in port and port['service_group'] not in checked_service_groups:
-                # skip blank service group entries
-                if port['service_group'] == '':
-                    continue
-                result = axapi_call(module, session_url + '&method=slb.service_group.search', json.dumps({'name': port['service_group']}))
-                if axapi_failure(result):
-                    module.fail_json(msg="the service group %s specified in the ports list does not exist" % port['service_group'])
-                checked_service_groups.append(port['service_group'])
-
-        if not slb_virtual_exists:
-            result = axapi_call(module, session_url + '&method=slb.virtual_server.create', json.dumps(json_post))
+            # skip blank service group entries
+            if port.get('service_group', '') == '':
+                continue
+            if port['service_group'] not in known_service_groups:
+                module.fail_json(msg="the service group %s specified in the ports list does not exist" % port['service_group'])
+
+        if slb_virtual_data is None:
+            result = session.call('slb.virtual_server.create', json.dumps(json_post))
             if axapi_failure(result):
                 module.fail_json(msg="failed to create the virtual server: %s" % result['response']['err']['msg'])
             changed = True
         else:
-            def needs_update(src_ports, dst_ports):
-                '''
-                Checks to determine if the port definitions of the src_ports
-                array are in or different from those in dst_ports. If there is
-                a difference, this function returns true, otherwise false.
-                '''
-                for src_port in src_ports:
-                    found = False
-                    different = False
-                    for dst_port in dst_ports:
-                        if src_port['port'] == dst_port['port']:
-                            found = True
-                            for valid_field in VALID_PORT_FIELDS:
-                                if src_port[valid_field] != dst_port[valid_field]:
-                                    different = True
-                                    break
-                            if found or different:
-                                break
-                    if not found or different:
-                        return True
-                # every port from the src exists in the dst, and none of them were different
-                return False
-
             defined_ports = slb_virtual_data.get('virtual_server', {}).get('vport_list', [])
 
             # we check for a needed update both ways, in case ports
             # are missing from either the ones specified by the user
             # or from those on the device
             if needs_update(defined_ports, slb_virtual_ports) or needs_update(slb_virtual_ports, defined_ports):
-                result = axapi_call(module, session_url + '&method=slb.virtual_server.update', json.dumps(json_post))
+                result = session.call('slb.virtual_server.update', json.dumps(json_post))
                 if axapi_failure(result):
                     module.fail_json(msg="failed to create the virtual server: %s" % result['response']['err']['msg'])
                 changed = True
@@ -270,24 +346,130 @@ def main():
         # if we changed things, get the full info regarding
         # the service group for the return data below
         if changed:
-            result = axapi_call(module, session_url + '&method=slb.virtual_server.search', json.dumps({'name': slb_virtual}))
+            result = session.call('slb.virtual_server.search', json.dumps({'name': slb_virtual}))
         else:
             result = slb_virtual_data
     elif state == 'absent':
-        if slb_virtual_exists:
-            result = axapi_call(module, session_url + '&method=slb.virtual_server.delete', json.dumps({'name': slb_virtual}))
+        if slb_virtual_data is not None:
+            result = session.call('slb.virtual_server.delete', json.dumps({'name': slb_virtual}))
             changed = True
         else:
             result = dict(msg="the virtual server was not present")
 
+    return changed, result
+
+def get_service_group_names(module, session):
+    '''
+    Returns the names of all service groups defined on the device, fetched
+    with a single call instead of one search per service group.
+    '''
+    result = session.call('slb.service_group.getAll')
+    if axapi_failure(result):
+        module.fail_json(msg="failed to list the service groups: %s" % result['response']['err']['msg'])
+    return set([group['name'] for group in result.get('service_group_list', [])])
+
+def main():
+    argument_spec = a10_argument_spec()
+    argument_spec.update(url_argument_spec())
+    argument_spec.update(
+        dict(
+            state=dict(type='str', default='present', choices=['present', 'absent']),
+            virtual_server=dict(type='str', aliases=['vip', 'virtual']),
+            virtual_server_ip=dict(type='str', aliases=['ip', 'address']),
+            virtual_server_status=dict(type='str', default='enabled', aliases=['status'], choices=['enabled', 'disabled']),
+            virtual_server_ports=dict(type='list'),
+            virtual_servers=dict(type='list'),
+            session_cache=dict(type='bool', default=False),
+        )
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        mutually_exclusive=[['virtual_server', 'virtual_servers']],
+        required_together=[['virtual_server', 'virtual_server_ip', 'virtual_server_ports']],
+        supports_check_mode=False
+    )
+
+    host = module.params['host']
+    username = module.params['username']
+    password = module.params['password']
+    state = module.params['state']
+    write_config = module.params['write_config']
+    slb_virtual = module.params['virtual_server']
+    slb_virtual_ip = module.params['virtual_server_ip']
+    slb_virtual_status = module.params['virtual_server_status']
+    slb_virtual_ports = module.params['virtual_server_ports']
+    slb_virtuals = module.params['virtual_servers']
+
+    if slb_virtual is None and not slb_virtuals:
+        module.fail_json(msg='virtual_server is required')
+
+    if slb_virtuals:
+        for item in slb_virtuals:
+            if not isinstance(item, dict) or not item.get('virtual_server'):
+                module.fail_json(msg="virtual_servers entries must be hashes with at least virtual_server: %s" % item)
+            item.setdefault('virtual_server_ports', [])
+            validate_ports(module, item['virtual_server_ports'])
+    else:
+        validate_ports(module, slb_virtual_ports)
+
+    cache_dir = None
+    if module.params['session_cache']:
+        cache_dir = AXAPI_SESSION_CACHE
+    axapi_base_url = 'https://%s/services/rest/V2.1/?format=json' % host
+    session = AxapiSession(module, axapi_base_url, username, password, cache_dir)
+
+    if slb_virtuals:
+        entries = slb_virtuals
+    else:
+        entries = [dict(virtual_server=slb_virtual,
+                        virtual_server_ip=slb_virtual_ip,
+                        virtual_server_ports=slb_virtual_ports)]
+
+    # one listing of the service groups validates every port definition
+    known_service_groups = set()
+    for item in entries:
+        if item.get('state', state) == 'present' and [p for p in item['virtual_server_ports'] if p['service_group']]:
+            known_service_groups = get_service_group_names(module, session)
+            break
+
+    if slb_virtuals:
+        # fetch every virtual server once and work from that
+        all_virtuals = session.call('slb.virtual_server.getAll')
+        if axapi_failure(all_virtuals):
+            module.fail_json(msg="failed to list the virtual servers: %s" % all_virtuals['response']['err']['msg'])
+        current = {}
+        for virtual in all_virtuals.get('virtual_server_list', []):
+            current[virtual['name']] = {'virtual_server': virtual}
+
+        changed = False
+        result = []
+        for item in slb_virtuals:
+            item_changed, item_result = ensure_virtual_server(module, session, item.get('state', state),
+                                                              item['virtual_server'],
+                                                              item.get('virtual_server_ip'),
+                                                              item.get('virtual_server_status', slb_virtual_status),
+                                                              item['virtual_server_ports'],
+                                                              current.get(item['virtual_server']),
+                                                              known_service_groups)
+            changed = changed or item_changed
+            result.append(item_result)
+    else:
+        slb_virtual_data = session.call('slb.virtual_server.search', json.dumps({'name': slb_virtual}))
+        if axapi_failure(slb_virtual_data):
+            slb_virtual_data = None
+        changed, result = ensure_virtual_server(module, session, state, slb_virtual, slb_virtual_ip,
+                                                slb_virtual_status, slb_virtual_ports, slb_virtual_data,
+                                                known_service_groups)
+
     # if the config has changed, save the config unless otherwise requested
     if changed and write_config:
-        write_result = axapi_call(module, session_url + '&method=system.action.write_memory')
+        write_result = session.call('system.action.write_memory')
         if axapi_failure(write_result):
             module.fail_json(msg="failed to save the configuration: %s" % write_result['response']['err']['msg'])
 
     # log out of the session nicely and exit
-    axapi_call(module, session_url + '&method=session.close')
+    session.close()
     module.exit_json(changed=changed, content=result)
 
 # standard ansible module imports
@@ -296,4 +478,3 @@ from ansible.module_utils.urls import *
 from ansible.module_utils.a10 import *
 
 main()
-
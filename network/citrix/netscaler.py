@@ -73,6 +73,24 @@ options:
     default: server
     choices: ["server", "service"]
     aliases: []
+  names:
+    description:
+      - list of entities to act on in a single request. With C(type=server)
+        the current state of all servers is read first and only the ones not
+        already in the requested state are changed. Overrides C(name).
+    required: false
+    default: null
+    version_added: "2.0"
+  session_cache:
+    description:
+      - log in once and keep the NITRO session under
+        C(~/.ansible/cache/netscaler) for later tasks against the same
+        appliance, instead of sending the credentials with every request.
+        An expired session is replaced by a new login.
+    required: false
+    default: 'no'
+    choices: ['yes', 'no']
+    version_added: "2.0"
   validate_certs:
     description:
       - If C(no), SSL certificates for the target url will not be validated. This should only be used
@@ -94,11 +112,38 @@ ansible host -m netscaler -a "nsc_host=nsc.example.com user=apiuser password=api
 
 # Disable the service local:8080
 ansible host -m netscaler -a "nsc_host=nsc.example.com user=apiuser password=apipass name=local:8080 type=service action=disable"
+
+# Disable a set of servers in one request, reusing the session across tasks
+- netscaler:
+    nsc_host: nsc.example.com
+    user: apiuser
+    password: apipass
+    action: disable
+    session_cache: yes
+    names:
+      - web01
+      - web02
+      - web03
 '''
 
 
 import base64
 import socket
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import sha as sha1
+
+
+# where session ids are kept when session_cache is enabled
+NITRO_SESSION_CACHE = '~/.ansible/cache/netscaler'
+
+# attribute holding the administrative state of each entity type, and the
+# value it has when the entity is enabled. Services only report svrstate,
+# which follows their health as well, so they are never skipped.
+ENTITY_STATES = {
+    'server': ('state', 'ENABLED'),
+}
 
 
 class netscaler(object):
@@ -107,32 +152,124 @@ class netscaler(object):
 
     def __init__(self, module):
         self.module = module
+        self._session_id = None
+        self._cache_file = None
+
+    def _read_cache(self):
+        if not self._cache_file:
+            return None
+        try:
+            f = open(self._cache_file)
+            try:
+                return f.read().strip() or None
+            finally:
+                f.close()
+        except IOError:
+            return None
+
+    def _write_cache(self, session_id):
+        try:
+            cache_dir = os.path.dirname(self._cache_file)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, 0700)
+            fd = os.open(self._cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+            os.write(fd, session_id)
+            os.close(fd)
+        except (IOError, OSError):
+            # the cache is only an optimization
+            pass
+
+    def use_session_cache(self, cache_dir):
+        '''
+        Authenticates with a NITRO session kept on disk, so later tasks
+        against the same appliance skip the login.
+        '''
+        key = sha1('%s|%s|%s' % (self._nsc_protocol, self._nsc_host, self._nsc_user)).hexdigest()
+        self._cache_file = os.path.join(os.path.expanduser(cache_dir), key)
+        self._session_id = self._read_cache()
+        if not self._session_id:
+            self.login()
+
+    def login(self):
+        self._session_id = None
+        resp = self.http_request(
+            'config',
+            {
+                "object":
+                {
+                    "login": {"username": self._nsc_user, "password": self._nsc_pass}
+                }
+            }
+        )
+        if resp.get('errorcode', 0) != 0 or not resp.get('sessionid'):
+            self.module.fail_json(msg="failed to log in to the netscaler: %s" % resp.get('message', resp))
+        self._session_id = resp['sessionid']
+        self._write_cache(self._session_id)
 
     def http_request(self, api_endpoint, data_json={}):
         request_url = self._nsc_protocol + '://' + self._nsc_host + self._nitro_base_url + api_endpoint
 
-        data_json = urllib.urlencode(data_json)
-        if not len(data_json):
-            data_json = None
+        data = {}
+        for key, value in data_json.items():
+            if isinstance(value, dict):
+                value = json.dumps(value)
+            data[key] = value
+        data = urllib.urlencode(data)
+        if not len(data):
+            data = None
 
-        auth = base64.encodestring('%s:%s' % (self._nsc_user, self._nsc_pass)).replace('\n', '').strip()
         headers = {
-            'Authorization': 'Basic %s' % auth,
             'Content-Type' : 'application/x-www-form-urlencoded',
         }
+        if self._session_id:
+            headers['Cookie'] = 'NITRO_AUTH_TOKEN=%s' % self._session_id
+        else:
+            auth = base64.encodestring('%s:%s' % (self._nsc_user, self._nsc_pass)).replace('\n', '').strip()
+            headers['Authorization'] = 'Basic %s' % auth
 
-        response, info = fetch_url(self.module, request_url, data=data_json, headers=headers)
+        response, info = fetch_url(self.module, request_url, data=data, headers=headers)
+
+        if info['status'] == 401 and self._cache_file and self._session_id:
+            # the cached session has expired, log in again and retry once
+            self.login()
+            headers['Cookie'] = 'NITRO_AUTH_TOKEN=%s' % self._session_id
+            response, info = fetch_url(self.module, request_url, data=data, headers=headers)
+
+        if response is None:
+            raise Exception("%s %s" % (info['status'], info['msg']))
 
         return json.load(response)
 
-    def prepare_request(self, action):
+    def current_states(self):
+        '''
+        Reads the state of every entity of the configured type with one
+        request. Returns a dict mapping names to True when enabled.
+        '''
+        if self._type not in ENTITY_STATES:
+            return {}
+        attr, enabled = ENTITY_STATES[self._type]
+        resp = self.http_request('config/%s?attrs=name,%s' % (self._type, attr))
+        if resp.get('errorcode', 0) != 0:
+            return {}
+        states = {}
+        for entity in resp.get(self._type, []):
+            states[entity['name']] = entity.get(attr) == enabled
+        return states
+
+    def prepare_request(self, action, names=None):
+        if names is None:
+            names = [self._name]
+        entities = [{"name": name} for name in names]
+        if len(entities) == 1:
+            entities = entities[0]
+
         resp = self.http_request(
             'config',
             {
                 "object":
                 {
                     "params": {"action": action},
-                    self._type: {"name": self._name}
+                    self._type: entities
                 }
             }
         )
@@ -149,8 +286,27 @@ def core(module):
     n._name = module.params.get('name')
     n._type = module.params.get('type')
     action = module.params.get('action')
+    names = module.params.get('names')
+
+    if module.params.get('session_cache'):
+        n.use_session_cache(NITRO_SESSION_CACHE)
+
+    if not names:
+        r = n.prepare_request(action)
+        r['changed'] = True
+        return r['errorcode'], r
+
+    # only act on the entities that are not already in the wanted state;
+    # unknown names are passed through so the appliance reports them
+    states = n.current_states()
+    wanted = action == 'enable'
+    pending = [name for name in names if states.get(name) != wanted]
+    if not pending:
+        return 0, dict(changed=False, names=[])
 
-    r = n.prepare_request(action)
+    r = n.prepare_request(action, pending)
+    r['changed'] = True
+    r['names'] = pending
 
     return r['errorcode'], r
 
@@ -165,7 +321,9 @@ def main():
             password = dict(required=True),
             action = dict(default='enable', choices=['enable','disable']),
             name = dict(default=socket.gethostname()),
+            names = dict(type='list'),
             type = dict(default='server', choices=['service', 'server']),
+            session_cache = dict(default='no', type='bool'),
             validate_certs=dict(default='yes', type='bool'),
         )
     )
@@ -179,7 +337,6 @@ def main():
     if rc != 0:
         module.fail_json(rc=rc, msg=result)
     else:
-        result['changed'] = True
         module.exit_json(**result)
 
 
@@ -92,6 +92,24 @@ options:
     required: false
     default: null
 
+  records:
+    description:
+      - A list of records to synchronise in one go, each a hash with C(name), C(type), C(value) and optionally
+        C(ttl), C(priority) and C(state). The domain's records are fetched once and the needed creates, updates
+        and deletes are computed locally.
+      - Mutually exclusive with I(record) and I(record_ids).
+    required: false
+    default: null
+    version_added: "2.0"
+
+  purge:
+    description:
+      - When using I(records), delete every record of the domain that is not listed.
+    required: false
+    default: 'no'
+    choices: ['yes', 'no']
+    version_added: "2.0"
+
 requirements: [ dnsimple ]
 author: "Alex Coomans (@drcapulet)"
 '''
@@ -127,9 +145,19 @@ EXAMPLES = '''
 # and delete the record
 - local_action: dnsimpledomain=my.com record= type=CNAME value=example.com state=absent
 
+# make the domain hold exactly these records
+- local_action:
+    module: dnsimple
+    domain: my.com
+    purge: yes
+    records:
+      - { name: www, type: A, value: 127.0.0.1 }
+      - { name: '', type: MX, value: mail.my.com, priority: 10 }
+
 '''
 
 import os
+import time
 try:
     from dnsimple import DNSimple
     from dnsimple.dnsimple import DNSimpleException
@@ -137,6 +165,88 @@ try:
 except ImportError:
     HAS_DNSIMPLE = False
 
+def with_backoff(func, *args):
+    """
+    Calls a client method, retrying with increasing waits while DNSimple
+    answers that the API rate limit is used up.
+    """
+    for attempt in range(1, 4):
+        try:
+            return func(*args)
+        except DNSimpleException, e:
+            # the client only passes on the body of the error response
+            if attempt == 3 or 'rate limit' not in str(e).lower():
+                raise
+            time.sleep(30 * attempt)
+
+def sync_records(module, client, domain, desired, default_ttl, purge):
+    """
+    Makes the records of domain match the desired list. The domain is fetched
+    once and indexed by (name, type, content); the API has no multi-record
+    calls so the changes are then applied one by one, backing off when the
+    rate limit is hit. If a change fails the ones already applied are
+    reported with the error.
+    """
+    index = {}
+    for r in client.records(str(domain)):
+        r = r['record']
+        index[(r['name'], r['record_type'], r['content'])] = r
+
+    creates = []
+    updates = []
+    deletes = []
+    wanted = set()
+    for record in desired:
+        if not isinstance(record, dict) or 'type' not in record or 'value' not in record:
+            module.fail_json(msg="records entries must be hashes with at least type and value: %s" % record)
+        key = (record.get('name', ''), record['type'], str(record['value']))
+        current = index.get(key)
+        if record.get('state', 'present') == 'absent':
+            if current:
+                deletes.append(current)
+            continue
+        wanted.add(key)
+        data = {'ttl': int(record.get('ttl', default_ttl))}
+        if record.get('priority') is not None:
+            data['prio'] = int(record['priority'])
+        if not current:
+            data.update({'name': key[0], 'record_type': key[1], 'content': key[2]})
+            creates.append(data)
+        elif current['ttl'] != data['ttl'] or ('prio' in data and current['prio'] != data['prio']):
+            updates.append((current['id'], data))
+
+    if purge:
+        for key, current in index.items():
+            # SOA and the default NS records are managed by DNSimple
+            if current.get('system_record') or current['record_type'] == 'SOA':
+                continue
+            if key not in wanted and current not in deletes:
+                deletes.append(current)
+
+    changed = bool(creates or updates or deletes)
+    if module.check_mode:
+        module.exit_json(changed=changed, created=creates, updated=[data for rid, data in updates], deleted=deletes)
+
+    created = []
+    updated = []
+    deleted = []
+    try:
+        for current in deletes:
+            with_backoff(client.delete_record, str(domain), current['id'])
+            deleted.append(current)
+        for rid, data in updates:
+            with_backoff(client.update_record, str(domain), str(rid), data)
+            updated.append(data)
+        for data in creates:
+            with_backoff(client.add_record, str(domain), data)
+            created.append(data)
+    except DNSimpleException, e:
+        module.fail_json(msg="Unable to sync the records of %s: %s" % (domain, e.message),
+                         changed=bool(created or updated or deleted),
+                         created=created, updated=updated, deleted=deleted)
+
+    module.exit_json(changed=changed, created=created, updated=updated, deleted=deleted)
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
@@ -151,10 +261,15 @@ def main():
             priority          = dict(required=False, type='int'),
             state             = dict(required=False, choices=['present', 'absent']),
             solo              = dict(required=False, type='bool'),
+            records           = dict(required=False, type='list'),
+            purge             = dict(required=False, default=False, type='bool'),
         ),
         required_together = (
             ['record', 'value']
         ),
+        mutually_exclusive = (
+            ['records', 'record'], ['records', 'record_ids']
+        ),
         supports_check_mode = True,
     )
 
@@ -188,6 +303,10 @@ def main():
             domains = client.domains()
             module.exit_json(changed=False, result=[d['domain'] for d in domains])
 
+        # Domain & a whole record set
+        if domain and module.params.get('records') is not None:
+            sync_records(module, client, domain, module.params.get('records'), ttl, module.params.get('purge'))
+
         # Domain & No record
         if domain and record is None and not record_ids:
             domains = [d['domain'] for d in client.domains()]
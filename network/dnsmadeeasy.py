@@ -73,6 +73,29 @@ options:
     choices: [ 'present', 'absent' ]
     default: null
     
+  records:
+    description:
+      - "A list of records to synchronise in one go, each a hash with C(name), C(type), C(value) and optionally C(ttl) and C(state). The domain is fetched once and indexed by name, type and value, and the needed creates, updates and deletes are each sent with a single multi-record request."
+      - Mutually exclusive with I(record_name).
+    required: false
+    default: null
+    version_added: "2.0"
+
+  purge:
+    description:
+      - When using I(records), delete every record of the domain that is not listed.
+    required: false
+    default: 'no'
+    choices: ['yes', 'no']
+    version_added: "2.0"
+
+  cache_path:
+    description:
+      - Directory where the records of each domain are cached when using I(records). The cache is used as long as the domain's last update time reported by the API is unchanged, so an unchanged domain costs a single request. Set to an empty string to disable the cache.
+    required: false
+    default: "~/.ansible/cache/dnsmadeeasy"
+    version_added: "2.0"
+
   validate_certs:
     description:
       - If C(no), SSL certificates will not be validated. This should only be used
@@ -107,6 +130,18 @@ EXAMPLES = '''
   
 # delete a record / ensure it is absent
 - dnsmadeeasy: account_key=key account_secret=secret domain=my.com state=absent record_name="test"
+
+# make the domain hold exactly these records
+- dnsmadeeasy:
+    account_key: key
+    account_secret: secret
+    domain: my.com
+    state: present
+    purge: yes
+    records:
+      - { name: www, type: A, value: 192.168.0.1 }
+      - { name: www, type: A, value: 192.168.0.2 }
+      - { name: '', type: MX, value: "10 mail.my.com.", ttl: 3600 }
 '''
 
 # ============================================
@@ -116,7 +151,9 @@ EXAMPLES = '''
 IMPORT_ERROR = None
 try:
     import json
-    from time import strftime, gmtime
+    import os
+    import tempfile
+    from time import strftime, gmtime, sleep
     import hashlib
     import hmac
 except ImportError, e:
@@ -135,6 +172,7 @@ class DME2:
         self.record_map = None      # ["record_name"] => ID
         self.records = None         # ["record_ID"] => <record>
         self.all_records = None
+        self.requests_remaining = None
 
         # Lookup the domain ID if passed as a domain name vs. ID
         if not self.domain.isdigit():
@@ -162,7 +200,18 @@ class DME2:
         if data and not isinstance(data, basestring):
             data = urllib.urlencode(data)
 
-        response, info = fetch_url(self.module, url, data=data, method=method, headers=self._headers())
+        for attempt in range(1, 4):
+            response, info = fetch_url(self.module, url, data=data, method=method, headers=self._headers())
+            if 'x-dnsme-requestsremaining' in info:
+                self.requests_remaining = int(info['x-dnsme-requestsremaining'])
+            # The API allows a limited number of requests per window and
+            # answers 400 once it is used up; back off and retry then.
+            if info['status'] == 400 and self.requests_remaining is not None and self.requests_remaining <= 1:
+                # no point in waiting after the last attempt
+                if attempt < 3:
+                    sleep(30 * attempt)
+                continue
+            break
         if info['status'] not in (200, 201, 204):
             self.module.fail_json(msg="%s returned %s, with body: %s" % (url, info['status'], info['msg']))
 
@@ -253,6 +302,124 @@ class DME2:
         #@TODO remove record from the cache when impleneted
         return self.query(self.record_url + '/' + str(record_id), 'DELETE')
 
+    # ------------------------------------------
+    # Zone level synchronisation
+    #
+
+    def getZoneRecords(self, cache_dir=None):
+        """
+        Returns all records of the domain, from the on-disk cache if the
+        domain has not been updated since it was written.
+        """
+        if self.domain_map and int(self.domain) in self.domains:
+            updated = self.domains[int(self.domain)].get('updated')
+        else:
+            updated = self.query('dns/managed/' + str(self.domain), 'GET').get('updated')
+
+        cache_file = None
+        if cache_dir and updated is not None:
+            cache_file = os.path.join(cache_dir, '%s.json' % self.domain)
+            try:
+                f = open(cache_file)
+                try:
+                    cache = json.load(f)
+                finally:
+                    f.close()
+                if cache.get('updated') == updated:
+                    self.all_records = cache['records']
+                    return self.all_records
+            except (IOError, ValueError, KeyError):
+                pass
+
+        self.all_records = self.getRecords()
+        if cache_file:
+            self._writeCache(cache_file, {'updated': updated, 'records': self.all_records})
+        return self.all_records
+
+    def invalidateZoneCache(self, cache_dir):
+        if not cache_dir:
+            return
+        try:
+            os.unlink(os.path.join(cache_dir, '%s.json' % self.domain))
+        except OSError:
+            pass
+
+    def _writeCache(self, cache_file, data):
+        try:
+            cache_dir = os.path.dirname(cache_file)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, 0700)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+            f = os.fdopen(fd, 'w')
+            try:
+                json.dump(data, f)
+            finally:
+                f.close()
+            os.rename(tmp_path, cache_file)
+        except (IOError, OSError):
+            # the cache is only an optimization
+            pass
+
+    def normalizeRecord(self, record, default_ttl):
+        """ Converts a desired record into the API representation. """
+        new_record = {'name': record.get('name', ''), 'type': record['type'],
+                      'value': str(record['value']), 'ttl': int(record.get('ttl', default_ttl))}
+        # Special handling for mx and srv records
+        if new_record['type'] == 'MX':
+            new_record['mxLevel'], new_record['value'] = new_record['value'].split(' ', 1)
+        elif new_record['type'] == 'SRV':
+            (new_record['priority'], new_record['weight'], new_record['port'],
+             new_record['value']) = new_record['value'].split(' ', 3)
+        return new_record
+
+    def syncRecords(self, desired, purge, cache_dir=None):
+        """
+        Computes the creates, updates and deletes needed to make the zone
+        match the desired (name, type, value) set. Returns the three lists.
+        """
+        index = {}
+        for record in self.getZoneRecords(cache_dir):
+            index[(record['name'], record['type'], str(record['value']))] = record
+
+        creates = []
+        updates = []
+        deletes = []
+        wanted = set()
+        for record, state in desired:
+            key = (record['name'], record['type'], record['value'])
+            current = index.get(key)
+            if state == 'absent':
+                if current:
+                    deletes.append(current)
+                continue
+            wanted.add(key)
+            if not current:
+                creates.append(record)
+                continue
+            for i in record:
+                if str(current.get(i)) != str(record[i]):
+                    record['id'] = current['id']
+                    updates.append(record)
+                    break
+
+        if purge:
+            for key, current in index.items():
+                if key not in wanted and current not in deletes:
+                    deletes.append(current)
+
+        return creates, updates, deletes
+
+    def createRecords(self, records):
+        return self.query(self.record_url + '/createMulti', 'POST', self.prepareRecord(records))
+
+    def updateRecords(self, records):
+        return self.query(self.record_url + '/updateMulti', 'PUT', self.prepareRecord(records))
+
+    def deleteRecords(self, record_ids):
+        ids = '&'.join(['ids=%s' % record_id for record_id in record_ids])
+        return self.query(self.record_url + '?' + ids, 'DELETE')
+
+
 
 # ===========================================
 # Module execution.
@@ -271,11 +438,17 @@ def main():
                              'A', 'AAAA', 'CNAME', 'HTTPRED', 'MX', 'NS', 'PTR', 'SRV', 'TXT']),
             record_value=dict(required=False),
             record_ttl=dict(required=False, default=1800, type='int'),
+            records=dict(required=False, type='list'),
+            purge=dict(required=False, default=False, type='bool'),
+            cache_path=dict(required=False, default='~/.ansible/cache/dnsmadeeasy'),
             validate_certs = dict(default='yes', type='bool'),
         ),
         required_together=(
             ['record_value', 'record_ttl', 'record_type']
-        )
+        ),
+        mutually_exclusive=(
+            ['records', 'record_name']
+        ),
     )
 
     if IMPORT_ERROR:
@@ -288,6 +461,34 @@ def main():
     record_type = module.params["record_type"]
     record_value = module.params["record_value"]
 
+    # Synchronise a whole record set at once
+    if module.params["records"] is not None:
+        cache_dir = module.params["cache_path"]
+        if cache_dir:
+            cache_dir = os.path.expanduser(cache_dir)
+
+        desired = []
+        for record in module.params["records"]:
+            if not isinstance(record, dict) or 'type' not in record or 'value' not in record:
+                module.fail_json(msg="records entries must be hashes with at least type and value: %s" % record)
+            if record['type'] not in ['A', 'AAAA', 'CNAME', 'HTTPRED', 'MX', 'NS', 'PTR', 'SRV', 'TXT']:
+                module.fail_json(msg="record type %s is not supported" % record['type'])
+            desired.append((DME.normalizeRecord(record, module.params["record_ttl"]), record.get('state', state)))
+
+        creates, updates, deletes = DME.syncRecords(desired, module.params["purge"], cache_dir)
+        changed = bool(creates or updates or deletes)
+
+        if changed:
+            if deletes:
+                DME.deleteRecords([r['id'] for r in deletes])
+            if updates:
+                DME.updateRecords(updates)
+            if creates:
+                DME.createRecords(creates)
+            DME.invalidateZoneCache(cache_dir)
+
+        module.exit_json(changed=changed, created=creates, updated=updates, deleted=deletes)
+
     # Follow Keyword Controlled Behavior
     if record_name is None:
         domain_records = DME.getRecords()
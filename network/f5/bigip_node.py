@@ -111,6 +111,13 @@ options:
         required: false
         default: null
         choices: []
+    nodes:
+        description:
+            - "A list of nodes to manage together, each a hash with C(name) and optionally C(host), C(state), C(description), C(session_state) and C(monitor_state); unset values default to the module options. All nodes are read with one iControl call per attribute and only the differences are written, with one call per setter."
+            - "Mutually exclusive with I(name) and I(host)."
+        required: false
+        default: null
+        version_added: "2.0"
 '''
 
 EXAMPLES = '''
@@ -186,6 +193,21 @@ EXAMPLES = '''
       partition=matthite
       name="{{ ansible_default_ipv4["address"] }}"
 
+  - name: Force several nodes offline at once
+    local_action:
+      module: bigip_node
+      server: lb.mydomain.com
+      user: admin
+      password: mysecret
+      state: present
+      session_state: disabled
+      monitor_state: disabled
+      partition: matthite
+      nodes:
+        - name: 10.0.0.11
+        - name: 10.0.0.12
+        - name: 10.0.0.13
+
 '''
 
 def node_exists(api, address):
@@ -261,24 +283,139 @@ def get_node_monitor_status(api, name):
     return result
 
 
+# ===========================================
+# Batch operations
+#
+# NodeAddressV2 calls take arrays of nodes, so any number of nodes is read
+# with one call per attribute and changed with one call per setter.
+
+def parse_batch_nodes(module, partition, state):
+    entries = []
+    for node in module.params['nodes']:
+        if not isinstance(node, dict) or not node.get('name'):
+            module.fail_json(msg="nodes entries must be hashes with at least a name: %s" % node)
+        entry = {
+            'name': fq_name(partition, node['name']),
+            'host': node.get('host', node.get('address', node.get('ip'))),
+            'state': node.get('state', state),
+        }
+        for attribute in ['description', 'session_state', 'monitor_state']:
+            entry[attribute] = node.get(attribute, module.params.get(attribute))
+        if entry['state'] == 'absent' and entry['host'] is not None:
+            module.fail_json(msg="host parameter invalid when state=absent")
+        entries.append(entry)
+    return entries
+
+def batch_nodes(module, api, entries):
+    result = {'changed': False}
+    NodeAddress = api.LocalLB.NodeAddressV2
+
+    existing_nodes = set(NodeAddress.get_list())
+    to_delete = [e for e in entries if e['state'] == 'absent' and e['name'] in existing_nodes]
+    to_create = [e for e in entries if e['state'] == 'present' and e['name'] not in existing_nodes]
+    existing = [e for e in entries if e['state'] == 'present' and e['name'] in existing_nodes]
+
+    for entry in to_create:
+        if entry['host'] is None:
+            module.fail_json(msg="host parameter required when state=present and node %s does not exist" % entry['name'])
+
+    # read every attribute once for all existing nodes that set it
+    with_host = [e for e in existing if e['host'] is not None]
+    if with_host:
+        addresses = NodeAddress.get_address(nodes=[e['name'] for e in with_host])
+        for entry, address in zip(with_host, addresses):
+            if address != entry['host']:
+                module.fail_json(msg="Changing the node address is not supported by the API; " \
+                                     "delete and recreate the node %s." % entry['name'])
+
+    sets = {'description': [], 'session_state': [], 'monitor_state': []}
+    with_description = [e for e in existing if e['description'] is not None]
+    if with_description:
+        descriptions = NodeAddress.get_description(nodes=[e['name'] for e in with_description])
+        for entry, description in zip(with_description, descriptions):
+            if description != entry['description']:
+                sets['description'].append(entry)
+    with_session = [e for e in existing if e['session_state'] is not None]
+    if with_session:
+        statuses = NodeAddress.get_session_status(nodes=[e['name'] for e in with_session])
+        for entry, status in zip(with_session, statuses):
+            status = status.split("SESSION_STATUS_")[-1].lower()
+            if (entry['session_state'] == 'enabled') == (status == 'forced_disabled'):
+                sets['session_state'].append(entry)
+    with_monitor = [e for e in existing if e['monitor_state'] is not None]
+    if with_monitor:
+        statuses = NodeAddress.get_monitor_status(nodes=[e['name'] for e in with_monitor])
+        for entry, status in zip(with_monitor, statuses):
+            status = status.split("MONITOR_STATUS_")[-1].lower()
+            if (entry['monitor_state'] == 'enabled') == (status == 'forced_down'):
+                sets['monitor_state'].append(entry)
+
+    # new nodes get every attribute that was asked for
+    for entry in to_create:
+        for attribute in sets:
+            if entry[attribute] is not None:
+                sets[attribute].append(entry)
+
+    result['deleted'] = [e['name'] for e in to_delete]
+    result['created'] = [e['name'] for e in to_create]
+    result['modified'] = sorted(set([e['name'] for changes in sets.values() for e in changes]))
+    if to_delete or to_create or result['modified']:
+        result['changed'] = True
+
+    if module.check_mode:
+        return result
+
+    for entry in to_delete:
+        deleted, desc = delete_node_address(api, entry['name'])
+        if not deleted:
+            module.fail_json(msg="unable to delete %s: %s" % (entry['name'], desc))
+    if to_create:
+        NodeAddress.create(nodes=[e['name'] for e in to_create],
+                           addresses=[e['host'] for e in to_create],
+                           limits=[0] * len(to_create))
+    if sets['description']:
+        NodeAddress.set_description(nodes=[e['name'] for e in sets['description']],
+                                    descriptions=[e['description'] for e in sets['description']])
+    if sets['session_state']:
+        NodeAddress.set_session_enabled_state(nodes=[e['name'] for e in sets['session_state']],
+                                              states=["STATE_%s" % e['session_state'].upper() for e in sets['session_state']])
+    if sets['monitor_state']:
+        NodeAddress.set_monitor_state(nodes=[e['name'] for e in sets['monitor_state']],
+                                      states=["STATE_%s" % e['monitor_state'].upper() for e in sets['monitor_state']])
+
+    return result
+
+
 def main():
     argument_spec=f5_argument_spec();
     argument_spec.update(dict(
             session_state = dict(type='str', choices=['enabled', 'disabled']),
             monitor_state = dict(type='str', choices=['enabled', 'disabled']),
-            name = dict(type='str', required=True),
+            name = dict(type='str'),
             host = dict(type='str', aliases=['address', 'ip']),
-            description = dict(type='str')
+            description = dict(type='str'),
+            nodes = dict(type='list')
         )
     )
 
     module = AnsibleModule(
         argument_spec = argument_spec,
+        required_one_of = [['name', 'nodes']],
+        mutually_exclusive = [['name', 'nodes'], ['host', 'nodes']],
         supports_check_mode=True
     )
 
     (server,user,password,state,partition,validate_certs) = f5_parse_arguments(module)
 
+    if module.params['nodes']:
+        try:
+            api = bigip_api(server, user, password)
+            entries = parse_batch_nodes(module, partition, state)
+            result = batch_nodes(module, api, entries)
+        except Exception, e:
+            module.fail_json(msg="received exception: %s" % e)
+        module.exit_json(**result)
+
     session_state = module.params['session_state']
     monitor_state = module.params['monitor_state']
     host = module.params['host']
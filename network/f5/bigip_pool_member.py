@@ -78,7 +78,8 @@ options:
     pool:
         description:
             - Pool name. This pool must exist.
-        required: true
+            - Required unless I(members) is given.
+        required: false
     partition:
         description:
             - Partition
@@ -87,12 +88,14 @@ options:
     host:
         description:
             - Pool member IP
-        required: true
+            - Required unless I(members) is given.
+        required: false
         aliases: ['address', 'name']
     port:
         description:
             - Pool member port
-        required: true
+            - Required unless I(members) is given.
+        required: false
     connection_limit:
         description:
             - Pool member connection limit. Setting this to 0 disables the limit.
@@ -113,6 +116,25 @@ options:
             - Pool member ratio weight. Valid values range from 1 through 100. New pool members -- unless overriden with this value -- default to 1.
         required: false
         default: null
+    members:
+        description:
+            - A list of pool members to manage together, each a hash with C(pool), C(host) and C(port) and
+              optionally C(state), C(connection_limit), C(description), C(rate_limit), C(ratio),
+              C(session_state) and C(monitor_state); unset values default to the module options.
+              Current member state is read with one iControl call per attribute for all members and
+              only the differences are written, with one call per setter.
+            - Mutually exclusive with I(pool), I(host) and I(port).
+        required: false
+        default: null
+        version_added: "2.0"
+    drain_timeout:
+        description:
+            - With I(members), wait up to this many seconds for the current connections of all members
+              that have I(session_state=disabled) to drop to zero, and fail if they do not.
+              C(0) does not wait.
+        required: false
+        default: 0
+        version_added: "2.0"
 '''
 
 EXAMPLES = '''
@@ -194,8 +216,26 @@ EXAMPLES = '''
       host="{{ ansible_default_ipv4["address"] }}"
       port=80
 
+  - name: Drain all web servers from both pools and wait for their connections to finish
+    local_action:
+      module: bigip_pool_member
+      server: lb.mydomain.com
+      user: admin
+      password: mysecret
+      state: present
+      partition: matthite
+      session_state: disabled
+      drain_timeout: 300
+      members:
+        - { pool: web-pool, host: 10.0.0.11, port: 80 }
+        - { pool: web-pool, host: 10.0.0.12, port: 80 }
+        - { pool: web-ssl-pool, host: 10.0.0.11, port: 443 }
+        - { pool: web-ssl-pool, host: 10.0.0.12, port: 443 }
+
 '''
 
+import time
+
 def pool_exists(api, pool):
     # hack to determine if pool exists
     result = False
@@ -305,29 +345,237 @@ def get_member_monitor_status(api, pool, address, port):
     result = result.split("MONITOR_STATUS_")[-1].lower()
     return result
 
+# ===========================================
+# Batch operations
+#
+# iControl takes arrays of pools and, per pool, arrays of members, so the
+# state of any number of members is read with one call per attribute and
+# changed with one call per setter.
+
+MEMBER_ATTRIBUTES = ['connection_limit', 'description', 'rate_limit', 'ratio']
+
+def group_by_pool(entries, values=None):
+    """ returns (pool_names, members, entries, values) grouped per pool for iControl array calls """
+    if values is None:
+        values = [None] * len(entries)
+    pools = []
+    grouped = {}
+    for entry, value in zip(entries, values):
+        if entry['pool'] not in grouped:
+            pools.append(entry['pool'])
+            grouped[entry['pool']] = []
+        grouped[entry['pool']].append((entry, value))
+    ordered = []
+    members = []
+    grouped_values = []
+    for pool in pools:
+        ordered.extend([entry for entry, value in grouped[pool]])
+        members.append([{'address': entry['address'], 'port': entry['port']} for entry, value in grouped[pool]])
+        grouped_values.append([value for entry, value in grouped[pool]])
+    return pools, members, ordered, grouped_values
+
+def flatten(values):
+    return [value for per_pool in values for value in per_pool]
+
+def batch_get(api, method, entries):
+    """ calls a LocalLB.Pool get_member_* method for all entries, returns values in entry order """
+    if not entries:
+        return []
+    pools, members, ordered, values = group_by_pool(entries)
+    values = flatten(getattr(api.LocalLB.Pool, method)(pool_names=pools, members=members))
+    return zip(ordered, values)
+
+def batch_set(api, method, values_name, changes):
+    """ calls a LocalLB.Pool set_member_* method once for all (entry, value) changes """
+    if not changes:
+        return
+    pools, members, ordered, values = group_by_pool([entry for entry, value in changes],
+                                                    [value for entry, value in changes])
+    kwargs = {'pool_names': pools, 'members': members, values_name: values}
+    getattr(api.LocalLB.Pool, method)(**kwargs)
+
+def parse_batch_members(module, partition, state):
+    entries = []
+    for member in module.params['members']:
+        if not isinstance(member, dict):
+            module.fail_json(msg="members entries must be hashes: %s" % member)
+        host = member.get('host', member.get('address', member.get('name')))
+        if not member.get('pool') or not host or not member.get('port'):
+            module.fail_json(msg="members entries need pool, host and port: %s" % member)
+        port = int(member['port'])
+        if port < 1 or port > 65535:
+            module.fail_json(msg="valid ports must be in range 1 - 65535")
+        entry = {
+            'pool': fq_name(partition, member['pool']),
+            'address': fq_name(partition, host),
+            'port': port,
+            'state': member.get('state', state),
+        }
+        for attribute in MEMBER_ATTRIBUTES + ['session_state', 'monitor_state']:
+            entry[attribute] = module.params.get(attribute)
+            if member.get(attribute) is not None:
+                entry[attribute] = member[attribute]
+        for attribute in ['connection_limit', 'rate_limit', 'ratio']:
+            if entry[attribute] is not None:
+                entry[attribute] = int(entry[attribute])
+        entries.append(entry)
+    return entries
+
+def get_current_connections(api, entries):
+    """ returns the server side current connections of each entry """
+    if not entries:
+        return []
+    pools, members, ordered, values = group_by_pool(entries)
+    stats = api.LocalLB.Pool.get_member_statistics(pool_names=pools, members=members)
+    connections = []
+    for pool_stats in stats:
+        for member_stats in pool_stats['statistics']:
+            current = 0
+            for stat in member_stats['statistics']:
+                if stat['type'] == 'STATISTIC_SERVER_SIDE_CURRENT_CONNECTIONS':
+                    current = (stat['value']['high'] << 32) + stat['value']['low']
+            connections.append(current)
+    return zip(ordered, connections)
+
+def wait_for_drain(api, entries, timeout):
+    """ polls the connections of all entries together until they are all idle """
+    deadline = time.time() + timeout
+    delay = 1
+    while entries:
+        entries = [entry for entry, current in get_current_connections(api, entries) if current > 0]
+        if not entries or time.time() >= deadline:
+            break
+        time.sleep(min(delay, max(0, deadline - time.time())))
+        delay = min(delay * 2, 10)
+    return entries
+
+def member_key(entry):
+    return '%s:%s' % (entry['address'], entry['port'])
+
+def batch_members(module, api, entries, drain_timeout):
+    result = {'changed': False}
+
+    pools = set(api.LocalLB.Pool.get_list())
+    missing = sorted(set([e['pool'] for e in entries if e['pool'] not in pools]))
+    if missing:
+        module.fail_json(msg="pool %s does not exist" % ', '.join(missing))
+
+    pool_names = sorted(set([e['pool'] for e in entries]))
+    current = {}
+    for pool, members in zip(pool_names, api.LocalLB.Pool.get_member_v2(pool_names=pool_names)):
+        for member in members:
+            current[(pool, member['address'], int(member['port']))] = True
+
+    to_remove = []
+    to_add = []
+    existing = []
+    for entry in entries:
+        exists = (entry['pool'], entry['address'], entry['port']) in current
+        if entry['state'] == 'absent':
+            if exists:
+                to_remove.append(entry)
+        elif exists:
+            existing.append(entry)
+        else:
+            to_add.append(entry)
+
+    # read every attribute once for all existing members that set it
+    sets = {}
+    for attribute in MEMBER_ATTRIBUTES:
+        wanted = [e for e in existing if e[attribute] is not None]
+        for entry, value in batch_get(api, 'get_member_%s' % attribute, wanted):
+            if value != entry[attribute]:
+                sets.setdefault(attribute, []).append((entry, entry[attribute]))
+    for entry, status in batch_get(api, 'get_member_session_status', [e for e in existing if e['session_state'] is not None]):
+        status = status.split("SESSION_STATUS_")[-1].lower()
+        if (entry['session_state'] == 'enabled') == (status == 'forced_disabled'):
+            sets.setdefault('session_state', []).append((entry, "STATE_%s" % entry['session_state'].upper()))
+    for entry, status in batch_get(api, 'get_member_monitor_status', [e for e in existing if e['monitor_state'] is not None]):
+        status = status.split("MONITOR_STATUS_")[-1].lower()
+        if (entry['monitor_state'] == 'enabled') == (status == 'forced_down'):
+            sets.setdefault('monitor_state', []).append((entry, "STATE_%s" % entry['monitor_state'].upper()))
+
+    # new members get every attribute that was asked for
+    for entry in to_add:
+        for attribute in MEMBER_ATTRIBUTES:
+            if entry[attribute] is not None:
+                sets.setdefault(attribute, []).append((entry, entry[attribute]))
+        for attribute in ['session_state', 'monitor_state']:
+            if entry[attribute] is not None:
+                sets.setdefault(attribute, []).append((entry, "STATE_%s" % entry[attribute].upper()))
+
+    if to_remove or to_add or sets:
+        result['changed'] = True
+    result['removed'] = [member_key(e) for e in to_remove]
+    result['added'] = [member_key(e) for e in to_add]
+    result['modified'] = sorted(set([member_key(entry) for changes in sets.values() for entry, value in changes]))
+
+    if module.check_mode:
+        return result
+
+    if to_remove:
+        pools, members, ordered, values = group_by_pool(to_remove)
+        api.LocalLB.Pool.remove_member_v2(pool_names=pools, members=members)
+        result['deleted'] = [a for a in sorted(set([e['address'] for e in to_remove])) if delete_node_address(api, a)]
+    if to_add:
+        pools, members, ordered, values = group_by_pool(to_add)
+        api.LocalLB.Pool.add_member_v2(pool_names=pools, members=members)
+
+    batch_set(api, 'set_member_connection_limit', 'limits', sets.get('connection_limit'))
+    batch_set(api, 'set_member_description', 'descriptions', sets.get('description'))
+    batch_set(api, 'set_member_rate_limit', 'limits', sets.get('rate_limit'))
+    batch_set(api, 'set_member_ratio', 'ratios', sets.get('ratio'))
+    batch_set(api, 'set_member_session_enabled_state', 'session_states', sets.get('session_state'))
+    batch_set(api, 'set_member_monitor_state', 'monitor_states', sets.get('monitor_state'))
+
+    if drain_timeout:
+        draining = [e for e in entries if e['state'] == 'present' and e['session_state'] == 'disabled' and e not in to_add]
+        still_active = wait_for_drain(api, draining, drain_timeout)
+        if still_active:
+            module.fail_json(msg="members still have active connections after %s seconds: %s" % (drain_timeout, ', '.join([member_key(e) for e in still_active])), **result)
+
+    return result
+
 def main():
     argument_spec = f5_argument_spec();
     argument_spec.update(dict(
             session_state = dict(type='str', choices=['enabled', 'disabled']),
             monitor_state = dict(type='str', choices=['enabled', 'disabled']),
-            pool = dict(type='str', required=True),
-            host = dict(type='str', required=True, aliases=['address', 'name']),
-            port = dict(type='int', required=True),
+            pool = dict(type='str'),
+            host = dict(type='str', aliases=['address', 'name']),
+            port = dict(type='int'),
             connection_limit = dict(type='int'),
             description = dict(type='str'),
             rate_limit = dict(type='int'),
-            ratio = dict(type='int')
+            ratio = dict(type='int'),
+            members = dict(type='list'),
+            drain_timeout = dict(type='int', default=0)
         )
     )
 
     module = AnsibleModule(
         argument_spec = argument_spec,
+        required_one_of = [['pool', 'members']],
+        mutually_exclusive = [['pool', 'members'], ['host', 'members'], ['port', 'members']],
         supports_check_mode=True
     )
 
     (server,user,password,state,partition,validate_certs) = f5_parse_arguments(module)
     session_state = module.params['session_state']
     monitor_state = module.params['monitor_state']
+
+    if module.params['members']:
+        try:
+            api = bigip_api(server, user, password)
+            entries = parse_batch_members(module, partition, state)
+            result = batch_members(module, api, entries, module.params['drain_timeout'])
+        except Exception, e:
+            module.fail_json(msg="received exception: %s" % e)
+        module.exit_json(**result)
+
+    if not module.params['pool'] or not module.params['host'] or not module.params['port']:
+        module.fail_json(msg="pool, host and port must be supplied")
+
     pool = fq_name(partition, module.params['pool'])
     connection_limit = module.params['connection_limit']
     description = module.params['description']
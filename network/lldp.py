@@ -15,6 +15,14 @@
 # along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
 
 import subprocess
+import tempfile
+import time
+
+try:
+    import xml.etree.ElementTree as ET
+    HAS_ELEMENTTREE = True
+except ImportError:
+    HAS_ELEMENTTREE = False
 
 DOCUMENTATION = '''
 ---
@@ -23,7 +31,41 @@ version_added: 1.6
 short_description: get details reported by lldp
 description:
   - Reads data out of lldpctl
-options: {}
+options:
+  neighbors:
+    description:
+      - Also return C(lldp_neighbors), a compact index of the neighbors seen
+        on each interface, read from C(lldpctl -f json) or, on lldpd releases
+        without JSON support, C(lldpctl -f xml).
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+    version_added: "2.0"
+  legacy_facts:
+    description:
+      - Return the C(lldp) fact built from C(lldpctl -f keyvalue). Turn this off
+        when only C(lldp_neighbors) is used to save a second lldpctl call.
+    required: false
+    default: "yes"
+    choices: [ "yes", "no" ]
+    version_added: "2.0"
+  cache_path:
+    description:
+      - Path of the file caching the gathered facts. The cache is keyed by the
+        neighbor insert, delete and age-out counters of lldpd, so the neighbors
+        are only read and parsed again once they changed, for example
+        C(~/.ansible/cache/lldp.json). The cache is disabled when this is not set.
+    required: false
+    default: null
+    version_added: "2.0"
+  cache_max_age:
+    description:
+      - Seconds after which cached facts are gathered again even when the
+        counters did not change, to pick up changes to the details of known
+        neighbors.
+    required: false
+    default: 600
+    version_added: "2.0"
 author: "Andy Hill (@andyhky)"
 notes:
   - Requires lldpd running and lldp enabled on switches 
@@ -43,6 +85,13 @@ EXAMPLES = '''
 # ok: [10.13.0.22] => (item=eth1) => {"item": "eth1", "msg": "switch2.example.com / Gi0/3"}
 # ok: [10.13.0.22] => (item=eth0) => {"item": "eth0", "msg": "switch3.example.com / Gi0/3"}
 
+# Only gather the compact neighbor index, cached between runs
+ - lldp: neighbors=yes legacy_facts=no cache_path=~/.ansible/cache/lldp.json
+
+ - name: Print the switch and port each interface is connected to
+   debug: msg="{{ item.key }} -> {{ item.value[0].chassis_name }} / {{ item.value[0].port_id }}"
+   with_dict: lldp_neighbors
+
 '''
 
 def gather_lldp():
@@ -53,13 +102,17 @@ def gather_lldp():
         output_dict = {}
         lldp_entries = output.split("\n")
 
+        current_dict = None
         for entry in lldp_entries:
             if entry.startswith('lldp'):
                 path, value = entry.strip().split("=", 1)
                 path = path.split(".")
                 path_components, final = path[:-1], path[-1]
-            else:
+            elif current_dict is not None and entry:
+                # continuation of a multi-line value
                 value = current_dict[final] + '\n' + entry
+            else:
+                continue
 
             current_dict = output_dict
             for path_component in path_components:
@@ -67,19 +120,242 @@ def gather_lldp():
                 current_dict = current_dict[path_component]
             current_dict[final] = value
         return output_dict
-            
 
-def main():
-    module = AnsibleModule({})
 
-    lldp_output = gather_lldp()
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def _json_text(value):
+    '''Text of a JSON node, which is either a string or a dict with a value'''
+    if isinstance(value, list):
+        if value:
+            value = value[0]
+        else:
+            value = None
+    if isinstance(value, dict):
+        return value.get('value')
+    return value
+
+
+def neighbor_from_json(interface):
+    '''Compact neighbor record from one interface of lldpctl -f json'''
+    chassis = interface.get('chassis', {})
+    name = None
+    if 'id' not in chassis and len(chassis) == 1:
+        # the chassis is keyed by its system name when there is one
+        name, chassis = chassis.items()[0]
+    chassis_id = _as_list(chassis.get('id'))
+    port = interface.get('port', {})
+    port_id = _as_list(port.get('id'))
+
+    vlans = []
+    for vlan in _as_list(interface.get('vlan')):
+        if not isinstance(vlan, dict):
+            continue
+        vlans.append(dict(id=vlan.get('vlan-id') and int(vlan['vlan-id']),
+                          name=vlan.get('value'),
+                          pvid=vlan.get('pvid') in (True, 'yes')))
+
+    return dict(
+        via=interface.get('via'),
+        rid=interface.get('rid'),
+        age=interface.get('age'),
+        chassis_name=name or _json_text(chassis.get('name')),
+        chassis_id=chassis_id and _json_text(chassis_id[0]),
+        chassis_id_type=chassis_id and isinstance(chassis_id[0], dict) and chassis_id[0].get('type') or None,
+        chassis_descr=_json_text(chassis.get('descr')),
+        mgmt_ip=[_json_text(ip) for ip in _as_list(chassis.get('mgmt-ip'))],
+        port_id=port_id and _json_text(port_id[0]),
+        port_id_type=port_id and isinstance(port_id[0], dict) and port_id[0].get('type') or None,
+        port_descr=_json_text(port.get('descr')),
+        vlans=vlans,
+    )
+
+
+def neighbor_from_xml(interface):
+    '''Compact neighbor record from one interface element of lldpctl -f xml'''
+    chassis = interface.find('chassis')
+    if chassis is None:
+        chassis = ET.Element('chassis')
+    port = interface.find('port')
+    if port is None:
+        port = ET.Element('port')
+
+    def text(parent, tag):
+        element = parent.find(tag)
+        if element is None:
+            return None
+        return element.text
+
+    def id_type(parent):
+        element = parent.find('id')
+        if element is None:
+            return None
+        return element.get('type')
+
+    vlans = []
+    for vlan in interface.findall('vlan'):
+        vlans.append(dict(id=vlan.get('vlan-id') and int(vlan.get('vlan-id')),
+                          name=vlan.text,
+                          pvid=vlan.get('pvid') == 'yes'))
+
+    return dict(
+        via=interface.get('via'),
+        rid=interface.get('rid'),
+        age=interface.get('age'),
+        chassis_name=text(chassis, 'name'),
+        chassis_id=text(chassis, 'id'),
+        chassis_id_type=id_type(chassis),
+        chassis_descr=text(chassis, 'descr'),
+        mgmt_ip=[ip.text for ip in chassis.findall('mgmt-ip')],
+        port_id=text(port, 'id'),
+        port_id_type=id_type(port),
+        port_descr=text(port, 'descr'),
+        vlans=vlans,
+    )
+
+
+def gather_neighbors(module):
+    '''
+    Returns a dict mapping each interface to the list of its neighbors,
+    or None when lldpctl supports neither JSON nor XML output.
+    '''
+    neighbors = {}
+    rc, out, err = module.run_command(['lldpctl', '-f', 'json'])
+    if rc == 0 and out.strip().startswith('{'):
+        try:
+            data = json.loads(out)
+        except ValueError:
+            data = None
+        if data is not None:
+            lldp = data.get('lldp') or {}
+            if not isinstance(lldp, dict):
+                lldp = {}
+            # a single interface is an object, several are a list of objects
+            for entry in _as_list(lldp.get('interface')):
+                for ifname, interface in entry.items():
+                    neighbors.setdefault(ifname, []).append(neighbor_from_json(interface))
+            return neighbors
+
+    if not HAS_ELEMENTTREE:
+        return None
+    rc, out, err = module.run_command(['lldpctl', '-f', 'xml'])
+    if rc != 0 or not out.strip().startswith('<'):
+        return None
+    try:
+        root = ET.fromstring(out)
+    except SyntaxError:
+        return None
+    for interface in root.findall('interface'):
+        neighbors.setdefault(interface.get('name'), []).append(neighbor_from_xml(interface))
+    return neighbors
+
+
+def neighbor_change_key(module):
+    '''
+    The neighbor insert, delete and age-out counters of lldpd, which change
+    whenever a neighbor appears or goes away. None when they are unavailable.
+    '''
+    rc, out, err = module.run_command(['lldpcli', '-f', 'keyvalue', 'show', 'statistics', 'summary'])
+    if rc != 0:
+        return None
+    counters = []
+    for line in out.splitlines():
+        if '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        if 'insert' in key or 'delete' in key or 'ageout' in key:
+            counters.append('%s=%s' % (key.strip(), value.strip()))
+    if not counters:
+        return None
+    counters.sort()
+    return ';'.join(counters)
+
+
+def load_cache(cache_path, key, max_age):
+    if not cache_path or key is None or not os.path.exists(cache_path):
+        return None
+    try:
+        f = open(cache_path)
+        try:
+            cache = json.load(f)
+        finally:
+            f.close()
+    except (IOError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('key') != key:
+        return None
+    if time.time() - cache.get('time', 0) > max_age:
+        return None
+    return cache.get('facts')
+
+
+def save_cache(cache_path, key, facts):
+    if not cache_path or key is None:
+        return
+    cache = dict(key=key, time=time.time(), facts=facts)
+    cache_dir = os.path.dirname(cache_path)
     try:
-        data = {'lldp': lldp_output['lldp']}
-        module.exit_json(ansible_facts=data)
-    except TypeError:
-        module.fail_json(msg="lldpctl command failed. is lldpd running?")    
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0700)
+        filed, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.lldp')
+        fileh = os.fdopen(filed, 'w')
+        json.dump(cache, fileh)
+        fileh.close()
+        os.rename(tmp_path, cache_path)
+    except (IOError, OSError):
+        # the cache is only an optimization
+        pass
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            neighbors=dict(default=False, type='bool'),
+            legacy_facts=dict(default=True, type='bool'),
+            cache_path=dict(default=None),
+            cache_max_age=dict(default=600, type='int'),
+        ),
+        supports_check_mode=True,
+    )
+
+    neighbors = module.params['neighbors']
+    legacy_facts = module.params['legacy_facts']
+    cache_path = module.params['cache_path']
+    if cache_path:
+        cache_path = os.path.expanduser(cache_path)
+
+    key = None
+    if cache_path:
+        key = neighbor_change_key(module)
+        if key is not None:
+            key = '%s|neighbors=%s|legacy=%s' % (key, neighbors, legacy_facts)
+    data = load_cache(cache_path, key, module.params['cache_max_age'])
+    if data is not None:
+        module.exit_json(ansible_facts=data, cached=True)
+
+    data = {}
+    if legacy_facts:
+        lldp_output = gather_lldp()
+        try:
+            data['lldp'] = lldp_output['lldp']
+        except TypeError:
+            module.fail_json(msg="lldpctl command failed. is lldpd running?")
+    if neighbors:
+        data['lldp_neighbors'] = gather_neighbors(module)
+        if data['lldp_neighbors'] is None:
+            if not legacy_facts:
+                module.fail_json(msg="could not read the neighbors from lldpctl. is lldpd running?")
+            del data['lldp_neighbors']
+
+    save_cache(cache_path, key, data)
+    module.exit_json(ansible_facts=data, cached=False)
    
 # import module snippets
 from ansible.module_utils.basic import *
 main()
-
@@ -29,9 +29,9 @@ description:
     - Manage Open vSwitch bridges
 options:
     bridge:
-        required: true
+        required: false
         description:
-            - Name of bridge to manage
+            - Name of bridge to manage. Required unless C(layout) is given.
     state:
         required: false
         default: "present"
@@ -43,14 +43,220 @@ options:
         default: 5
         description:
             - How long to wait for ovs-vswitchd to respond
+    layout:
+        required: false
+        default: null
+        version_added: "2.0"
+        description:
+            - A hash mapping bridge names to the list of ports they should
+              have. A port is either a name or a hash with C(name) and
+              optionally C(tag), C(type) and C(options) (a hash of interface
+              options); C(tag), C(type) and C(options) are only changed when
+              given. The current state is read with one ovs-vsctl call and
+              all changes are applied as a single ovs-vsctl invocation, which
+              is one OVSDB transaction. With C(state=absent) the listed
+              bridges are deleted.
+    purge:
+        required: false
+        default: "no"
+        choices: [ "yes", "no" ]
+        version_added: "2.0"
+        description:
+            - With C(layout), remove ports that are not listed from the
+              bridges in the layout.
 '''
 
 EXAMPLES = '''
 # Create a bridge named br-int
 - openvswitch_bridge: bridge=br-int state=present
+
+# Lay out two bridges and their ports in one transaction
+- openvswitch_bridge:
+    purge: yes
+    layout:
+      br-int:
+        - eth1
+        - { name: vnet0, tag: 10 }
+        - { name: vnet1, tag: 20 }
+      br-tun:
+        - name: vxlan0
+          type: vxlan
+          options:
+            remote_ip: 10.0.0.2
 '''
 
 
+def _ovsdb_value(value):
+    '''Convert a value from the ovs-vsctl JSON output to a python value'''
+    if isinstance(value, list) and len(value) == 2:
+        kind, data = value
+        if kind in ('uuid', 'named-uuid'):
+            return data
+        if kind == 'set':
+            return [_ovsdb_value(item) for item in data]
+        if kind == 'map':
+            return dict((_ovsdb_value(k), _ovsdb_value(v)) for k, v in data)
+    return value
+
+
+def _ovsdb_scalar(value):
+    '''Optional columns are empty sets when unset'''
+    if isinstance(value, list):
+        if not value:
+            return None
+        return value[0]
+    return value
+
+
+class OVSLayout(object):
+    '''
+    Reads the Bridge, Port and Interface tables with a single ovs-vsctl
+    call and applies a whole layout of bridges and ports as one chained
+    ovs-vsctl invocation, which OVSDB commits as a single transaction.
+    '''
+
+    def __init__(self, module, timeout):
+        self.module = module
+        self.timeout = timeout
+        self.bridges = {}
+        self.ports = {}
+        self.interfaces = {}
+
+    def _vsctl(self, command):
+        '''Run ovs-vsctl command'''
+        return self.module.run_command(['ovs-vsctl', '-t', str(self.timeout)] + command)
+
+    def read(self):
+        '''Load the current bridges, ports and interfaces'''
+        rc, out, err = self._vsctl(['--format=json',
+                                    '--', '--columns=name,ports', 'list', 'Bridge',
+                                    '--', '--columns=_uuid,name,tag,interfaces', 'list', 'Port',
+                                    '--', '--columns=_uuid,name,type,options', 'list', 'Interface'])
+        if rc != 0:
+            raise Exception(err)
+
+        tables = []
+        decoder = json.JSONDecoder()
+        out = out.strip()
+        while out:
+            table, end = decoder.raw_decode(out)
+            tables.append([dict(zip(table['headings'], [_ovsdb_value(v) for v in row]))
+                           for row in table['data']])
+            out = out[end:].strip()
+        if len(tables) != 3:
+            raise Exception("unexpected ovs-vsctl output")
+        bridges, ports, interfaces = tables
+
+        interface_names = {}
+        for iface in interfaces:
+            interface_names[iface['_uuid']] = iface['name']
+            self.interfaces[iface['name']] = {
+                'type': iface['type'] or '',
+                'options': dict((k, str(v)) for k, v in iface['options'].items()),
+            }
+
+        port_names = {}
+        for port in ports:
+            members = port['interfaces']
+            if not isinstance(members, list):
+                members = [members]
+            port_names[port['_uuid']] = port['name']
+            self.ports[port['name']] = {
+                'bridge': None,
+                'tag': _ovsdb_scalar(port['tag']),
+                'interfaces': [interface_names.get(i) for i in members],
+            }
+
+        for bridge in bridges:
+            members = bridge['ports']
+            if not isinstance(members, list):
+                members = [members]
+            self.bridges[bridge['name']] = set()
+            for uuid in members:
+                name = port_names.get(uuid)
+                if name is None:
+                    continue
+                self.bridges[bridge['name']].add(name)
+                self.ports[name]['bridge'] = bridge['name']
+
+    def _port_spec(self, spec):
+        '''Normalise a port given as a name or a dict'''
+        if not isinstance(spec, dict):
+            spec = {'name': spec}
+        if not spec.get('name'):
+            self.module.fail_json(msg="port definitions must have a name: %s" % spec)
+        spec = dict(spec)
+        spec['name'] = str(spec['name'])
+        if spec.get('tag') is not None:
+            try:
+                spec['tag'] = int(spec['tag'])
+            except ValueError:
+                self.module.fail_json(msg="invalid tag for port %s: %s" % (spec['name'], spec['tag']))
+        if 'options' in spec:
+            spec['options'] = dict((str(k), str(v)) for k, v in (spec['options'] or {}).items())
+        return spec
+
+    def _interface_changes(self, spec):
+        '''Interface settings that differ from the current ones'''
+        current = self.interfaces.get(spec['name'], {'type': '', 'options': {}})
+        settings = []
+        if 'type' in spec and (spec['type'] or '') != current['type']:
+            settings.append('type=%s' % (spec['type'] or '""'))
+        if 'options' in spec and spec['options'] != current['options']:
+            if spec['options']:
+                settings.append('options={%s}' % ','.join('%s="%s"' % (k, v) for k, v in sorted(spec['options'].items())))
+            else:
+                settings.append('options={}')
+        return settings
+
+    def plan_ports(self, bridge, specs, purge=False):
+        '''Commands that make the ports of one bridge match specs'''
+        commands = []
+        if bridge not in self.bridges:
+            commands.append(['add-br', bridge])
+        current = self.bridges.get(bridge, set())
+
+        wanted = set()
+        for spec in specs:
+            spec = self._port_spec(spec)
+            name = spec['name']
+            wanted.add(name)
+            port = self.ports.get(name)
+            if port is None or port['bridge'] != bridge:
+                if port is not None and port['bridge']:
+                    commands.append(['del-port', port['bridge'], name])
+                add = ['add-port', bridge, name]
+                if spec.get('tag') is not None:
+                    add.append('tag=%d' % spec['tag'])
+                commands.append(add)
+            elif 'tag' in spec and spec['tag'] != port['tag']:
+                if spec['tag'] is None:
+                    commands.append(['clear', 'Port', name, 'tag'])
+                else:
+                    commands.append(['set', 'Port', name, 'tag=%d' % spec['tag']])
+            settings = self._interface_changes(spec)
+            if settings:
+                commands.append(['set', 'Interface', name] + settings)
+
+        if purge:
+            # the bridge's own internal port is never removed
+            for name in sorted(current - wanted - set([bridge])):
+                commands.append(['del-port', bridge, name])
+        return commands
+
+    def apply(self, commands):
+        '''Run all commands as one ovs-vsctl transaction'''
+        if not commands:
+            return
+        args = []
+        for command in commands:
+            args.append('--')
+            args.extend(command)
+        rc, _, err = self._vsctl(args)
+        if rc != 0:
+            raise Exception(err)
+
+
 class OVSBridge(object):
     def __init__(self, module):
         self.module = module
@@ -113,16 +319,46 @@ class OVSBridge(object):
         self.module.exit_json(changed=changed)
 
 
+def apply_layout(module):
+    '''Bring all bridges of the layout in line in one transaction'''
+    layout = module.params['layout']
+    ovs = OVSLayout(module, module.params['timeout'])
+    commands = []
+    try:
+        ovs.read()
+        for bridge in sorted(layout):
+            ports = layout[bridge] or []
+            if not isinstance(ports, list):
+                module.fail_json(msg="the ports of bridge %s must be a list" % bridge)
+            if module.params['state'] == 'absent':
+                if bridge in ovs.bridges:
+                    commands.append(['del-br', bridge])
+            else:
+                commands.extend(ovs.plan_ports(bridge, ports, module.params['purge']))
+        if not module.check_mode:
+            ovs.apply(commands)
+    except Exception, e:
+        module.fail_json(msg=str(e))
+    module.exit_json(changed=bool(commands), commands=[' '.join(c) for c in commands])
+
+
 def main():
     module = AnsibleModule(
         argument_spec={
-            'bridge': {'required': True},
+            'bridge': {'required': False},
             'state': {'default': 'present', 'choices': ['present', 'absent']},
-            'timeout': {'default': 5, 'type': 'int'}
+            'timeout': {'default': 5, 'type': 'int'},
+            'layout': {'required': False, 'type': 'dict'},
+            'purge': {'default': False, 'type': 'bool'},
         },
+        required_one_of=[['bridge', 'layout']],
+        mutually_exclusive=[['bridge', 'layout']],
         supports_check_mode=True,
     )
 
+    if module.params['layout']:
+        apply_layout(module)
+
     br = OVSBridge(module)
     if module.check_mode:
         br.check()
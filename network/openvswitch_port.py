@@ -33,9 +33,10 @@ options:
         description:
             - Name of bridge to manage
     port:
-        required: true
+        required: false
         description:
-            - Name of port to manage on the bridge
+            - Name of port to manage on the bridge. Required unless C(ports)
+              is given.
     state:
         required: false
         default: "present"
@@ -47,14 +48,206 @@ options:
         default: 5
         description:
             - How long to wait for ovs-vswitchd to respond
+    ports:
+        required: false
+        default: null
+        version_added: "2.0"
+        description:
+            - A list of ports to manage on the bridge at once. Each item is
+              either a port name or a hash with C(name) and optionally C(tag),
+              C(type) and C(options) (a hash of interface options), which are
+              only changed when given. The current state is read with one
+              ovs-vsctl call and all changes, including creating a missing
+              bridge and moving ports from other bridges, are applied as a
+              single OVSDB transaction.
 '''
 
 EXAMPLES = '''
 # Creates port eth2 on bridge br-ex
 - openvswitch_port: bridge=br-ex port=eth2 state=present
+
+# Creates tagged ports vnet0 and vnet1 on bridge br-int in one transaction
+- openvswitch_port:
+    bridge: br-int
+    ports:
+      - { name: vnet0, tag: 10 }
+      - { name: vnet1, tag: 20 }
 '''
 
 
+def _ovsdb_value(value):
+    '''Convert a value from the ovs-vsctl JSON output to a python value'''
+    if isinstance(value, list) and len(value) == 2:
+        kind, data = value
+        if kind in ('uuid', 'named-uuid'):
+            return data
+        if kind == 'set':
+            return [_ovsdb_value(item) for item in data]
+        if kind == 'map':
+            return dict((_ovsdb_value(k), _ovsdb_value(v)) for k, v in data)
+    return value
+
+
+def _ovsdb_scalar(value):
+    '''Optional columns are empty sets when unset'''
+    if isinstance(value, list):
+        if not value:
+            return None
+        return value[0]
+    return value
+
+
+class OVSLayout(object):
+    '''
+    Reads the Bridge, Port and Interface tables with a single ovs-vsctl
+    call and adds or removes a list of ports as one chained ovs-vsctl
+    invocation, which OVSDB commits as a single transaction.
+    '''
+
+    def __init__(self, module, timeout):
+        self.module = module
+        self.timeout = timeout
+        self.bridges = {}
+        self.ports = {}
+        self.interfaces = {}
+
+    def _vsctl(self, command):
+        '''Run ovs-vsctl command'''
+        return self.module.run_command(['ovs-vsctl', '-t', str(self.timeout)] + command)
+
+    def read(self):
+        '''Load the current bridges, ports and interfaces'''
+        rc, out, err = self._vsctl(['--format=json',
+                                    '--', '--columns=name,ports', 'list', 'Bridge',
+                                    '--', '--columns=_uuid,name,tag,interfaces', 'list', 'Port',
+                                    '--', '--columns=_uuid,name,type,options', 'list', 'Interface'])
+        if rc != 0:
+            raise Exception(err)
+
+        tables = []
+        decoder = json.JSONDecoder()
+        out = out.strip()
+        while out:
+            table, end = decoder.raw_decode(out)
+            tables.append([dict(zip(table['headings'], [_ovsdb_value(v) for v in row]))
+                           for row in table['data']])
+            out = out[end:].strip()
+        if len(tables) != 3:
+            raise Exception("unexpected ovs-vsctl output")
+        bridges, ports, interfaces = tables
+
+        interface_names = {}
+        for iface in interfaces:
+            interface_names[iface['_uuid']] = iface['name']
+            self.interfaces[iface['name']] = {
+                'type': iface['type'] or '',
+                'options': dict((k, str(v)) for k, v in iface['options'].items()),
+            }
+
+        port_names = {}
+        for port in ports:
+            members = port['interfaces']
+            if not isinstance(members, list):
+                members = [members]
+            port_names[port['_uuid']] = port['name']
+            self.ports[port['name']] = {
+                'bridge': None,
+                'tag': _ovsdb_scalar(port['tag']),
+                'interfaces': [interface_names.get(i) for i in members],
+            }
+
+        for bridge in bridges:
+            members = bridge['ports']
+            if not isinstance(members, list):
+                members = [members]
+            self.bridges[bridge['name']] = set()
+            for uuid in members:
+                name = port_names.get(uuid)
+                if name is None:
+                    continue
+                self.bridges[bridge['name']].add(name)
+                self.ports[name]['bridge'] = bridge['name']
+
+    def _port_spec(self, spec):
+        '''Normalise a port given as a name or a dict'''
+        if not isinstance(spec, dict):
+            spec = {'name': spec}
+        if not spec.get('name'):
+            self.module.fail_json(msg="port definitions must have a name: %s" % spec)
+        spec = dict(spec)
+        spec['name'] = str(spec['name'])
+        if spec.get('tag') is not None:
+            try:
+                spec['tag'] = int(spec['tag'])
+            except ValueError:
+                self.module.fail_json(msg="invalid tag for port %s: %s" % (spec['name'], spec['tag']))
+        if 'options' in spec:
+            spec['options'] = dict((str(k), str(v)) for k, v in (spec['options'] or {}).items())
+        return spec
+
+    def _interface_changes(self, spec):
+        '''Interface settings that differ from the current ones'''
+        current = self.interfaces.get(spec['name'], {'type': '', 'options': {}})
+        settings = []
+        if 'type' in spec and (spec['type'] or '') != current['type']:
+            settings.append('type=%s' % (spec['type'] or '""'))
+        if 'options' in spec and spec['options'] != current['options']:
+            if spec['options']:
+                settings.append('options={%s}' % ','.join('%s="%s"' % (k, v) for k, v in sorted(spec['options'].items())))
+            else:
+                settings.append('options={}')
+        return settings
+
+    def plan_ports(self, bridge, specs):
+        '''Commands that put the ports in specs on one bridge'''
+        commands = []
+        if bridge not in self.bridges:
+            commands.append(['add-br', bridge])
+
+        for spec in specs:
+            spec = self._port_spec(spec)
+            name = spec['name']
+            port = self.ports.get(name)
+            if port is None or port['bridge'] != bridge:
+                if port is not None and port['bridge']:
+                    commands.append(['del-port', port['bridge'], name])
+                add = ['add-port', bridge, name]
+                if spec.get('tag') is not None:
+                    add.append('tag=%d' % spec['tag'])
+                commands.append(add)
+            elif 'tag' in spec and spec['tag'] != port['tag']:
+                if spec['tag'] is None:
+                    commands.append(['clear', 'Port', name, 'tag'])
+                else:
+                    commands.append(['set', 'Port', name, 'tag=%d' % spec['tag']])
+            settings = self._interface_changes(spec)
+            if settings:
+                commands.append(['set', 'Interface', name] + settings)
+        return commands
+
+    def plan_absent_ports(self, bridge, specs):
+        '''Commands that remove the given ports from a bridge'''
+        commands = []
+        current = self.bridges.get(bridge, set())
+        for spec in specs:
+            name = self._port_spec(spec)['name']
+            if name in current:
+                commands.append(['del-port', bridge, name])
+        return commands
+
+    def apply(self, commands):
+        '''Run all commands as one ovs-vsctl transaction'''
+        if not commands:
+            return
+        args = []
+        for command in commands:
+            args.append('--')
+            args.extend(command)
+        rc, _, err = self._vsctl(args)
+        if rc != 0:
+            raise Exception(err)
+
+
 class OVSPort(object):
     def __init__(self, module):
         self.module = module
@@ -116,17 +309,41 @@ class OVSPort(object):
         self.module.exit_json(changed=changed)
 
 
+def apply_ports(module):
+    '''Bring all listed ports of the bridge in line in one transaction'''
+    bridge = module.params['bridge']
+    ports = module.params['ports']
+    ovs = OVSLayout(module, module.params['timeout'])
+    try:
+        ovs.read()
+        if module.params['state'] == 'absent':
+            commands = ovs.plan_absent_ports(bridge, ports)
+        else:
+            commands = ovs.plan_ports(bridge, ports)
+        if not module.check_mode:
+            ovs.apply(commands)
+    except Exception, e:
+        module.fail_json(msg=str(e))
+    module.exit_json(changed=bool(commands), commands=[' '.join(c) for c in commands])
+
+
 def main():
     module = AnsibleModule(
         argument_spec={
             'bridge': {'required': True},
-            'port': {'required': True},
+            'port': {'required': False},
             'state': {'default': 'present', 'choices': ['present', 'absent']},
-            'timeout': {'default': 5, 'type': 'int'}
+            'timeout': {'default': 5, 'type': 'int'},
+            'ports': {'required': False, 'type': 'list'},
         },
+        required_one_of=[['port', 'ports']],
+        mutually_exclusive=[['port', 'ports']],
         supports_check_mode=True,
     )
 
+    if module.params['ports']:
+        apply_ports(module)
+
     port = OVSPort(module)
     if module.check_mode:
         port.check()
@@ -31,7 +31,30 @@ options:
     host:
         description:
             - Set to target snmp server (normally {{inventory_hostname}})
-        required: true
+            - Required unless I(hosts) is given.
+        required: false
+    hosts:
+        description:
+            - A list of snmp servers to poll concurrently in one task. The facts of each
+              server are returned in the C(snmp_hosts) fact, keyed by host; servers that
+              could not be polled have C(failed) and C(msg) set instead.
+              The task only fails when no server could be polled.
+            - Mutually exclusive with I(host).
+        required: false
+        version_added: "2.0"
+    workers:
+        description:
+            - The number of servers polled at the same time when I(hosts) is used.
+        required: false
+        default: 8
+        version_added: "2.0"
+    max_repetitions:
+        description:
+            - Number of rows requested per GETBULK request when walking the interface
+              and address tables. Set to 0 to walk the tables with GETNEXT requests instead.
+        required: false
+        default: 25
+        version_added: "2.0"
     version:
         description:
             - SNMP Version to use, v2/v2c or v3
@@ -86,10 +109,20 @@ EXAMPLES = '''
     authkey=abc12345
     privkey=def6789
   delegate_to: localhost
+
+# Poll all core switches from one task
+- snmp_facts:
+    hosts: "{{ groups['core_switches'] }}"
+    version: v2c
+    community: public
+    max_repetitions: 50
+  delegate_to: localhost
+  run_once: true
 '''
 
 from ansible.module_utils.basic import *
-from collections import defaultdict
+import threading
+import Queue
 
 try:
     from pysnmp.entity.rfc3413.oneliner import cmdgen
@@ -173,10 +206,210 @@ def lookup_operstatus(int_operstatus):
     else:
         return ""
 
+def oid_tuple(oid):
+    return tuple([ int(arc) for arc in oid.strip('.').split('.') ])
+
+class OidTrie(object):
+    """ Maps OID prefixes (table columns) to handlers, matched one arc at a time """
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, oid, handler):
+        node = self.root
+        for arc in oid_tuple(oid):
+            node = node.setdefault(arc, {})
+        node[None] = handler
+
+    def lookup(self, oid):
+        """ returns (handler, index suffix) for the column oid belongs to, or (None, None) """
+        node = self.root
+        for i, arc in enumerate(oid):
+            node = node.get(arc)
+            if node is None:
+                return None, None
+            if None in node:
+                return node[None], oid[i + 1:]
+        return None, None
+
+class InterfaceTable(object):
+    """ Turns IF-MIB/IP-MIB varbinds straight into per-ifIndex and per-address records """
+
+    def __init__(self):
+        self.interfaces = {}
+        self.ipv4_networks = {}
+        self.all_ipv4_addresses = []
+
+        v = DefineOid(dotprefix=False)
+        self.trie = OidTrie()
+        self.trie.add(v.ifIndex, self._interface('ifindex'))
+        self.trie.add(v.ifDescr, self._interface('name'))
+        self.trie.add(v.ifMtu, self._interface('mtu'))
+        self.trie.add(v.ifSpeed, self._interface('speed'))
+        self.trie.add(v.ifPhysAddress, self._interface('mac', decode_mac))
+        self.trie.add(v.ifAdminStatus, self._interface('adminstatus', lambda x: lookup_adminstatus(int(x))))
+        self.trie.add(v.ifOperStatus, self._interface('operstatus', lambda x: lookup_operstatus(int(x))))
+        self.trie.add(v.ifAlias, self._interface('description'))
+        self.trie.add(v.ipAdEntAddr, self._address('address'))
+        self.trie.add(v.ipAdEntIfIndex, self._address('interface'))
+        self.trie.add(v.ipAdEntNetMask, self._address('netmask'))
+
+    def _interface(self, key, convert=None):
+        def handler(index, value):
+            record = self.interfaces.setdefault(index[-1], {})
+            if convert:
+                value = convert(value)
+            record[key] = value
+        return handler
+
+    def _address(self, key):
+        def handler(index, value):
+            record = self.ipv4_networks.setdefault(index[-4:], {})
+            record[key] = value
+            if key == 'address':
+                self.all_ipv4_addresses.append(value)
+        return handler
+
+    def add(self, varBinds):
+        for oid, val in varBinds:
+            if val is None:
+                continue
+            handler, index = self.trie.lookup(tuple(oid))
+            if handler is not None and index:
+                handler(index, val.prettyPrint())
+
+    def facts(self):
+        for network in self.ipv4_networks.values():
+            if 'interface' not in network:
+                continue
+            record = self.interfaces.setdefault(int(network['interface']), {})
+            record.setdefault('ipv4', []).append({
+                                                   'address': network.get('address'),
+                                                   'netmask': network.get('netmask')
+                                                 })
+        return self.interfaces, self.all_ipv4_addresses
+
+def collect_facts(cmdGen, snmp_auth, host, max_repetitions):
+    """ polls one device, returns (facts, error message) """
+
+    # Use p to prefix OIDs with a dot for polling
+    p = DefineOid(dotprefix=True)
+    # Use v without a prefix to use with return values
+    v = DefineOid(dotprefix=False)
+
+    results = {}
+
+    errorIndication, errorStatus, errorIndex, varBinds = cmdGen.getCmd(
+        snmp_auth,
+        cmdgen.UdpTransportTarget((host, 161)),
+        cmdgen.MibVariable(p.sysDescr,),
+        cmdgen.MibVariable(p.sysObjectId,), 
+        cmdgen.MibVariable(p.sysUpTime,),
+        cmdgen.MibVariable(p.sysContact,), 
+        cmdgen.MibVariable(p.sysName,),
+        cmdgen.MibVariable(p.sysLocation,),
+    )
+
+
+    if errorIndication:
+        return None, str(errorIndication)
+
+    for oid, val in varBinds:
+        current_oid = oid.prettyPrint()
+        current_val = val.prettyPrint()
+        if current_oid == v.sysDescr:
+            results['ansible_sysdescr'] = decode_hex(current_val)
+        elif current_oid == v.sysObjectId:
+            results['ansible_sysobjectid'] = current_val
+        elif current_oid == v.sysUpTime:
+            results['ansible_sysuptime'] = current_val
+        elif current_oid == v.sysContact:
+            results['ansible_syscontact'] = current_val
+        elif current_oid == v.sysName:
+            results['ansible_sysname'] = current_val
+        elif current_oid == v.sysLocation:
+            results['ansible_syslocation'] = current_val
+
+    columns = [
+        cmdgen.MibVariable(p.ifIndex,),
+        cmdgen.MibVariable(p.ifDescr,),
+        cmdgen.MibVariable(p.ifMtu,),
+        cmdgen.MibVariable(p.ifSpeed,),
+        cmdgen.MibVariable(p.ifPhysAddress,),
+        cmdgen.MibVariable(p.ifAdminStatus,),
+        cmdgen.MibVariable(p.ifOperStatus,),
+        cmdgen.MibVariable(p.ipAdEntAddr,), 
+        cmdgen.MibVariable(p.ipAdEntIfIndex,), 
+        cmdgen.MibVariable(p.ipAdEntNetMask,), 
+
+        cmdgen.MibVariable(p.ifAlias,),
+    ]
+
+    if max_repetitions > 0:
+        # GETBULK returns up to max_repetitions rows of every column per request
+        errorIndication, errorStatus, errorIndex, varTable = cmdGen.bulkCmd(
+            snmp_auth,
+            cmdgen.UdpTransportTarget((host, 161)),
+            0, max_repetitions,
+            *columns
+        )
+    else:
+        errorIndication, errorStatus, errorIndex, varTable = cmdGen.nextCmd(
+            snmp_auth,
+            cmdgen.UdpTransportTarget((host, 161)),
+            *columns
+        )
+
+    if errorIndication:
+        return None, str(errorIndication)
+
+    table = InterfaceTable()
+    for varBinds in varTable:
+        table.add(varBinds)
+
+    results['ansible_interfaces'], results['ansible_all_ipv4_addresses'] = table.facts()
+
+    return results, None
+
+def collect_all_facts(snmp_auth, hosts, max_repetitions, workers):
+    """ polls several devices concurrently, each worker with its own SNMP engine """
+
+    pending = Queue.Queue()
+    for host in hosts:
+        pending.put(host)
+    facts = {}
+
+    def worker():
+        cmdGen = cmdgen.CommandGenerator()
+        while True:
+            try:
+                host = pending.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results, error = collect_facts(cmdGen, snmp_auth, host, max_repetitions)
+            except Exception, e:
+                results, error = None, str(e)
+            if error:
+                facts[host] = { 'failed': True, 'msg': error }
+            else:
+                facts[host] = results
+
+    threads = []
+    for i in range(min(workers, len(hosts))):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    return facts
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
-            host=dict(required=True),
+            host=dict(required=False),
+            hosts=dict(required=False, type='list'),
             version=dict(required=True, choices=['v2', 'v2c', 'v3']),
             community=dict(required=False, default=False),
             username=dict(required=False),
@@ -185,8 +418,12 @@ def main():
             privacy=dict(required=False, choices=['des', 'aes']),
             authkey=dict(required=False),
             privkey=dict(required=False),
+            max_repetitions=dict(required=False, default=25, type='int'),
+            workers=dict(required=False, default=8, type='int'),
             removeplaceholder=dict(required=False)),
             required_together = ( ['username','level','integrity','authkey'],['privacy','privkey'],),
+            required_one_of = ( ['host', 'hosts'], ),
+            mutually_exclusive = ( ['host', 'hosts'], ),
         supports_check_mode=False)
 
     m_args = module.params
@@ -231,136 +468,18 @@ def main():
     else:
         snmp_auth = cmdgen.UsmUserData(m_args['username'], authKey=m_args['authkey'], privKey=m_args['privkey'], authProtocol=integrity_proto, privProtocol=privacy_proto)
 
-    # Use p to prefix OIDs with a dot for polling
-    p = DefineOid(dotprefix=True)
-    # Use v without a prefix to use with return values
-    v = DefineOid(dotprefix=False)
-
-    Tree = lambda: defaultdict(Tree)
-                               
-    results = Tree()
-            
-    errorIndication, errorStatus, errorIndex, varBinds = cmdGen.getCmd(
-        snmp_auth,
-        cmdgen.UdpTransportTarget((m_args['host'], 161)),
-        cmdgen.MibVariable(p.sysDescr,),
-        cmdgen.MibVariable(p.sysObjectId,), 
-        cmdgen.MibVariable(p.sysUpTime,),
-        cmdgen.MibVariable(p.sysContact,), 
-        cmdgen.MibVariable(p.sysName,),
-        cmdgen.MibVariable(p.sysLocation,),
-    )
-
+    if m_args['hosts']:
+        facts = collect_all_facts(snmp_auth, m_args['hosts'], m_args['max_repetitions'], max(1, m_args['workers']))
+        failed = [ host for host in facts if facts[host].get('failed') ]
+        if len(failed) == len(facts):
+            module.fail_json(msg='Unable to poll any host', snmp_hosts=facts)
+        module.exit_json(ansible_facts={ 'snmp_hosts': facts })
 
-    if errorIndication:
-        module.fail_json(msg=str(errorIndication))
+    results, error = collect_facts(cmdGen, snmp_auth, m_args['host'], m_args['max_repetitions'])
+    if error:
+        module.fail_json(msg=error)
 
-    for oid, val in varBinds:
-        current_oid = oid.prettyPrint()
-        current_val = val.prettyPrint()
-        if current_oid == v.sysDescr:
-            results['ansible_sysdescr'] = decode_hex(current_val)
-        elif current_oid == v.sysObjectId:
-            results['ansible_sysobjectid'] = current_val
-        elif current_oid == v.sysUpTime:
-            results['ansible_sysuptime'] = current_val
-        elif current_oid == v.sysContact:
-            results['ansible_syscontact'] = current_val
-        elif current_oid == v.sysName:
-            results['ansible_sysname'] = current_val
-        elif current_oid == v.sysLocation:
-            results['ansible_syslocation'] = current_val
-
-    errorIndication, errorStatus, errorIndex, varTable = cmdGen.nextCmd(
-        snmp_auth,
-        cmdgen.UdpTransportTarget((m_args['host'], 161)), 
-        cmdgen.MibVariable(p.ifIndex,),
-        cmdgen.MibVariable(p.ifDescr,),
-        cmdgen.MibVariable(p.ifMtu,),
-        cmdgen.MibVariable(p.ifSpeed,),
-        cmdgen.MibVariable(p.ifPhysAddress,),
-        cmdgen.MibVariable(p.ifAdminStatus,),
-        cmdgen.MibVariable(p.ifOperStatus,),
-        cmdgen.MibVariable(p.ipAdEntAddr,), 
-        cmdgen.MibVariable(p.ipAdEntIfIndex,), 
-        cmdgen.MibVariable(p.ipAdEntNetMask,), 
-
-        cmdgen.MibVariable(p.ifAlias,),
-    )
- 
-
-    if errorIndication:
-        module.fail_json(msg=str(errorIndication))
-
-    interface_indexes = []
-    
-    all_ipv4_addresses = []     
-    ipv4_networks = Tree()
-
-    for varBinds in varTable:
-        for oid, val in varBinds:
-            current_oid = oid.prettyPrint()
-            current_val = val.prettyPrint()
-            if v.ifIndex in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['ifindex'] = current_val
-                interface_indexes.append(ifIndex)
-            if v.ifDescr in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['name'] = current_val
-            if v.ifMtu in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['mtu'] = current_val
-            if v.ifMtu in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['speed'] = current_val
-            if v.ifPhysAddress in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['mac'] = decode_mac(current_val)
-            if v.ifAdminStatus in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['adminstatus'] = lookup_adminstatus(int(current_val))
-            if v.ifOperStatus in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['operstatus'] = lookup_operstatus(int(current_val))
-            if v.ipAdEntAddr in current_oid:
-                curIPList = current_oid.rsplit('.', 4)[-4:]
-                curIP = ".".join(curIPList)
-                ipv4_networks[curIP]['address'] = current_val
-                all_ipv4_addresses.append(current_val)
-            if v.ipAdEntIfIndex in current_oid:
-                curIPList = current_oid.rsplit('.', 4)[-4:]
-                curIP = ".".join(curIPList)
-                ipv4_networks[curIP]['interface'] = current_val
-            if v.ipAdEntNetMask in current_oid:
-                curIPList = current_oid.rsplit('.', 4)[-4:]
-                curIP = ".".join(curIPList)
-                ipv4_networks[curIP]['netmask'] = current_val
-
-            if v.ifAlias in current_oid:
-                ifIndex = int(current_oid.rsplit('.', 1)[-1])
-                results['ansible_interfaces'][ifIndex]['description'] = current_val
-
-    interface_to_ipv4 = {}
-    for ipv4_network in ipv4_networks:
-        current_interface = ipv4_networks[ipv4_network]['interface']
-        current_network = {
-                            'address':  ipv4_networks[ipv4_network]['address'],
-                            'netmask':  ipv4_networks[ipv4_network]['netmask']
-                          }
-        if not current_interface in interface_to_ipv4:
-            interface_to_ipv4[current_interface] = []
-            interface_to_ipv4[current_interface].append(current_network)
-        else:
-            interface_to_ipv4[current_interface].append(current_network)
-
-    for interface in interface_to_ipv4:
-        results['ansible_interfaces'][int(interface)]['ipv4'] = interface_to_ipv4[interface]
-
-    results['ansible_all_ipv4_addresses'] = all_ipv4_addresses
- 
     module.exit_json(ansible_facts=results)
     
 
 main()
-
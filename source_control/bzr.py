@@ -58,14 +58,52 @@ options:
         description:
             - Path to bzr executable to use. If not supplied,
               the normal mechanism for resolving binary paths will be used.
+    cache_dir:
+        required: false
+        default: null
+        version_added: "2.0"
+        description:
+            - Path of a shared repository on the host used as a revision
+              cache. Each parent branch is mirrored into it once, and every
+              destination is created from the mirror instead of the parent,
+              so the history is only downloaded once per host. When
+              C(version) is a revision the mirror already has, the parent is
+              not contacted at all.
+    cache_max_age:
+        required: false
+        default: 60
+        version_added: "2.0"
+        description:
+            - With C(cache_dir) and C(version=head), the number of seconds
+              a mirror is considered current after it was last pulled.
+    checkout:
+        required: false
+        default: "lightweight"
+        choices: [ 'lightweight', 'stacked' ]
+        version_added: "2.0"
+        description:
+            - With C(cache_dir), how destinations are created from the mirror.
+              C(lightweight) makes a lightweight checkout that holds only the
+              working tree. C(stacked) makes a branch stacked on the mirror,
+              which only stores revisions committed in the destination itself.
 '''
 
 EXAMPLES = '''
 # Example bzr checkout from Ansible Playbooks
 - bzr: name=bzr+ssh://foosball.example.org/path/to/branch dest=/srv/checkout version=22
+
+# Deploy several applications from one branch, downloading its history once
+- bzr: name=bzr+ssh://foosball.example.org/path/to/branch dest=/srv/{{ item }} cache_dir=/var/cache/bzr
+  with_items: [ app1, app2, app3 ]
 '''
 
+import fcntl
 import re
+import time
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import sha as sha1
 
 
 class Bzr(object):
@@ -138,6 +176,91 @@ class Bzr(object):
             args_list = ["revert"]
         return self._command(args_list, check_rc=True, cwd=self.dest)
 
+
+class BzrCache(object):
+    '''
+    Keeps a mirror of each parent branch in a shared, treeless
+    repository so that destinations are created and updated from
+    local history instead of the parent.
+    '''
+
+    def __init__(self, module, bzr_path, cache_dir, parent, max_age):
+        self.module = module
+        self.bzr_path = bzr_path
+        self.cache_dir = cache_dir
+        self.parent = parent
+        self.max_age = max_age
+        self.mirror = os.path.join(cache_dir, sha1(parent).hexdigest())
+        self.stamp = self.mirror + '.pulled'
+
+    def _command(self, args_list, **kwargs):
+        return self.module.run_command([self.bzr_path] + args_list, **kwargs)
+
+    def has_revision(self, version):
+        '''checks the requested revision against the mirror only'''
+        if version.lower() == 'head':
+            try:
+                return time.time() - os.path.getmtime(self.stamp) < self.max_age
+            except OSError:
+                return False
+        rc, out, err = self._command(["revision-info", "-d", self.mirror, "-r", version])
+        return rc == 0
+
+    def update(self, version):
+        '''brings the mirror up to date, unless it already has the revision'''
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        lock = open(self.mirror + '.lock', 'w')
+        try:
+            # tasks running on the same host share the mirror
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(os.path.join(self.cache_dir, '.bzr', 'repository')):
+                self._command(["init-repo", "--no-trees", self.cache_dir], check_rc=True)
+            if not os.path.exists(os.path.join(self.mirror, '.bzr', 'branch')):
+                self._command(["branch", "--no-tree", self.parent, self.mirror], check_rc=True)
+            elif self.has_revision(version):
+                return False
+            else:
+                (rc, out, err) = self._command(["pull", "--overwrite", "-d", self.mirror, self.parent])
+                if rc != 0:
+                    self.module.fail_json(msg="Failed to pull into the cache", stderr=err)
+            open(self.stamp, 'w').close()
+            return True
+        finally:
+            lock.close()
+
+    def clone(self, dest, version, checkout):
+        '''creates dest from the mirror'''
+        dest_dirname = os.path.dirname(dest)
+        try:
+            os.makedirs(dest_dirname)
+        except:
+            pass
+        if checkout == 'lightweight':
+            args_list = ["checkout", "--lightweight"]
+        else:
+            args_list = ["branch", "--stacked"]
+        if version.lower() != 'head':
+            args_list += ["-r", version]
+        return self._command(args_list + [self.mirror, dest], check_rc=True, cwd=dest_dirname)
+
+    def fetch(self, dest, version):
+        '''updates dest from the mirror'''
+        # a lightweight checkout is updated, a branch of its own pulls
+        lightweight = not os.path.exists(os.path.join(dest, '.bzr', 'branch'))
+        if lightweight:
+            args_list = ["update"]
+        else:
+            args_list = ["pull", "--overwrite"]
+        if version.lower() != 'head':
+            args_list += ["-r", version]
+        if not lightweight:
+            args_list.append(self.mirror)
+        (rc, out, err) = self._command(args_list, cwd=dest)
+        if rc != 0:
+            self.module.fail_json(msg="Failed to update from the cache", stderr=err)
+        return (rc, out, err)
+
 # ===========================================
 
 def main():
@@ -148,6 +271,9 @@ def main():
             version=dict(default='head'),
             force=dict(default='no', type='bool'),
             executable=dict(default=None),
+            cache_dir=dict(default=None),
+            cache_max_age=dict(default=60, type='int'),
+            checkout=dict(default='lightweight', choices=['lightweight', 'stacked']),
         )
     )
 
@@ -163,11 +289,29 @@ def main():
 
     bzr = Bzr(module, parent, dest, version, bzr_path)
 
+    cache = None
+    checkout = module.params['checkout']
+    if module.params['cache_dir']:
+        cache_dir = os.path.abspath(os.path.expanduser(module.params['cache_dir']))
+        cache = BzrCache(module, bzr_path, cache_dir, parent, module.params['cache_max_age'])
+        cache.update(version)
+
     # if there is no bzr configuration, do a branch operation
     # else pull and switch the version
     before = None
     local_mods = False
-    if not os.path.exists(bzrconfig):
+    if cache is not None and not os.path.exists(os.path.join(dest, '.bzr')):
+        (rc, out, err) = cache.clone(dest, version, checkout)
+
+    elif cache is not None:
+        local_mods = bzr.has_local_mods()
+        before = bzr.get_version()
+        (rc, out, err) = bzr.reset(force)
+        if rc != 0:
+            module.fail_json(msg=err)
+        (rc, out, err) = cache.fetch(dest, version)
+
+    elif not os.path.exists(bzrconfig):
         (rc, out, err) = bzr.clone()
 
     else:
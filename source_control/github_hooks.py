@@ -20,6 +20,10 @@
 
 import json
 import base64
+import tempfile
+import threading
+import time
+import Queue
 
 DOCUMENTATION = '''
 ---
@@ -40,7 +44,8 @@ options:
   repo:
     description:
       - "This is the API url for the repository you want to manage hooks for. It should be in the form of: https://api.github.com/repos/user:/repo:. Note this is different than the normal repo url."
-    required: true
+      - Required unless C(action) is C(reconcile).
+    required: false
   hookurl:
     description:
       - When creating a new hook, this is the url that you want github to post to. It is only required when creating a new hook.
@@ -49,7 +54,7 @@ options:
     description:
       - This tells the githooks module what you want it to do.
     required: true
-    choices: [ "create", "cleanall" ]
+    choices: [ "create", "cleanall", "reconcile" ]
   validate_certs:
     description:
       - If C(no), SSL certificates for the target repo will not be validated. This should only be used
@@ -63,6 +68,48 @@ options:
     required: false
     default: 'json'
     choices: ['json', 'form']
+  repos:
+    description:
+      - With C(action=reconcile), the list of repository API urls whose web hooks should match C(hooks).
+    required: false
+    default: null
+    version_added: "2.0"
+  hooks:
+    description:
+      - With C(action=reconcile), the desired web hooks. Each item is an url or a hash with C(url) and optionally
+        C(content_type), C(events) (default C([push])), C(active) (default C(yes)) and C(secret). Missing hooks are
+        created, differing ones updated and duplicates removed.
+    required: false
+    default: null
+    version_added: "2.0"
+  purge:
+    description:
+      - With C(action=reconcile), also delete web hooks whose url is not in C(hooks).
+    required: false
+    default: 'no'
+    choices: ['yes', 'no']
+    version_added: "2.0"
+  workers:
+    description:
+      - With C(action=reconcile), the number of repositories handled concurrently.
+    required: false
+    default: 4
+    version_added: "2.0"
+  cache_path:
+    description:
+      - With C(action=reconcile), file caching the hook lists and their ETags. Repositories whose hooks did not
+        change are answered with a 304, which does not count against the API rate limit. Set to an empty
+        string to disable the cache.
+    required: false
+    default: '~/.ansible/cache/github_hooks.json'
+    version_added: "2.0"
+  rate_limit_wait:
+    description:
+      - With C(action=reconcile), the longest time in seconds to wait for the API rate limit to reset when it
+        runs out. Workers slow down once the remaining requests drop to their number.
+    required: false
+    default: 900
+    version_added: "2.0"
 
 author: '"Phillip Gentry, CX Inc (@pcgentry)" <phillip@cx.com>'
 '''
@@ -73,22 +120,50 @@ EXAMPLES = '''
 
 # Cleaning all hooks for this repo that had an error on the last update. Since this works for all hooks in a repo it is probably best that this would be called from a handler.
 - local_action: github_hooks action=cleanall user={{ gituser }} oauthkey={{ oauthkey }} repo={{ repo }}
+
+# Make every repository post to the deploy server, removing any other web hook
+- local_action:
+    module: github_hooks
+    action: reconcile
+    user: "{{ gituser }}"
+    oauthkey: "{{ oauthkey }}"
+    purge: yes
+    repos:
+      - https://api.github.com/repos/pcgentry/Github-Auto-Deploy
+      - https://api.github.com/repos/pcgentry/other-repo
+    hooks:
+      - url: http://11.111.111.111:2222
+        events: [ push, pull_request ]
 '''
 
-def _list(module, hookurl, oauthkey, repo, user):
-    url = "%s/hooks" % repo
+def _auth_headers(user, oauthkey):
     auth = base64.encodestring('%s:%s' % (user, oauthkey)).replace('\n', '')
-    headers = {
+    return {
         'Authorization': 'Basic %s' % auth,
     }
-    response, info = fetch_url(module, url, headers=headers)
-    if info['status'] != 200:
-        return False, ''
-    else:
-        return False, response.read()
+
+def _next_link(info):
+    '''Returns the url of the next page from the Link header, if any'''
+    for link in info.get('link', '').split(','):
+        parts = link.split(';')
+        if len(parts) > 1 and 'rel="next"' in parts[1]:
+            return parts[0].strip().strip('<>')
+    return None
+
+def _list(module, hookurl, oauthkey, repo, user):
+    url = "%s/hooks?per_page=100" % repo
+    headers = _auth_headers(user, oauthkey)
+    hooks = []
+    while url:
+        response, info = fetch_url(module, url, headers=headers)
+        if info['status'] != 200:
+            return False, ''
+        hooks.extend(json.loads(response.read()))
+        url = _next_link(info)
+    return False, json.dumps(hooks)
 
 def _clean504(module, hookurl, oauthkey, repo, user):
-    current_hooks = _list(hookurl, oauthkey, repo, user)[1]
+    current_hooks = _list(module, hookurl, oauthkey, repo, user)[1]
     decoded = json.loads(current_hooks)
 
     for hook in decoded:
@@ -100,7 +175,7 @@ def _clean504(module, hookurl, oauthkey, repo, user):
     return 0, current_hooks
 
 def _cleanall(module, hookurl, oauthkey, repo, user):
-    current_hooks = _list(hookurl, oauthkey, repo, user)[1]
+    current_hooks = _list(module, hookurl, oauthkey, repo, user)[1]
     decoded = json.loads(current_hooks)
 
     for hook in decoded:
@@ -122,36 +197,299 @@ def _create(module, hookurl, oauthkey, repo, user, content_type):
             }
         }
     data = json.dumps(values)
-    auth = base64.encodestring('%s:%s' % (user, oauthkey)).replace('\n', '')
-    headers = {
-        'Authorization': 'Basic %s' % auth,
-    }
+    headers = _auth_headers(user, oauthkey)
     response, info = fetch_url(module, url, data=data, headers=headers)
-    if info['status'] != 200:
+    if not 200 <= info['status'] < 300:
         return 0, '[]'
     else:
         return 0, response.read()
 
 def _delete(module, hookurl, oauthkey, repo, user, hookid):
     url = "%s/hooks/%s" % (repo, hookid)
-    auth = base64.encodestring('%s:%s' % (user, oauthkey)).replace('\n', '')
-    headers = {
-        'Authorization': 'Basic %s' % auth,
-    }
-    response, info = fetch_url(module, url, data=data, headers=headers, method='DELETE')
+    headers = _auth_headers(user, oauthkey)
+    response, info = fetch_url(module, url, headers=headers, method='DELETE')
+    if not 200 <= info['status'] < 300:
+        return ''
     return response.read()
 
+class RateLimiter(object):
+    '''
+    Tracks the X-RateLimit-* headers of the API responses shared by all
+    workers, and makes them wait for the reset once the remaining
+    requests drop to the reserve.
+    '''
+
+    def __init__(self, reserve, max_wait):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.remaining = None
+        self.reset = None
+        self.lock = threading.Lock()
+
+    def update(self, info):
+        if 'x-ratelimit-remaining' not in info:
+            return
+        self.lock.acquire()
+        try:
+            self.remaining = int(info['x-ratelimit-remaining'])
+            self.reset = int(info.get('x-ratelimit-reset', 0))
+        finally:
+            self.lock.release()
+
+    def wait(self):
+        self.lock.acquire()
+        try:
+            if self.remaining is None or self.remaining > self.reserve:
+                if self.remaining is not None:
+                    self.remaining -= 1
+                return
+            delay = (self.reset or 0) - time.time() + 1
+        finally:
+            self.lock.release()
+        if delay > self.max_wait:
+            raise Exception("rate limit exhausted until %s" % time.ctime(self.reset))
+        if delay > 0:
+            time.sleep(delay)
+
+    def exhausted(self):
+        '''
+        Called on a 403, which is how the API reports an exhausted limit.
+        Returns False when the limit was not running low, as the 403 is
+        then a genuine permission error.
+        '''
+        self.lock.acquire()
+        try:
+            if self.remaining is None or self.remaining > self.reserve:
+                return False
+            self.remaining = 0
+            if not self.reset or self.reset < time.time():
+                self.reset = time.time() + 60
+        finally:
+            self.lock.release()
+        return True
+
+
+class HookReconciler(object):
+    '''
+    Brings the web hooks of many repositories in line with a list of
+    desired hooks. Hook lists are fetched with conditional requests
+    against an on disk cache of ETags, so repositories that did not
+    change cost a 304 which does not count against the rate limit.
+    '''
+
+    def __init__(self, module, user, oauthkey, cache_path, limiter):
+        self.module = module
+        self.headers = _auth_headers(user, oauthkey)
+        self.cache_path = cache_path
+        self.cache = self._load_cache()
+        self.cache_lock = threading.Lock()
+        self.limiter = limiter
+        self.not_modified = 0
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            f = open(self.cache_path)
+            try:
+                cache = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return {}
+        if not isinstance(cache, dict):
+            return {}
+        return cache
+
+    def save_cache(self):
+        if not self.cache_path:
+            return
+        cache_dir = os.path.dirname(self.cache_path)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, 0700)
+            filed, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.github')
+            fileh = os.fdopen(filed, 'w')
+            json.dump(self.cache, fileh)
+            fileh.close()
+            os.rename(tmp_path, self.cache_path)
+        except (IOError, OSError):
+            # the cache is only an optimization
+            pass
+
+    def request(self, url, data=None, method=None, etag=None):
+        headers = dict(self.headers)
+        if etag:
+            headers['If-None-Match'] = etag
+        for attempt in range(3):
+            self.limiter.wait()
+            response, info = fetch_url(self.module, url, data=data, headers=headers, method=method)
+            self.limiter.update(info)
+            if info['status'] != 403 or not self.limiter.exhausted():
+                break
+        return response, info
+
+    def list_hooks(self, repo):
+        '''Returns all hooks of the repository, following pagination'''
+        url = "%s/hooks?per_page=100" % repo
+        hooks = []
+        cached_all = True
+        while url:
+            self.cache_lock.acquire()
+            cached = self.cache.get(url)
+            self.cache_lock.release()
+
+            response, info = self.request(url, etag=cached and cached['etag'])
+            if info['status'] == 304 and cached:
+                page, url = cached['hooks'], cached['next']
+            elif info['status'] == 200:
+                cached_all = False
+                page = json.loads(response.read())
+                next_url = _next_link(info)
+                if info.get('etag'):
+                    self.cache_lock.acquire()
+                    self.cache[url] = dict(etag=info['etag'], hooks=page, next=next_url)
+                    self.cache_lock.release()
+                url = next_url
+            else:
+                raise Exception("failed to list the hooks of %s: %s" % (repo, info['msg']))
+            hooks.extend(page)
+        if cached_all:
+            self.not_modified += 1
+        return hooks
+
+    def plan(self, hooks, desired, purge):
+        '''Returns the (method, hook id, body, url) changes for one repository'''
+        changes = []
+        by_url = {}
+        for hook in hooks:
+            if hook.get('name') == 'web':
+                by_url.setdefault(hook.get('config', {}).get('url'), []).append(hook)
+
+        for want in desired:
+            body = {
+                'name': 'web',
+                'active': want['active'],
+                'events': want['events'],
+                'config': {'url': want['url'], 'content_type': want['content_type']},
+            }
+            if want.get('secret'):
+                body['config']['secret'] = want['secret']
+            existing = by_url.pop(want['url'], [])
+            if not existing:
+                changes.append(('POST', None, body, want['url']))
+                continue
+            hook = existing.pop(0)
+            config = hook.get('config', {})
+            if hook.get('active') != want['active'] \
+                    or sorted(hook.get('events', [])) != sorted(want['events']) \
+                    or config.get('content_type') != want['content_type']:
+                changes.append(('PATCH', hook['id'], body, want['url']))
+            # duplicates of a desired hook are always removed
+            for hook in existing:
+                changes.append(('DELETE', hook['id'], None, want['url']))
+
+        if purge:
+            for url, hooks in by_url.items():
+                for hook in hooks:
+                    changes.append(('DELETE', hook['id'], None, url))
+        return changes
+
+    def apply(self, repo, changes):
+        for method, hook_id, body, hook_url in changes:
+            url = "%s/hooks" % repo
+            if hook_id is not None:
+                url = "%s/%s" % (url, hook_id)
+            data = None
+            if body is not None:
+                data = json.dumps(body)
+            response, info = self.request(url, data=data, method=method)
+            # POST answers 201 Created, DELETE 204 No Content
+            if not 200 <= info['status'] < 300:
+                raise Exception("failed to %s hook on %s: %s" % (method, repo, info['msg']))
+
+    def run(self, repos, desired, purge, workers):
+        '''Reconciles all repositories on a pool of workers'''
+        queue = Queue.Queue()
+        for repo in repos:
+            queue.put(repo)
+        results = {}
+        errors = []
+
+        def worker():
+            while not errors:
+                try:
+                    repo = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    changes = self.plan(self.list_hooks(repo), desired, purge)
+                    if changes and not self.module.check_mode:
+                        self.apply(repo, changes)
+                except Exception, e:
+                    errors.append(str(e))
+                    return
+                if changes:
+                    results[repo] = [dict(action=method, id=hook_id, url=hook_url)
+                                     for method, hook_id, body, hook_url in changes]
+
+        threads = []
+        for i in range(min(workers, queue.qsize())):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        self.save_cache()
+        if errors:
+            self.module.fail_json(msg=errors[0], changes=results)
+        return results
+
+
+def _reconcile(module, oauthkey, user, content_type):
+    desired = []
+    for hook in module.params['hooks'] or []:
+        if not isinstance(hook, dict):
+            hook = {'url': hook}
+        if not hook.get('url'):
+            module.fail_json(msg="hooks entries need an url: %s" % hook)
+        events = hook.get('events', ['push'])
+        if not isinstance(events, list):
+            events = [events]
+        desired.append(dict(url=hook['url'],
+                            content_type=hook.get('content_type', content_type),
+                            events=events,
+                            active=module.boolean(hook.get('active', True)),
+                            secret=hook.get('secret')))
+
+    cache_path = module.params['cache_path']
+    if cache_path:
+        cache_path = os.path.expanduser(cache_path)
+    workers = module.params['workers']
+    limiter = RateLimiter(workers, module.params['rate_limit_wait'])
+    reconciler = HookReconciler(module, user, oauthkey, cache_path, limiter)
+    changes = reconciler.run(module.params['repos'], desired, module.params['purge'], workers)
+    module.exit_json(changed=bool(changes), changes=changes, not_modified=reconciler.not_modified)
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
-        action=dict(required=True),
+        action=dict(required=True, choices=['list', 'clean504', 'cleanall', 'create', 'reconcile']),
         hookurl=dict(required=False),
         oauthkey=dict(required=True),
-        repo=dict(required=True),
+        repo=dict(required=False),
         user=dict(required=True),
         validate_certs=dict(default='yes', type='bool'),
         content_type=dict(default='json', choices=['json', 'form']),
-        )
+        repos=dict(required=False, type='list'),
+        hooks=dict(required=False, type='list'),
+        purge=dict(default='no', type='bool'),
+        workers=dict(default=4, type='int'),
+        cache_path=dict(default='~/.ansible/cache/github_hooks.json'),
+        rate_limit_wait=dict(default=900, type='int'),
+        ),
+        supports_check_mode=True
     )
 
     action = module.params['action']
@@ -161,6 +499,17 @@ def main():
     user = module.params['user']
     content_type = module.params['content_type']
 
+    if action == "reconcile":
+        if not module.params['repos']:
+            module.fail_json(msg="repos is required with action=reconcile")
+        _reconcile(module, oauthkey, user, content_type)
+
+    if module.check_mode:
+        module.exit_json(skipped=True, msg="check mode is only supported with action=reconcile")
+
+    if repo is None:
+        module.fail_json(msg="repo is required with action=%s" % action)
+
     if action == "list":
         (rc, out) = _list(module, hookurl, oauthkey, repo, user)
 
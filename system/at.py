@@ -32,6 +32,13 @@ options:
      - A command to be executed in the future.
     required: false
     default: null
+  commands:
+    description:
+     - A list of commands, each scheduled as its own job. All of them are matched against
+       the queue in a single pass.
+    required: false
+    default: null
+    version_added: "2.0"
   script_file:
     description:
      - An existing script file to be executed in the future.
@@ -54,9 +61,18 @@ options:
     default: "present"
   unique:
     description:
-     - If a matching job is present a new job will not be added.
+     - If a matching job is present a new job will not be added. A job matches when its
+       script is the same as the command or script file.
     required: false
     default: false
+  index_cache:
+    description:
+     - Path of the file caching the index of queued jobs. When the at spool directory is
+       readable, jobs are read from it directly, and only jobs added since the spool
+       directory last changed are read again. Set to an empty string to disable the cache.
+    required: false
+    default: "~/.ansible/cache/at_jobs.json"
+    version_added: "2.0"
 requirements:
  - at
 author: '"Richard Isaacson (@risaacson)" <richard.c.isaacson@gmail.com>'
@@ -71,56 +87,206 @@ EXAMPLES = '''
 
 # Schedule a command to execute in 20 minutes making sure it is unique in the queue.
 - at: command="ls -d / > /dev/null" unique=true count=20 units="minutes"
+
+# Schedule several commands in one task, skipping those already queued.
+- at:
+    commands:
+      - /usr/local/bin/rotate-logs
+      - /usr/local/bin/purge-cache
+    unique: true
+    count: 1
+    units: hours
 '''
 
 import os
+import re
 import tempfile
+try:
+    import json
+except ImportError:
+    import simplejson as json
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import sha as sha1
+
+# Spool directories used by the various at implementations, first match wins.
+AT_SPOOL_DIRS = [ '/var/spool/cron/atjobs', '/var/spool/at', '/var/at/jobs', '/usr/lib/cron/jobs' ]
+# queue (or '=' while running), job number and execution time, all in hex
+AT_JOB_FILE_RE = re.compile(r'^[a-zA-Z=]([0-9a-f]{5})[0-9a-f]{8}$')
+AT_HEREDOC_RE = re.compile(r"^\$\{SHELL:-/bin/sh\} << '?(\w+)'?\n", re.M)
+AT_PREAMBLE_END_RE = re.compile(r"Execution directory inaccessible.*\n\s*exit 1\n}\n")
+
+
+def job_script(body):
+    """ Returns the script part of an at job, or None if it cannot be told apart from the preamble. """
+    m = AT_HEREDOC_RE.search(body)
+    if m:
+        end = body.find('\n%s\n' % m.group(1), m.end() - 1)
+        if end != -1:
+            return body[m.end():end + 1]
+    m = AT_PREAMBLE_END_RE.search(body)
+    if m:
+        return body[m.end():]
+    return None
+
+
+def script_hash(text):
+    return sha1(text.strip()).hexdigest()
+
+
+def find_spool_dir():
+    for path in AT_SPOOL_DIRS:
+        if os.path.isdir(path) and os.access(path, os.R_OK | os.X_OK):
+            return path
+    return None
+
+
+class AtJobIndex(object):
+    """
+    Index of queued jobs keyed by the hash of their script.
+
+    When the spool directory is readable the job files are read directly and
+    the index is cached on disk, keyed by the spool mtime, so that only jobs
+    that were added since the last run are read. Otherwise jobs are listed
+    with atq and dumped once each with 'at -c'.
+    """
+
+    def __init__(self, module, at_cmd, spool, cache_path):
+        self.module = module
+        self.at_cmd = at_cmd
+        self.spool = spool
+        self.cache_path = cache_path
+        # job file (or job number with atq) -> dict(id, mtime, hash)
+        self.jobs = {}
+        self.bodies = {}
+        self.dirty = False
+        if spool:
+            self._load_spool()
+        else:
+            self._load_atq()
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        try:
+            f = open(self.cache_path)
+            try:
+                cache = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return None
+        if not isinstance(cache, dict) or cache.get('spool') != self.spool:
+            return None
+        return cache
+
+    def _load_spool(self):
+        cache = self._load_cache()
+        spool_mtime = os.stat(self.spool).st_mtime
+        if cache and cache.get('mtime') == spool_mtime:
+            self.jobs = cache['jobs']
+            return
+        cached_jobs = {}
+        if cache:
+            cached_jobs = cache.get('jobs', {})
+        for name in os.listdir(self.spool):
+            m = AT_JOB_FILE_RE.match(name)
+            if not m:
+                continue
+            path = os.path.join(self.spool, name)
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                # job finished while we were looking
+                continue
+            entry = cached_jobs.get(name)
+            if entry is None or entry['mtime'] != mtime:
+                body = self._read_file(path)
+                if body is None:
+                    continue
+                entry = self._entry(str(int(m.group(1), 16)), mtime, body)
+                self.bodies[name] = body
+            self.jobs[name] = entry
+        self.mtime = spool_mtime
+        self.dirty = True
+
+    def _load_atq(self):
+        atq_cmd = self.module.get_bin_path('atq', True)
+        rc, out, err = self.module.run_command(atq_cmd, check_rc=True)
+        for line in out.splitlines():
+            fields = line.split()
+            if not fields:
+                continue
+            job_id = fields[0]
+            rc, body, err = self.module.run_command("%s -c %s" % (self.at_cmd, job_id), check_rc=True)
+            self.jobs[job_id] = self._entry(job_id, None, body)
+            self.bodies[job_id] = body
+
+    def _read_file(self, path):
+        try:
+            f = open(path)
+            try:
+                return f.read()
+            finally:
+                f.close()
+        except IOError:
+            return None
+
+    def _entry(self, job_id, mtime, body):
+        script = job_script(body)
+        if script is None:
+            return dict(id=job_id, mtime=mtime, hash=None)
+        return dict(id=job_id, mtime=mtime, hash=script_hash(script))
+
+    def _body(self, name):
+        if name not in self.bodies:
+            self.bodies[name] = self._read_file(os.path.join(self.spool, name)) or ''
+        return self.bodies[name]
+
+    def match(self, text):
+        """ Returns the job numbers of all jobs running the script text. """
+        wanted = script_hash(text)
+        matching_jobs = []
+        for name, entry in self.jobs.items():
+            if entry['hash'] == wanted:
+                matching_jobs.append(entry['id'])
+            elif entry['hash'] is None and text.strip() in self._body(name):
+                # unknown job layout, fall back to looking for the text anywhere
+                matching_jobs.append(entry['id'])
+        matching_jobs.sort(key=int)
+        return matching_jobs
 
-
-def add_job(module, result, at_cmd, count, units, command, script_file):
+    def save(self):
+        if not self.spool or not self.cache_path or not self.dirty:
+            return
+        cache = dict(spool=self.spool, mtime=self.mtime, jobs=self.jobs)
+        cache_dir = os.path.dirname(self.cache_path)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir, 0700)
+            filed, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.at')
+            fileh = os.fdopen(filed, 'w')
+            json.dump(cache, fileh)
+            fileh.close()
+            os.rename(tmp_path, self.cache_path)
+        except (IOError, OSError):
+            # the cache is only an optimization
+            pass
+
+
+def add_job(module, result, at_cmd, count, units, script_file):
     at_command = "%s -f %s now + %s %s" % (at_cmd, script_file, count, units)
     rc, out, err = module.run_command(at_command, check_rc=True)
-    if command:
-        os.unlink(script_file)
     result['changed'] = True
 
 
-def delete_job(module, result, at_cmd, command, script_file):
-    for matching_job in get_matching_jobs(module, at_cmd, script_file):
-        at_command = "%s -d %s" % (at_cmd, matching_job)
-        rc, out, err = module.run_command(at_command, check_rc=True)
-        result['changed'] = True
-    if command:
-        os.unlink(script_file)
-    module.exit_json(**result)
-
-
-def get_matching_jobs(module, at_cmd, script_file):
-    matching_jobs = []
-
-    atq_cmd = module.get_bin_path('atq', True)
-
-    # Get list of job numbers for the user.
-    atq_command = "%s" % atq_cmd
-    rc, out, err = module.run_command(atq_command, check_rc=True)
-    current_jobs = out.splitlines()
-    if len(current_jobs) == 0:
-        return matching_jobs
-
-    # Read script_file into a string.
-    script_file_string = open(script_file).read().strip()
-
-    # Loop through the jobs.
-    #   If the script text is contained in a job add job number to list.
-    for current_job in current_jobs:
-        split_current_job = current_job.split()
-        at_command = "%s -c %s" % (at_cmd, split_current_job[0])
-        rc, out, err = module.run_command(at_command, check_rc=True)
-        if script_file_string in out:
-            matching_jobs.append(split_current_job[0])
-
-    # Return the list.
-    return matching_jobs
+def delete_jobs(module, result, at_cmd, jobs):
+    if not jobs:
+        return
+    at_command = "%s -d %s" % (at_cmd, ' '.join(jobs))
+    rc, out, err = module.run_command(at_command, check_rc=True)
+    result['changed'] = True
 
 
 def create_tempfile(command):
@@ -137,6 +303,8 @@ def main():
         argument_spec = dict(
             command=dict(required=False,
                          type='str'),
+            commands=dict(required=False,
+                          type='list'),
             script_file=dict(required=False,
                              type='str'),
             count=dict(required=False,
@@ -151,47 +319,81 @@ def main():
                        type='str'),
             unique=dict(required=False,
                         default=False,
-                        type='bool')
+                        type='bool'),
+            index_cache=dict(required=False,
+                             default='~/.ansible/cache/at_jobs.json',
+                             type='str')
         ),
-        mutually_exclusive=[['command', 'script_file']],
-        required_one_of=[['command', 'script_file']],
+        mutually_exclusive=[['command', 'commands', 'script_file']],
+        required_one_of=[['command', 'commands', 'script_file']],
         supports_check_mode=False
     )
 
     at_cmd = module.get_bin_path('at', True)
 
     command        = module.params['command']
+    commands       = module.params['commands']
     script_file    = module.params['script_file']
     count          = module.params['count']
     units          = module.params['units']
     state          = module.params['state']
     unique         = module.params['unique']
+    index_cache    = module.params['index_cache']
 
     if (state == 'present') and (not count or not units):
         module.fail_json(msg="present state requires count and units")
 
-    result = {'state': state, 'changed': False}
-
-    # If command transform it into a script_file
-    if command:
-        script_file = create_tempfile(command)
+    if index_cache:
+        index_cache = os.path.expanduser(index_cache)
 
-    # if absent remove existing and return
-    if state == 'absent':
-        delete_job(module, result, at_cmd, command, script_file)
+    result = {'state': state, 'changed': False}
 
-    # if unique if existing return unchanged
-    if unique:
-        if len(get_matching_jobs(module, at_cmd, script_file)) != 0:
-            if command:
-                os.unlink(script_file)
-            module.exit_json(**result)
+    # (script text, existing script file) pairs, commands get a temp file when added
+    if script_file:
+        try:
+            scripts = [ (open(script_file).read(), script_file) ]
+        except IOError, e:
+            module.fail_json(msg="Unable to read %s: %s" % (script_file, str(e)))
+    elif commands:
+        scripts = [ (c, None) for c in commands ]
+    else:
+        scripts = [ (command, None) ]
 
-    result['script_file'] = script_file
-    result['count'] = count
-    result['units'] = units
+    index = AtJobIndex(module, at_cmd, find_spool_dir(), index_cache)
 
-    add_job(module, result, at_cmd, count, units, command, script_file)
+    # if absent remove all existing jobs at once and return
+    if state == 'absent':
+        matching_jobs = []
+        for text, path in scripts:
+            for job in index.match(text):
+                if job not in matching_jobs:
+                    matching_jobs.append(job)
+        delete_jobs(module, result, at_cmd, matching_jobs)
+        index.save()
+        module.exit_json(**result)
+
+    added = []
+    for text, path in scripts:
+        # if unique if existing (or just added) skip it
+        if unique and (index.match(text) or script_hash(text) in added):
+            continue
+        if path:
+            add_job(module, result, at_cmd, count, units, path)
+        else:
+            path = create_tempfile(text)
+            try:
+                add_job(module, result, at_cmd, count, units, path)
+            finally:
+                os.unlink(path)
+        added.append(script_hash(text))
+
+    index.save()
+
+    if result['changed']:
+        if script_file:
+            result['script_file'] = script_file
+        result['count'] = count
+        result['units'] = units
 
     module.exit_json(**result)
 
@@ -30,8 +30,31 @@ options:
     path:
         description:
             - Specifies the path to the file to be managed.
-        required: true
+            - Required unless I(paths) is given.
+        required: false
+        default: null
+    paths:
+        description:
+            - A list of files, directories or shell globs to manage together. Current
+              capabilities are read with one getcap call per batch of files and only files
+              whose capabilities differ are changed, with batched setcap calls.
+            - Mutually exclusive with I(path).
+        required: false
         default: null
+        version_added: "2.0"
+    recurse:
+        description:
+            - With I(paths), manage all files found under the given directories.
+        required: false
+        choices: [ "yes", "no" ]
+        default: "no"
+        version_added: "2.0"
+    workers:
+        description:
+            - With I(paths), the number of setcap batches run in parallel.
+        required: false
+        default: 4
+        version_added: "2.0"
     capability:
         description:
             - Desired capability to set (with operator and flags, if state is C(present)) or remove (if state is C(absent))
@@ -59,6 +82,14 @@ EXAMPLES = '''
 
 # Remove cap_net_bind_service from /bar
 - capabilities: path=/bar capability=cap_net_bind_service state=absent
+
+# Set cap_net_raw+ep on every file under /opt/tools/bin and a few others
+- capabilities:
+    paths:
+      - /opt/tools/bin
+      - /usr/local/sbin/probe-*
+    recurse: yes
+    capability: cap_net_raw+ep
 '''
 
 
@@ -69,6 +100,12 @@ OPS = ( '=', '-', '+' )
 import os
 import tempfile
 import re
+import glob
+import threading
+import Queue
+
+# files per getcap/setcap invocation in bulk mode
+BATCH_SIZE = 100
 
 class CapabilitiesModule(object):
 
@@ -77,14 +114,21 @@ class CapabilitiesModule(object):
 
     def __init__(self, module):
         self.module         = module 
-        self.path           = module.params['path'].strip()
+        self.path           = module.params['path']
+        self.paths          = module.params['paths']
+        self.recurse        = module.params['recurse']
+        self.workers        = max(1, module.params['workers'])
         self.capability     = module.params['capability'].strip().lower()
         self.state          = module.params['state']
         self.getcap_cmd     = module.get_bin_path('getcap', required=True)
         self.setcap_cmd     = module.get_bin_path('setcap', required=True)
         self.capability_tup = self._parse_cap(self.capability, op_required=self.state=='present')
 
-        self.run()
+        if self.paths:
+            self.run_bulk()
+        else:
+            self.path = self.path.strip()
+            self.run()
 
     def run(self):
 
@@ -111,17 +155,131 @@ class CapabilitiesModule(object):
                 self.module.exit_json(changed=True, state=self.state, msg='capabilities changed', stdout=self.setcap(self.path, current))
         self.module.exit_json(changed=False, state=self.state)
 
+    def run_bulk(self):
+
+        paths = self._expand_paths(self.paths, self.recurse)
+        if not paths:
+            self.module.fail_json(msg="No files matched %s" % ', '.join(self.paths))
+
+        current_caps = self.getcaps(paths)
+        changes = []
+
+        for path in paths:
+            current = current_caps[path]
+            caps = [ cap[0] for cap in current ]
+            if self.state == 'present' and self.capability_tup not in current:
+                current = filter(lambda x: x[0] != self.capability_tup[0], current)
+                current.append( self.capability_tup )
+                changes.append( (path, current) )
+            elif self.state == 'absent' and self.capability_tup[0] in caps:
+                current = filter(lambda x: x[0] != self.capability_tup[0], current)
+                changes.append( (path, current) )
+
+        changed_paths = [ change[0] for change in changes ]
+        if not changes:
+            self.module.exit_json(changed=False, state=self.state, changed_paths=changed_paths)
+        if not self.module.check_mode:
+            self.setcaps(changes)
+        self.module.exit_json(changed=True, state=self.state, msg='capabilities changed', changed_paths=changed_paths)
+
+    def _expand_paths(self, patterns, recurse):
+        rval = []
+        seen = set()
+        for pattern in patterns:
+            pattern = os.path.expanduser(pattern.strip())
+            matches = glob.glob(pattern)
+            if not matches and not glob.has_magic(pattern):
+                # let getcap report missing files
+                matches = [ pattern ]
+            for match in sorted(matches):
+                if recurse and os.path.isdir(match):
+                    files = []
+                    for root, dirs, filenames in os.walk(match):
+                        for filename in filenames:
+                            filepath = os.path.join(root, filename)
+                            if not os.path.islink(filepath):
+                                files.append(filepath)
+                    files.sort()
+                else:
+                    files = [ match ]
+                for filepath in files:
+                    if filepath not in seen:
+                        seen.add(filepath)
+                        rval.append(filepath)
+        return rval
+
+    def getcaps(self, paths):
+        """ reads the capabilities of all paths with as few getcap calls as possible """
+        rval = {}
+        for i in range(0, len(paths), BATCH_SIZE):
+            batch = paths[i:i + BATCH_SIZE]
+            cmd = [ self.getcap_cmd, '-v' ]
+            cmd.extend(batch)
+            rc, stdout, stderr = self.module.run_command(cmd)
+            if rc != 0:
+                self.module.fail_json(msg="Unable to get capabilities of %s" % ', '.join(batch), stdout=stdout.strip(), stderr=stderr)
+            lines = {}
+            for line in stdout.splitlines():
+                lines[line.split(' =')[0].strip()] = line
+            for path in batch:
+                if path not in lines:
+                    self.module.fail_json(msg="Unable to get capabilities of %s" % path, stdout=stdout.strip(), stderr=stderr)
+                rval[path] = self._parse_getcap(path, lines[path], stderr)
+        return rval
+
+    def setcaps(self, changes):
+        """ applies (path, caps) changes with batched setcap calls spread over a pool of workers """
+        batches = Queue.Queue()
+        for i in range(0, len(changes), BATCH_SIZE):
+            batches.put(changes[i:i + BATCH_SIZE])
+        errors = []
+
+        def worker():
+            while True:
+                try:
+                    batch = batches.get_nowait()
+                except Queue.Empty:
+                    return
+                cmd = [ self.setcap_cmd ]
+                for path, caps in batch:
+                    if caps:
+                        cmd.append(' '.join([ ''.join(cap) for cap in caps ]))
+                    else:
+                        cmd.append('-r')
+                    cmd.append(path)
+                rc, stdout, stderr = self.module.run_command(cmd)
+                if rc != 0:
+                    errors.append((batch, stdout, stderr))
+
+        threads = []
+        for i in range(min(self.workers, batches.qsize())):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            batch, stdout, stderr = errors[0]
+            self.module.fail_json(msg="Unable to set capabilities of %s" % ', '.join([ change[0] for change in batch ]), stdout=stdout, stderr=stderr)
+
     def getcap(self, path):
         rval = []
         cmd = "%s -v %s" % (self.getcap_cmd, path)
         rc, stdout, stderr = self.module.run_command(cmd)    
+        if rc != 0:
+            self.module.fail_json(msg="Unable to get capabilities of %s" % path, stdout=stdout.strip(), stderr=stderr)
+        return self._parse_getcap(path, stdout, stderr)
+
+    def _parse_getcap(self, path, stdout, stderr):
+        rval = []
         # If file xattrs are set but no caps are set the output will be:
         #   '/foo ='
         # If file xattrs are unset the output will be:
         #   '/foo'
         # If the file does not eixst the output will be (with rc == 0...):
         #   '/foo (No such file or directory)'
-        if rc != 0 or (stdout.strip() != path and stdout.count(' =') != 1):
+        if stdout.strip() != path and stdout.count(' =') != 1:
             self.module.fail_json(msg="Unable to get capabilities of %s" % path, stdout=stdout.strip(), stderr=stderr)
         if stdout.strip() != path:
             caps = stdout.split(' =')[1].strip().split()
@@ -171,10 +329,15 @@ def main():
     # defining module
     module = AnsibleModule(
         argument_spec = dict(
-            path = dict(aliases=['key'], required=True),
+            path = dict(aliases=['key'], required=False),
+            paths = dict(required=False, type='list'),
+            recurse = dict(default=False, type='bool'),
+            workers = dict(default=4, type='int'),
             capability = dict(aliases=['cap'], required=True),
             state = dict(default='present', choices=['present', 'absent']),
         ),
+        required_one_of = [ [ 'path', 'paths' ] ],
+        mutually_exclusive = [ [ 'path', 'paths' ] ],
         supports_check_mode=True
     )
 
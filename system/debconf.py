@@ -30,7 +30,7 @@ description:
        existing selections.
 version_added: "1.6"
 notes:
-    - This module requires the command line debconf tools.
+    - This module requires the command line debconf tools, debconf-set-selections from I(debconf) and debconf-get-selections from I(debconf-utils).
     - A number of questions have to be answered (depending on the package).
       Use 'debconf-show <package>' on any Debian or derivative with the package
       installed to see questions/settings available.
@@ -40,7 +40,8 @@ options:
   name:
     description:
       - Name of package to configure.
-    required: true
+      - Required unless I(selections) is given.
+    required: false
     default: null
     aliases: ['pkg']
   question:
@@ -68,6 +69,16 @@ options:
     required: false
     default: False
     aliases: []
+  selections:
+    description:
+      - A hash of package names to hashes of question -> answer, where each answer is
+        either a C([vtype, value]) list or a hash with C(vtype) and C(value) keys.
+      - All current values are read with a single debconf-get-selections call and every
+        changed answer is written with a single debconf-set-selections call.
+      - Mutually exclusive with I(name).
+    required: false
+    default: null
+    version_added: "2.0"
 author: "Brian Coca (@bcoca)"
 
 '''
@@ -84,8 +95,20 @@ debconf: name='oracle-java7-installer' question='shared/accepted-oracle-license-
 
 # Specifying package you can register/return the list of questions and current values
 debconf: name='tzdata'
+
+# Preseed several packages at once
+debconf:
+  selections:
+    locales:
+      locales/default_environment_locale: [select, en_US.UTF-8]
+      locales/locales_to_be_generated: [multiselect, 'en_US.UTF-8 UTF-8']
+    tzdata:
+      tzdata/Areas: { vtype: select, value: Europe }
+      tzdata/Zones/Europe: { vtype: select, value: Paris }
 '''
 
+VTYPES = ['string', 'password', 'boolean', 'select',  'multiselect', 'note', 'error', 'title', 'text']
+
 def get_selections(module, pkg):
     cmd = [module.get_bin_path('debconf-show', True), pkg]
     rc, out, err = module.run_command(' '.join(cmd))
@@ -102,6 +125,74 @@ def get_selections(module, pkg):
     return selections
 
 
+def get_all_selections(module):
+    """ returns every question in the debconf database, as question -> (owner, vtype, value) """
+    cmd = [module.get_bin_path('debconf-get-selections', True)]
+    rc, out, err = module.run_command(cmd)
+
+    if rc != 0:
+        module.fail_json(msg=err)
+
+    selections = {}
+
+    for line in out.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        fields = line.split('\t', 3)
+        if len(fields) < 3:
+            continue
+        fields.extend([''] * (4 - len(fields)))
+        (owner, question, vtype, value) = fields
+        selections[question] = (owner, vtype, value.strip())
+
+    return selections
+
+
+def normalize_value(vtype, value):
+    if value is None:
+        return ''
+    if vtype == 'boolean':
+        return str(value).lower()
+    if vtype == 'multiselect' and isinstance(value, list):
+        return ', '.join([str(v) for v in value])
+    return str(value)
+
+
+def parse_desired(module, selections):
+    """ flattens the package -> question -> (vtype, value) hash into a list of tuples """
+    desired = []
+    for pkg in sorted(selections.keys()):
+        questions = selections[pkg]
+        if not isinstance(questions, dict):
+            module.fail_json(msg="selections for %s must be a hash of question -> vtype/value" % pkg)
+        for question in sorted(questions.keys()):
+            answer = questions[question]
+            if isinstance(answer, dict):
+                vtype = answer.get('vtype')
+                value = answer.get('value')
+            elif isinstance(answer, (list, tuple)) and len(answer) == 2:
+                (vtype, value) = answer
+            else:
+                module.fail_json(msg="%s %s must be a [vtype, value] list or a hash with vtype and value" % (pkg, question))
+            if vtype not in VTYPES:
+                module.fail_json(msg="%s %s has an invalid vtype %s, use one of %s" % (pkg, question, vtype, ', '.join(VTYPES)))
+            desired.append((pkg, question, vtype, normalize_value(vtype, value)))
+    return desired
+
+
+def set_selections(module, lines, unseen):
+    """ feeds all (pkg, question, vtype, value) lines to a single debconf-set-selections """
+
+    setsel = module.get_bin_path('debconf-set-selections', True)
+    cmd = [setsel]
+    if unseen:
+        cmd.append('-u')
+
+    data = '\n'.join([' '.join(line) for line in lines]) + '\n'
+
+    return module.run_command(cmd, data=data)
+
+
 def set_selection(module, pkg, question, vtype, value, unseen):
 
     setsel = module.get_bin_path('debconf-set-selections', True)
@@ -113,21 +204,52 @@ def set_selection(module, pkg, question, vtype, value, unseen):
 
     return module.run_command(cmd, data=data)
 
+def preseed(module, selections, unseen):
+    desired = parse_desired(module, selections)
+    prev = get_all_selections(module)
+
+    changes = []
+    curr = {}
+    previous = {}
+    for (pkg, question, vtype, value) in desired:
+        if question in prev and prev[question][2] == value:
+            continue
+        changes.append((pkg, question, vtype, value))
+        curr.setdefault(pkg, {})[question] = value
+        if question in prev:
+            previous.setdefault(pkg, {})[question] = prev[question][2]
+        else:
+            previous.setdefault(pkg, {})[question] = ''
+
+    msg = ""
+    if changes and not module.check_mode:
+        rc, msg, e = set_selections(module, changes, unseen)
+        if rc:
+            module.fail_json(msg=e)
+
+    module.exit_json(changed=len(changes) > 0, msg=msg, current=curr, previous=previous)
+
+
 def main():
 
     module = AnsibleModule(
         argument_spec = dict(
-           name = dict(required=True, aliases=['pkg'], type='str'),
+           name = dict(required=False, aliases=['pkg'], type='str'),
            question = dict(required=False, aliases=['setting', 'selection'], type='str'),
-           vtype = dict(required=False, type='str', choices=['string', 'password', 'boolean', 'select',  'multiselect', 'note', 'error', 'title', 'text']),
+           vtype = dict(required=False, type='str', choices=VTYPES),
            value= dict(required=False, type='str'),
            unseen = dict(required=False, type='bool'),
+           selections = dict(required=False, type='dict'),
         ),
         required_together = ( ['question','vtype', 'value'],),
+        required_one_of = ( ['name', 'selections'],),
+        mutually_exclusive = ( ['name', 'selections'],),
         supports_check_mode=True,
     )
 
-    #TODO: enable passing array of options and/or debconf file from get-selections dump
+    if module.params["selections"]:
+        preseed(module, module.params["selections"], module.params["unseen"])
+
     pkg      = module.params["name"]
     question = module.params["question"]
     vtype    = module.params["vtype"]
@@ -40,6 +40,14 @@ options:
         description:
             - key from which to return values from the specified database, otherwise the
               full contents are returned.
+    keys:
+        required: False
+        default: null
+        version_added: "2.0"
+        description:
+            - list of keys to look up in a single call, mutually exclusive with I(key).
+              C(passwd) and C(group) keys are resolved in-process through the system's NSS
+              bindings, other databases with a single getent invocation.
     split:
         required: False
         default: None
@@ -50,6 +58,14 @@ options:
         default: True
         description:
             - If a supplied key is missing this will make the task fail if True
+    structured:
+        required: False
+        default: False
+        version_added: "2.0"
+        description:
+            - Return each record as a hash of named, typed fields (for example C(uid), C(gid) and
+              C(members) as a list) instead of a list of strings. Databases without a known
+              layout are still returned as lists.
 
 notes:
    - "Not all databases support enumeration, check system documentation for details"
@@ -74,20 +90,123 @@ EXAMPLES = '''
 - getent: database=services key=http fail_key=False
 - debug: var=getent_services
 
+# get several users at once, with typed fields
+- getent: database=passwd keys=root,www-data,nobody structured=yes
+- debug: msg="{{ getent_passwd['www-data'].uid }}"
+
 # get user password hash (requires sudo/root)
 - getent: database=shadow key=www-data split=:
 - debug: var=getent_shadow
 
 '''
 
+import pwd
+import grp
+
+# databases that can be resolved in-process through the NSS bindings
+NSS_LOOKUPS = {
+    'passwd': (pwd.getpwnam, pwd.getpwuid),
+    'group': (grp.getgrnam, grp.getgrgid),
+}
+
+# field names for structured records, the key (first field) is left out
+RECORD_FIELDS = {
+    'passwd': [ 'password', 'uid', 'gid', 'gecos', 'home', 'shell' ],
+    'group': [ 'password', 'gid', 'members' ],
+    'shadow': [ 'password', 'lastchg', 'min', 'max', 'warn', 'inactive', 'expire', 'flag' ],
+    'gshadow': [ 'password', 'admins', 'members' ],
+}
+INT_FIELDS = [ 'uid', 'gid', 'lastchg', 'min', 'max', 'warn', 'inactive', 'expire' ]
+LIST_FIELDS = [ 'members', 'admins' ]
+
+
+def nss_record(database, entry):
+    """ returns a passwd/group struct as getent would print it, split into fields """
+    if database == 'passwd':
+        return [ entry.pw_name, entry.pw_passwd, str(entry.pw_uid), str(entry.pw_gid),
+                 entry.pw_gecos, entry.pw_dir, entry.pw_shell ]
+    return [ entry.gr_name, entry.gr_passwd, str(entry.gr_gid), ','.join(entry.gr_mem) ]
+
+
+def nss_lookup(database, keys):
+    """ resolve all keys in-process, returns (records, missing keys) """
+    by_name, by_id = NSS_LOOKUPS[database]
+    records = []
+    missing = []
+    for key in keys:
+        try:
+            if key.isdigit():
+                entry = by_id(int(key))
+            else:
+                entry = by_name(key)
+        except KeyError:
+            missing.append(key)
+            continue
+        records.append(nss_record(database, entry))
+    return records, missing
+
+
+def getent_lookup(module, getent_bin, database, keys, split):
+    """ resolve all keys with a single getent call, returns (rc, records, missing keys) """
+    cmd = [ getent_bin, database ]
+    cmd.extend(keys)
+
+    try:
+        rc, out, err = module.run_command(cmd)
+    except Exception, e:
+        module.fail_json(msg=str(e))
+
+    records = []
+    found = set()
+    if rc in (0, 2):
+        for line in out.splitlines():
+            record = line.split(split)
+            records.append(record)
+            # keys may be any field (uid, address, port/proto, alias...)
+            for field in record:
+                found.add(field)
+                found.add(field.split('/')[0])
+    missing = [ key for key in keys if key not in found ]
+    return rc, records, missing
+
+
+def structure_record(database, fields):
+    """ turns the split fields of a record into a dict with typed values """
+    if database in RECORD_FIELDS:
+        record = dict(zip(RECORD_FIELDS[database], fields))
+        for name in INT_FIELDS:
+            if name in record:
+                try:
+                    record[name] = int(record[name])
+                except ValueError:
+                    record[name] = None
+        for name in LIST_FIELDS:
+            if name in record:
+                record[name] = [ m for m in record[name].split(',') if m ]
+        return record
+    if database in ('hosts', 'ahosts', 'ahostsv4', 'ahostsv6'):
+        return { 'names': fields }
+    if database == 'services' and fields:
+        port, proto = (fields[0].split('/', 1) + [ None ])[:2]
+        try:
+            port = int(port)
+        except ValueError:
+            pass
+        return { 'port': port, 'protocol': proto, 'aliases': fields[1:] }
+    return fields
+
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
             database = dict(required=True),
             key      = dict(required=False, default=None),
+            keys     = dict(required=False, default=None, type='list'),
             split    = dict(required=False, default=None),
             fail_key = dict(required=False, type='bool', default=True),
+            structured = dict(required=False, type='bool', default=False),
         ),
+        mutually_exclusive = [ [ 'key', 'keys' ] ],
         supports_check_mode = True,
     )
 
@@ -95,33 +214,45 @@ def main():
 
     database = module.params['database']
     key      = module.params.get('key')
+    keys     = module.params.get('keys')
     split    = module.params.get('split')
     fail_key = module.params.get('fail_key')
+    structured = module.params.get('structured')
 
     getent_bin = module.get_bin_path('getent', True)
 
     if key is not None:
-        cmd = [ getent_bin, database, key ]
-    else:
-        cmd = [ getent_bin, database ]
+        keys = [ key ]
+    elif keys is not None:
+        keys = [ str(k) for k in keys if str(k) != '' ]
 
     if split is None and database in colon:
         split = ':'
 
-    try:
-        rc, out, err = module.run_command(cmd)
-    except Exception, e:
-        module.fail_json(msg=str(e))
-
     msg = "Unexpected failure!"
     dbtree = 'getent_%s' % database
     results = { dbtree: {} }
 
-    if rc == 0:
-        for line in out.splitlines():
-            record = line.split(split)
+    if keys and database in NSS_LOOKUPS and split == ':':
+        rc = 0
+        records, missing = nss_lookup(database, keys)
+        if missing:
+            rc = 2
+    elif keys:
+        rc, records, missing = getent_lookup(module, getent_bin, database, keys, split)
+        if rc == 2 and not missing:
+            # a key matched none of the fields we index, blame them all
+            missing = keys
+    else:
+        rc, records, missing = getent_lookup(module, getent_bin, database, [], split)
+
+    for record in records:
+        if structured:
+            results[dbtree][record[0]] = structure_record(database, record[1:])
+        else:
             results[dbtree][record[0]] = record[1:]
 
+    if rc == 0:
         module.exit_json(ansible_facts=results)
 
     elif rc == 1:
@@ -129,8 +260,10 @@ def main():
     elif rc == 2:
         msg = "One or more supplied key could not be found in the database."
         if not fail_key:
-            results[dbtree][key] = None
-            module.exit_json(ansible_facts=results, msg=msg)
+            for missing_key in missing:
+                results[dbtree][missing_key] = None
+            module.exit_json(ansible_facts=results, msg=msg, missing=missing)
+        msg = "%s Missing keys: %s" % (msg, ', '.join(missing))
     elif rc == 3:
         msg = "Enumeration not supported on this database."
 
@@ -140,4 +273,3 @@ def main():
 from ansible.module_utils.basic import *
 
 main()
-
@@ -135,8 +135,17 @@ import shutil
 import time
 import socket
 
+try:
+    from xml.etree import ElementTree
+    HAS_ELEMENTTREE = True
+except ImportError:
+    HAS_ELEMENTTREE = False
+
 glusterbin = ''
 
+# transport ids reported by 'gluster --xml volume info'
+GLUSTER_TRANSPORTS = { '0': 'tcp', '1': 'rdma', '2': 'tcp,rdma' }
+
 def run_gluster(gargs, **kwargs):
     global glusterbin
     global module
@@ -170,7 +179,7 @@ def run_gluster_yes(gargs):
         module.fail_json(msg='error running gluster (%s) command (rc=%d): %s' % (' '.join(args), rc, out or err))
     return out
 
-def get_peers():
+def get_peers_text():
     out = run_gluster([ 'peer', 'status'])
     i = 0
     peers = {}
@@ -189,7 +198,7 @@ def get_peers():
                 peers[hostname] = [ uuid, state ]
     return peers
 
-def get_volumes():
+def get_volumes_text():
     out = run_gluster([ 'volume', 'info' ])
 
     volumes = {}
@@ -225,6 +234,79 @@ def get_volumes():
                 volume = {}
     return volumes
 
+def run_gluster_xml(gargs):
+    out = run_gluster_nofail(gargs + [ '--xml' ])
+    if not out:
+        return None
+    try:
+        root = ElementTree.fromstring(out)
+    except Exception:
+        return None
+    if root.findtext('opRet', '0') != '0':
+        return None
+    return root
+
+def get_peers_xml():
+    root = run_gluster_xml([ 'peer', 'status' ])
+    if root is None:
+        return None
+    peers = {}
+    for peer in root.findall('peerStatus/peer'):
+        uuid = peer.findtext('uuid')
+        state = peer.findtext('stateStr')
+        # a peer may be known under several names, index all of them
+        names = [ peer.findtext('hostname') ]
+        names.extend([ h.text for h in peer.findall('hostnames/hostname') ])
+        for hostname in names:
+            if hostname:
+                peers[hostname] = [ uuid, state ]
+    return peers
+
+def get_volumes_xml():
+    root = run_gluster_xml([ 'volume', 'info', 'all' ])
+    if root is None:
+        return None
+    volumes = {}
+    for vol in root.findall('volInfo/volumes/volume'):
+        volume = {}
+        volume['name'] = vol.findtext('name')
+        volume['id'] = vol.findtext('id')
+        volume['status'] = vol.findtext('statusStr')
+        transport = vol.findtext('transport')
+        volume['transport'] = GLUSTER_TRANSPORTS.get(transport, transport)
+        volume['bricks'] = []
+        for brick in vol.findall('bricks/brick'):
+            brick_name = brick.findtext('name')
+            if not brick_name:
+                brick_name = (brick.text or '').strip()
+            volume['bricks'].append(brick_name)
+        volume['options'] = {}
+        volume['quota'] = False
+        for option in vol.findall('options/option'):
+            key = option.findtext('name')
+            value = option.findtext('value')
+            volume['options'][key] = value
+            if key == 'features.quota' and value == 'on':
+                volume['quota'] = True
+        volumes[volume['name']] = volume
+    return volumes
+
+def get_peers():
+    peers = None
+    if HAS_ELEMENTTREE:
+        peers = get_peers_xml()
+    if peers is None:
+        peers = get_peers_text()
+    return peers
+
+def get_volumes():
+    volumes = None
+    if HAS_ELEMENTTREE:
+        volumes = get_volumes_xml()
+    if volumes is None:
+        volumes = get_volumes_text()
+    return volumes
+
 def get_quotas(name, nofail):
     quotas = {}
     if nofail:
@@ -239,28 +321,75 @@ def get_quotas(name, nofail):
             quotas[q[0]] = q[1]
     return quotas
 
-def wait_for_peer(host):
-    for x in range(0, 4):
-        peers = get_peers()
-        if host in peers and peers[host][1].lower().find('peer in cluster') != -1:
-            return True
+
+class GlusterState(object):
+    """
+    Snapshot of the cluster (peers, volumes and quotas) read once per run.
+    Each part is fetched lazily and kept until invalidated.
+    """
+
+    def __init__(self):
+        self._peers = None
+        self._volumes = None
+        self._quotas = {}
+
+    def peers(self):
+        if self._peers is None:
+            self._peers = get_peers()
+        return self._peers
+
+    def volumes(self):
+        if self._volumes is None:
+            self._volumes = get_volumes()
+        return self._volumes
+
+    def volume(self, name):
+        return self.volumes().get(name)
+
+    def quotas(self, name, nofail=True):
+        if name not in self._quotas:
+            self._quotas[name] = get_quotas(name, nofail)
+        return self._quotas[name]
+
+    def invalidate_peers(self):
+        self._peers = None
+
+    def invalidate_volumes(self):
+        self._volumes = None
+        self._quotas = {}
+
+
+def peer_in_cluster(peers, host):
+    return host in peers and peers[host][1].lower().find('peer in cluster') != -1
+
+def wait_for_peers(state, hosts, timeout=4):
+    pending = set(hosts)
+    for x in range(0, timeout):
+        state.invalidate_peers()
+        peers = state.peers()
+        pending = set([ h for h in pending if not peer_in_cluster(peers, h) ])
+        if not pending:
+            break
         time.sleep(1)
-    return False
+    return pending
 
-def probe(host, myhostname):
+def probe_all_peers(state, hosts, myhostname):
     global module
-    run_gluster([ 'peer', 'probe', host ])
-    if not wait_for_peer(host):
-        module.fail_json(msg='failed to probe peer %s on %s' % (host, myhostname))
-    changed = True
-
-def probe_all_peers(hosts, peers, myhostname):
+    peers = state.peers()
+    probed = []
     for host in hosts:
         host = host.strip() # Clean up any extra space for exact comparison
-        if host not in peers:
-            # dont probe ourselves
-            if myhostname != host:
-                probe(host, myhostname)
+        # dont probe ourselves
+        if host not in peers and myhostname != host and host not in probed:
+            run_gluster([ 'peer', 'probe', host ])
+            probed.append(host)
+    if not probed:
+        return False
+    # all probes are in flight, wait for the whole set at once
+    failed = wait_for_peers(state, probed, max(4, len(probed)))
+    if failed:
+        module.fail_json(msg='failed to probe peers %s on %s' % (', '.join(sorted(failed)), myhostname))
+    return True
 
 def create_volume(name, stripe, replica, transport, hosts, bricks, force):
     args = [ 'volume', 'create' ]
@@ -363,12 +492,12 @@ def main():
     directory = module.params['directory']
 
 
-    # get current state info
-    peers = get_peers()
-    volumes = get_volumes()
+    # get current state info, the snapshot is shared by all checks below
+    state = GlusterState()
+    volumes = state.volumes()
     quotas = {}
     if volume_name in volumes and volumes[volume_name]['quota'] and volumes[volume_name]['status'].lower() == 'started':
-        quotas = get_quotas(volume_name, True)
+        quotas = state.quotas(volume_name, True)
 
     # do the work!
     if action == 'absent':
@@ -379,34 +508,35 @@ def main():
             changed = True
 
     if action == 'present':
-        probe_all_peers(cluster, peers, myhostname)
+        if probe_all_peers(state, cluster, myhostname):
+            changed = True
 
         # create if it doesn't exist
         if volume_name not in volumes:
             create_volume(volume_name, stripes, replicas, transport, cluster, brick_paths, force)
-            volumes = get_volumes()
+            state.invalidate_volumes()
+            volumes = state.volumes()
             changed = True
 
         if volume_name in volumes:
-            if volumes[volume_name]['status'].lower() != 'started' and start_on_create:
+            volume = volumes[volume_name]
+            if volume['status'].lower() != 'started' and start_on_create:
                 start_volume(volume_name)
                 changed = True
 
             # switch bricks
+            current_bricks = set(volume.get('bricks', []))
             new_bricks = []
-            removed_bricks = []
-            all_bricks = []
+            all_bricks = set()
             for node in cluster:
                 for brick_path in brick_paths:
                     brick = '%s:%s' % (node, brick_path)
-                    all_bricks.append(brick)
-                    if brick not in volumes[volume_name]['bricks']:
+                    all_bricks.add(brick)
+                    if brick not in current_bricks:
                         new_bricks.append(brick)
 
             # this module does not yet remove bricks, but we check those anyways
-            for brick in volumes[volume_name]['bricks']:
-                if brick not in all_bricks:
-                    removed_bricks.append(brick)
+            removed_bricks = current_bricks - all_bricks
 
             for brick in new_bricks:
                 add_brick(volume_name, brick, force)
@@ -414,16 +544,19 @@ def main():
 
             # handle quotas
             if quota:
-                if not volumes[volume_name]['quota']:
+                if not volume['quota']:
                     enable_quota(volume_name)
-                quotas = get_quotas(volume_name, False)
+                    # quota was just enabled, no limits can exist yet
+                    quotas = {}
+                else:
+                    quotas = state.quotas(volume_name, False)
                 if directory not in quotas or quotas[directory] != quota:
                     set_quota(volume_name, directory, quota)
                     changed = True
 
             # set options
             for option in options.keys():
-                if option not in volumes[volume_name]['options'] or volumes[volume_name]['options'][option] != options[option]:
+                if option not in volume['options'] or volume['options'][option] != options[option]:
                     set_volume_option(volume_name, option, options[option])
                     changed = True
 
@@ -444,12 +577,13 @@ def main():
             changed = True
 
     if changed:
-        volumes = get_volumes()
+        state.invalidate_volumes()
+        volumes = state.volumes()
         if rebalance:
             do_rebalance(volume_name)
 
     facts = {}
-    facts['glusterfs'] = { 'peers': peers, 'volumes': volumes, 'quotas': quotas }
+    facts['glusterfs'] = { 'peers': state.peers(), 'volumes': volumes, 'quotas': quotas }
 
     module.exit_json(changed=changed, ansible_facts=facts)
 
@@ -32,13 +32,23 @@ options:
     aliases: [ 'host' ]
     description:
       - The host to add or remove (must match a host specified in key)
-    required: true
+      - Required unless I(hosts) is given.
+    required: false
     default: null
   key:
     description:
       - The SSH public host key, as a string (required if state=present, optional when state=absent, in which case all keys for the host are removed)
     required: false
     default: null
+  hosts:
+    description:
+      - A list of hashes with C(name), C(key) and optionally C(state) (defaults to I(state)).
+        The file is read once, all entries are applied in memory and the result is written
+        back with a single atomic move.
+      - Mutually exclusive with I(name) and I(key).
+    required: false
+    default: null
+    version_added: "2.0"
   path:
     description:
       - The known_hosts file to edit
@@ -60,6 +70,18 @@ EXAMPLES = '''
   known_hosts: path='/etc/ssh/ssh_known_hosts'
                host='foo.com.invalid'
                key="{{ lookup('file', 'pubkeys/foo.com.invalid') }}"
+
+# Add and remove many hosts with a single rewrite of the file
+- name: tell the bastion about the whole fleet
+  known_hosts:
+    path: /etc/ssh/ssh_known_hosts
+    hosts:
+      - name: web1.example.com
+        key: "web1.example.com ssh-rsa AAAA..."
+      - name: web2.example.com
+        key: "{{ lookup('file', 'pubkeys/web2.example.com') }}"
+      - name: retired.example.com
+        state: absent
 '''
 
 # Makes sure public host keys are present or absent in the given known_hosts
@@ -69,6 +91,7 @@ EXAMPLES = '''
 # =========
 #    name = hostname whose key should be added (alias: host)
 #    key = line(s) to add to known_hosts file
+#    hosts = list of name/key/state hashes, applied in one pass
 #    path = the known_hosts file to edit (default: ~/.ssh/known_hosts)
 #    state = absent|present (default: present)
 
@@ -76,173 +99,277 @@ import os
 import os.path
 import tempfile
 import errno
+import fnmatch
+import hmac
+import base64
+try:
+    from hashlib import sha1
+except ImportError:
+    import sha as sha1
 
 def enforce_state(module, params):
     """
-    Add or remove key.
+    Add or remove key(s).
     """
 
-    host = params["name"]
-    key = params.get("key",None)
-    port = params.get("port",None)
     #expand the path parameter; otherwise module.add_path_info
     #(called by exit_json) unhelpfully says the unexpanded path is absent.
     path = os.path.expanduser(params.get("path"))
     state = params.get("state")
-    #Find the ssh-keygen binary
-    sshkeygen = module.get_bin_path("ssh-keygen",True)
 
-    #trailing newline in files gets lost, so re-add if necessary
-    if key is not None and key[-1]!='\n':
-        key+='\n'
-
-    if key is None and state != "absent":
-        module.fail_json(msg="No key specified when adding a host")
-
-    sanity_check(module,host,key,sshkeygen)
-
-    current,replace=search_for_host_key(module,host,key,path,sshkeygen)
+    if params.get("hosts"):
+        entries = []
+        for entry in params["hosts"]:
+            if isinstance(entry, basestring):
+                entry = dict(name=entry)
+            if not isinstance(entry, dict):
+                module.fail_json(msg="hosts entries must be hashes with name, key and state")
+            name = entry.get("name", entry.get("host"))
+            if not name:
+                module.fail_json(msg="hosts entry is missing a name: %s" % entry)
+            entries.append((name, entry.get("key"), entry.get("state", state)))
+    else:
+        entries = [(params["name"], params.get("key",None), state)]
+
+    known_hosts = KnownHostsFile(path)
+    try:
+        known_hosts.load()
+    except IOError, e:
+        module.fail_json(msg="Failed to read %s: %s" % \
+                             (path,str(e)))
+
+    #All adds, replacements and removals are applied to the in-memory
+    #copy, which is then written back once.
+    for host, key, host_state in entries:
+        if host_state not in ("present", "absent"):
+            module.fail_json(msg="Invalid state %s for host %s" % (host_state,host))
+        if key is None and host_state != "absent":
+            module.fail_json(msg="No key specified when adding a host")
+        key_lines = sanity_check(module,host,key)
+        if known_hosts.enforce(host,key_lines,host_state):
+            params['changed'] = True
 
-    #We will change state if current==True & state!="present"
-    #or current==False & state=="present"
-    #i.e (current) XOR (state=="present")
-    #Alternatively, if replace is true (i.e. key present, and we must change it)
     if module.check_mode:
-        module.exit_json(changed = replace or ((state=="present") != current))
+        module.exit_json(changed = known_hosts.changed)
 
-    #Now do the work.
-
-    #First, remove an extant entry if required
-    if replace==True or (current==True and state=="absent"):
-        module.run_command([sshkeygen,'-R',host,'-f',path],
-                           check_rc=True)
-        params['changed'] = True
-    #Next, add a new (or replacing) entry
-    if replace==True or (current==False and state=="present"):
+    if known_hosts.changed:
         try:
-            inf=open(path,"r")
-        except IOError, e:
-            if e.errno == errno.ENOENT:
-                inf=None
-            else:
-                module.fail_json(msg="Failed to read %s: %s" % \
-                                     (path,str(e)))
-        try:
-            outf=tempfile.NamedTemporaryFile(dir=os.path.dirname(path))
-            if inf is not None:
-                for line in inf:
-                    outf.write(line)
-                inf.close()
-            outf.write(key)
-            outf.flush()
-            module.atomic_move(outf.name,path)
+            known_hosts.write(module)
         except (IOError,OSError),e:
             module.fail_json(msg="Failed to write to file %s: %s" % \
                                  (path,str(e)))
 
-        try:
-            outf.close()
-        except:
-            pass
-
-        params['changed'] = True
-
     return params
 
-def sanity_check(module,host,key,sshkeygen):
+def sanity_check(module,host,key):
     '''Check supplied key is sensible
 
     host and key are parameters provided by the user; If the host
     provided is inconsistent with the key supplied, then this function
     quits, providing an error to the user.
-    sshkeygen is the path to ssh-keygen, found earlier with get_bin_path
+    Returns the key lines (empty if no key was supplied).
     '''
     #If no key supplied, we're doing a removal, and have nothing to check here.
     if key is None:
-        return
-    #Rather than parsing the key ourselves, get ssh-keygen to do it
-    #(this is essential for hashed keys, but otherwise useful, as the
-    #key question is whether ssh-keygen thinks the key matches the host).
-
-    #The approach is to write the key to a temporary file,
-    #and then attempt to look up the specified host in that file.
-    try:
-        outf=tempfile.NamedTemporaryFile()
-        outf.write(key)
-        outf.flush()
-    except IOError,e:
-        module.fail_json(msg="Failed to write to temporary file %s: %s" % \
-                             (outf.name,str(e)))
-    rc,stdout,stderr=module.run_command([sshkeygen,'-F',host,
-                                         '-f',outf.name],
-                                        check_rc=True)
+        return []
+    key_lines = []
+    for line in key.splitlines():
+        entry = parse_known_hosts_line(line)
+        if entry is None:
+            continue
+        if not host_field_matches(entry[1],host):
+            module.fail_json(msg="Host parameter does not match hashed host field in supplied key")
+        key_lines.append(line.strip())
+    if not key_lines:
+        module.fail_json(msg="No key found in the key supplied for %s" % host)
+    return key_lines
+
+def parse_known_hosts_line(line):
+    '''parse_known_hosts_line(line) -> (marker, hosts, keytype, key) or None
+
+    Splits a known_hosts line into its fields. Comments, blank and
+    truncated lines return None. marker is the optional @cert-authority
+    or @revoked field.
+    '''
+    fields = line.split()
+    if not fields or fields[0][0] == '#':
+        return None
+    marker = None
+    if fields[0][0] == '@':
+        marker = fields.pop(0)
+    if len(fields) < 3:
+        return None
+    return marker, fields[0], fields[1], fields[2]
+
+def hashed_host_mac(field):
+    '''Returns (hmac, digest) for a |1|salt|hash host field, or None.'''
+    parts = field.split('|')
+    if len(parts) != 4 or parts[1] != '1':
+        return None
     try:
-        outf.close()
-    except:
-        pass
-
-    if stdout=='': #host not found
-        module.fail_json(msg="Host parameter does not match hashed host field in supplied key")
-
-def search_for_host_key(module,host,key,path,sshkeygen):
-    '''search_for_host_key(module,host,key,path,sshkeygen) -> (current,replace)
-
-    Looks up host in the known_hosts file path; if it's there, looks to see
-    if one of those entries matches key. Returns:
-    current (Boolean): is host found in path?
-    replace (Boolean): is the key in path different to that supplied by user?
-    if current=False, then replace is always False.
-    sshkeygen is the path to ssh-keygen, found earlier with get_bin_path
+        salt = base64.b64decode(parts[2])
+        digest = base64.b64decode(parts[3])
+    except (TypeError, ValueError):
+        return None
+    return hmac.new(salt, digestmod=sha1), digest
+
+def hashed_host_matches(mac, digest, host):
+    h = mac.copy()
+    h.update(host)
+    return h.digest() == digest
+
+def is_host_pattern(field):
+    return '*' in field or '?' in field or '!' in field
+
+def host_patterns_match(field, host):
+    '''Match host against a comma separated list of (possibly negated) patterns.'''
+    matched = False
+    for pattern in field.split(','):
+        if pattern[:1] == '!':
+            if fnmatch.fnmatch(host, pattern[1:]):
+                return False
+        elif fnmatch.fnmatch(host, pattern):
+            matched = True
+    return matched
+
+def host_field_matches(field, host):
+    if field[:1] == '|':
+        mac = hashed_host_mac(field)
+        return mac is not None and hashed_host_matches(mac[0], mac[1], host)
+    return host_patterns_match(field, host)
+
+class KnownHostsFile(object):
     '''
-    replace=False
-    if os.path.exists(path)==False:
-        return False, False
-    #openssh >=6.4 has changed ssh-keygen behaviour such that it returns
-    #1 if no host is found, whereas previously it returned 0
-    rc,stdout,stderr=module.run_command([sshkeygen,'-F',host,'-f',path],
-                                 check_rc=False)
-    if stdout=='' and stderr=='' and (rc==0 or rc==1):
-        return False, False #host not found, no other errors
-    if rc!=0: #something went wrong
-        module.fail_json(msg="ssh-keygen failed (rc=%d,stdout='%s',stderr='%s')" % (rc,stdout,stderr))
-
-#If user supplied no key, we don't want to try and replace anything with it
-    if key is None:
-        return True, False
-
-    lines=stdout.split('\n')
-    k=key.strip() #trim trailing newline
-    #ssh-keygen returns only the host we ask about in the host field,
-    #even if the key entry has multiple hosts. Emulate this behaviour here,
-    #otherwise we get false negatives.
-    #Only necessary for unhashed entries.
-    if k[0] !='|':
-        k=k.split()
-        #The optional "marker" field, used for @cert-authority or @revoked
-        if k[0][0] == '@':
-            k[1]=host
+    A known_hosts file parsed once into an index of plain host names and
+    hashed (|1|salt|hash) entries. Lines are kept verbatim; removed lines
+    are set to None until the file is written.
+
+    Like ssh-keygen -R, only plain and hashed host entries are ever
+    removed. @cert-authority and @revoked lines and wildcard pattern lines
+    are indexed separately and only used to tell whether a key is present.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lines = []
+        self.plain = {}
+        self.patterns = []
+        self.hashed = []
+        self.markers = []
+        self.changed = False
+
+    def load(self):
+        try:
+            f = open(self.path, 'r')
+        except IOError, e:
+            if e.errno == errno.ENOENT:
+                return
+            raise
+        try:
+            for line in f:
+                self._index(line)
+        finally:
+            f.close()
+
+    def _index(self, line):
+        lineno = len(self.lines)
+        self.lines.append(line)
+        entry = parse_known_hosts_line(line)
+        if entry is None:
+            return
+        field = entry[1]
+        if entry[0] is not None:
+            self.markers.append((field, lineno))
+        elif field[:1] == '|':
+            mac = hashed_host_mac(field)
+            if mac is not None:
+                self.hashed.append((mac[0], mac[1], lineno))
+        elif is_host_pattern(field):
+            self.patterns.append((field, lineno))
         else:
-            k[0]=host
-        k=' '.join(k)
-    for l in lines:
-        if l=='': 
-            continue
-        if l[0]=='#': #comment
-            continue
-        if k==l: #found a match
-            return True, False #current, not-replace
-    #No match found, return current and replace
-    return True, True
+            for name in field.split(','):
+                self.plain.setdefault(name, []).append(lineno)
+
+    def lookup(self, host, protected=False):
+        '''
+        Returns the line numbers of the remaining plain and hashed entries
+        for host. With protected, also the marker and pattern lines that
+        match host, which must never be removed.
+        '''
+        found = [n for n in self.plain.get(host, []) if self.lines[n] is not None]
+        for mac, digest, n in self.hashed:
+            if self.lines[n] is not None and hashed_host_matches(mac, digest, host):
+                found.append(n)
+        if protected:
+            for field, n in self.patterns + self.markers:
+                if self.lines[n] is not None and host_field_matches(field, host):
+                    found.append(n)
+        found.sort()
+        return found
+
+    def enforce(self, host, key_lines, state):
+        '''
+        Make host absent, or present with exactly key_lines, replacing
+        any other entries for it. Returns True if anything changed.
+        '''
+        current = self.lookup(host)
+        if state == "absent":
+            for n in current:
+                self.lines[n] = None
+            if current:
+                self.changed = True
+            return len(current) > 0
+
+        #Entries are compared on marker, key type and key only: the host
+        #field may be hashed, or list several hosts.
+        existing = set()
+        for n in self.lookup(host, protected=True):
+            entry = parse_known_hosts_line(self.lines[n])
+            existing.add((entry[0], entry[2], entry[3]))
+        missing = False
+        for line in key_lines:
+            entry = parse_known_hosts_line(line)
+            if (entry[0], entry[2], entry[3]) not in existing:
+                missing = True
+        if not missing:
+            return False
+
+        for n in current:
+            self.lines[n] = None
+        #trailing newline in files gets lost, so re-add if necessary
+        for n in range(len(self.lines) - 1, -1, -1):
+            if self.lines[n] is not None:
+                if self.lines[n][-1:] != '\n':
+                    self.lines[n] += '\n'
+                break
+        for line in key_lines:
+            self._index(line + '\n')
+        self.changed = True
+        return True
+
+    def write(self, module):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        outf = os.fdopen(fd, 'w')
+        try:
+            for line in self.lines:
+                if line is not None:
+                    outf.write(line)
+        finally:
+            outf.close()
+        module.atomic_move(tmp_path, self.path)
 
 def main():
 
     module = AnsibleModule(
         argument_spec = dict(
-            name      = dict(required=True,  type='str', aliases=['host']),
+            name      = dict(required=False, type='str', aliases=['host']),
             key       = dict(required=False,  type='str'),
+            hosts     = dict(required=False, type='list'),
             path      = dict(default="~/.ssh/known_hosts", type='str'),
             state     = dict(default='present', choices=['absent','present']),
             ),
+        required_one_of = [['name', 'hosts']],
+        mutually_exclusive = [['name', 'hosts'], ['key', 'hosts']],
         supports_check_mode = True
         )
 
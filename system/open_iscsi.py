@@ -84,6 +84,34 @@ options:
         description:
         - whether the list of nodes in the persistent iscsi database should be
           returned by the module
+    portals:
+        required: false
+        version_added: "2.0"
+        description:
+        - a list of portals, given as ip or ip:port, to work on at once instead
+          of C(portal). Discovery runs on all portals concurrently, the
+          sessions are read once, and C(login) or C(auto_node_startup) apply to
+          C(targets), or to every target on the portals when C(targets) is
+          omitted, with the logins running in parallel. Device nodes of all
+          targets are then waited for together.
+    targets:
+        required: false
+        version_added: "2.0"
+        description:
+        - the iscsi target names to act on with C(portals)
+    workers:
+        required: false
+        default: 8
+        version_added: "2.0"
+        description:
+        - number of concurrent iscsiadm calls with C(portals)
+    device_timeout:
+        required: false
+        default: 30
+        version_added: "2.0"
+        description:
+        - seconds to wait for the device nodes of newly connected targets
+          with C(portals)
 
 examples:
     - description: perform a discovery on 10.1.2.3 and show available target
@@ -101,10 +129,15 @@ examples:
     - description: discconnect from the cached named target
       code: >
         open_iscsi: login=no target=iqn.1986-03.com.sun:02:f8c1f9e0-c3ec-ec84-c9c9-8bfb0cd5de3d"
+    - description: discover four portals and connect to all their targets
+      code: >
+        open_iscsi: login=yes discover=yes portals=10.1.2.3,10.1.2.4,10.1.3.3,10.1.3.4 auto_node_startup=yes
 '''
 
 import glob
+import threading
 import time
+import Queue
 
 ISCSIADM = 'iscsiadm'
 
@@ -253,6 +286,275 @@ def target_setmanual(module, target):
         module.fail_json(cmd=cmd, rc=rc, msg=err)
 
 
+def split_portal(portal, default_port):
+    '''Returns (ip, port) of a portal given as ip or ip:port'''
+    portal = str(portal)
+    if portal.count(':') == 1:
+        ip, port = portal.split(':')
+        return ip, str(port)
+    return portal, str(default_port)
+
+
+def run_parallel(module, func, items, workers):
+    '''
+    Calls func on every item from a pool of worker threads. func returns
+    None on success or a (cmd, rc, err) tuple; the first failure is
+    reported once all workers are done.
+    '''
+    queue = Queue.Queue()
+    for item in items:
+        queue.put(item)
+    errors = []
+
+    def worker():
+        while True:
+            try:
+                item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            error = func(item)
+            if error:
+                errors.append(error)
+
+    threads = []
+    for i in range(min(workers, queue.qsize())):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        cmd, rc, err = errors[0]
+        module.fail_json(cmd=cmd, rc=rc, msg=err)
+
+
+def iscsi_get_node_records(module):
+    '''Returns the cached node records as a list of (target, ip, port)'''
+    cmd = '%s --mode node' % iscsiadm_cmd
+    (rc, out, err) = module.run_command(cmd)
+    if rc == 21 or (rc == 255 and "o records found" in err):
+        return []
+    if rc != 0:
+        module.fail_json(cmd=cmd, rc=rc, msg=err)
+
+    records = []
+    for line in out.splitlines():
+        # line format is "ip:port,target_portal_group_tag targetname"
+        parts = line.split()
+        if len(parts) != 2:
+            continue
+        ip, port = parts[0].split(',')[0].rsplit(':', 1)
+        records.append((parts[1], ip.strip('[]'), port))
+    return records
+
+
+def iscsi_get_sessions(module):
+    '''
+    Returns the set of (target, ip, port) with an active session, read
+    from sysfs when available instead of running iscsiadm.
+    '''
+    sessions = set()
+    session_dirs = glob.glob('/sys/class/iscsi_session/session*')
+    if session_dirs:
+        for session_dir in session_dirs:
+            try:
+                target = open(os.path.join(session_dir, 'targetname')).read().strip()
+                conn = glob.glob(os.path.join(session_dir, 'device', 'connection*', 'iscsi_connection', 'connection*'))[0]
+                ip = open(os.path.join(conn, 'persistent_address')).read().strip()
+                port = open(os.path.join(conn, 'persistent_port')).read().strip()
+            except (IOError, IndexError):
+                # the session went away, or sysfs is not laid out as expected
+                break
+            sessions.add((target, ip, port))
+        else:
+            return sessions
+        sessions = set()
+
+    cmd = '%s --mode session' % iscsiadm_cmd
+    (rc, out, err) = module.run_command(cmd)
+    if rc == 21:
+        return sessions
+    if rc != 0:
+        module.fail_json(cmd=cmd, rc=rc, msg=err)
+    for line in out.splitlines():
+        # line format is "tcp: [sid] ip:port,tpgt targetname (non-flash)"
+        parts = line.split()
+        if len(parts) < 4:
+            continue
+        ip, port = parts[2].split(',')[0].rsplit(':', 1)
+        sessions.add((parts[3], ip.strip('[]'), port))
+    return sessions
+
+
+def iscsi_get_startup(module):
+    '''Returns a dict mapping targets to their node.startup setting'''
+    cmd = '%s --mode node --op show' % iscsiadm_cmd
+    (rc, out, err) = module.run_command(cmd)
+    if rc == 21 or (rc == 255 and "o records found" in err):
+        return {}
+    if rc != 0:
+        module.fail_json(cmd=cmd, rc=rc, msg=err)
+
+    startup = {}
+    name = None
+    for line in out.splitlines():
+        if line.startswith('node.name'):
+            name = line.split('=', 1)[1].strip()
+        elif line.startswith('node.startup') and name is not None:
+            value = line.split('=', 1)[1].strip()
+            # a target is automatic only if all of its records are
+            if value == 'automatic':
+                startup[name] = startup.get(name, value)
+            else:
+                startup[name] = value
+    return startup
+
+
+def target_device_nodes(targets, links=None):
+    '''Returns a dict mapping each target to its disk device nodes'''
+    if links is None:
+        try:
+            links = os.listdir('/dev/disk/by-path')
+        except OSError:
+            links = []
+    devices = {}
+    for target in targets:
+        devdisks = []
+        for link in links:
+            # exclude partitions
+            if ('-iscsi-%s-' % target) in link and '-part' not in link:
+                devdisk = os.path.realpath(os.path.join('/dev/disk/by-path', link))
+                # only add once (multi-path?)
+                if devdisk not in devdisks:
+                    devdisks.append(devdisk)
+        devices[target] = devdisks
+    return devices
+
+
+def wait_for_device_nodes(module, targets, timeout):
+    '''
+    Waits for udev to create the device nodes of all targets at once,
+    with a single udevadm settle, then a shared listing of /dev/disk/by-path
+    for the ones still missing.
+    '''
+    udevadm = module.get_bin_path('udevadm')
+    if udevadm:
+        module.run_command([udevadm, 'settle', '--timeout=%d' % timeout])
+    deadline = time.time() + timeout
+    while True:
+        devices = target_device_nodes(targets)
+        missing = [t for t in devices if not devices[t]]
+        if not missing or time.time() >= deadline:
+            return devices
+        time.sleep(1)
+
+
+def run_bulk(module):
+
+    portals = [split_portal(p, module.params['port']) for p in module.params['portals']]
+    targets = module.params['targets']
+    login = module.params['login']
+    automatic = module.params['auto_node_startup']
+    workers = module.params['workers']
+    check = module.check_mode
+
+    result = dict(changed=False)
+
+    if module.params['discover']:
+        before = set(iscsi_get_node_records(module))
+        if not check:
+            def discover(portal):
+                cmd = '%s --mode discovery --type sendtargets --portal %s:%s' % (iscsiadm_cmd, portal[0], portal[1])
+                (rc, out, err) = module.run_command(cmd)
+                if rc > 0:
+                    return (cmd, rc, err)
+            run_parallel(module, discover, portals, workers)
+            records = iscsi_get_node_records(module)
+        else:
+            records = list(before)
+        if set(records) != before:
+            result['changed'] = True
+            result['cache_updated'] = True
+    else:
+        records = iscsi_get_node_records(module)
+
+    # the node records on the requested portals, restricted to the
+    # requested targets if any were given
+    wanted_portals = set(portals)
+    nodes = [r for r in records if (r[1], r[2]) in wanted_portals]
+    if targets:
+        missing = set(targets) - set([r[0] for r in nodes])
+        if missing:
+            module.fail_json(msg="Specified targets not found on the portals: %s" % ', '.join(sorted(missing)))
+        nodes = [r for r in nodes if r[0] in targets]
+    node_targets = sorted(set([r[0] for r in nodes]))
+
+    if module.params['show_nodes']:
+        result['nodes'] = node_targets
+
+    if login is not None:
+        sessions = iscsi_get_sessions(module)
+        if login:
+            pending = [r for r in nodes if r not in sessions]
+        else:
+            pending = [r for r in nodes if r in sessions]
+
+        if pending and not check:
+            node_user = module.params['node_user']
+            params = []
+            if node_user:
+                params = [('node.session.auth.authmethod', module.params['node_auth']),
+                          ('node.session.auth.username', node_user),
+                          ('node.session.auth.password', module.params['node_pass'])]
+
+            def connect(record):
+                target, ip, port = record
+                node = '%s --mode node --targetname %s --portal %s:%s' % (iscsiadm_cmd, target, ip, port)
+                if login:
+                    for (name, value) in params:
+                        cmd = '%s --op=update --name %s --value %s' % (node, name, value)
+                        (rc, out, err) = module.run_command(cmd)
+                        if rc > 0:
+                            return (cmd, rc, err)
+                    cmd = '%s --login' % node
+                else:
+                    cmd = '%s --logout' % node
+                (rc, out, err) = module.run_command(cmd)
+                if rc > 0:
+                    return (cmd, rc, err)
+            run_parallel(module, connect, pending, workers)
+
+        if pending:
+            result['changed'] = True
+            result['connection_changed'] = True
+            result['connections'] = ['%s %s:%s' % r for r in pending]
+
+        if login and not check:
+            if pending:
+                result['devicenodes'] = wait_for_device_nodes(module, node_targets, module.params['device_timeout'])
+            else:
+                result['devicenodes'] = target_device_nodes(node_targets)
+
+    if automatic is not None:
+        startup = iscsi_get_startup(module)
+        pending = [t for t in node_targets if (startup.get(t) == 'automatic') != automatic]
+        if pending and not check:
+            value = automatic and 'automatic' or 'manual'
+
+            def setstartup(target):
+                cmd = '%s --mode node --targetname %s --op=update --name node.startup --value %s' % (iscsiadm_cmd, target, value)
+                (rc, out, err) = module.run_command(cmd)
+                if rc > 0:
+                    return (cmd, rc, err)
+            run_parallel(module, setstartup, pending, workers)
+        result['automatic_changed'] = bool(pending)
+        if pending:
+            result['changed'] = True
+
+    module.exit_json(**result)
+
+
 def main():
 
     # load ansible module object
@@ -271,17 +573,29 @@ def main():
             login = dict(type='bool', aliases=['state']),
             auto_node_startup = dict(type='bool', aliases=['automatic']),
             discover = dict(type='bool', default=False),
-            show_nodes = dict(type='bool', default=False)
+            show_nodes = dict(type='bool', default=False),
+
+            # many portals and targets at once
+            portals = dict(type='list'),
+            targets = dict(type='list'),
+            workers = dict(type='int', default=8),
+            device_timeout = dict(type='int', default=30),
         ),  
 
         required_together=[['discover_user', 'discover_pass'],
                            ['node_user', 'node_pass']],
+        mutually_exclusive=[['portal', 'portals'], ['target', 'targets']],
         supports_check_mode=True
     )
 
     global iscsiadm_cmd 
     iscsiadm_cmd = module.get_bin_path('iscsiadm', required=True)
 
+    if module.params['portals']:
+        run_bulk(module)
+    elif module.params['targets']:
+        module.fail_json(msg="targets requires portals")
+
     # parameters
     portal = module.params['portal']
     target = module.params['target']